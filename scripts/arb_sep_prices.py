@@ -1,15 +1,19 @@
 import os
-import click
-from ape import accounts, networks, chain
-from synthetix import Synthetix
+import sys
+
+if __name__ == "__main__":
+    # let ``python scripts/<name>.py`` import utils from the repo root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from dotenv import load_dotenv
+from utils.client_helpers import get_client
 
 load_dotenv()
 
 
 def main():
     # get the client
-    snx = Synthetix(
+    snx = get_client(
         provider_rpc=os.getenv("NETWORK_421614_RPC"),
         private_key=os.getenv("PRIVATE_KEY"),
     )
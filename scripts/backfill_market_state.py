@@ -0,0 +1,185 @@
+import os
+import click
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from synthetix.utils import wei_to_ether
+from utils.client_helpers import get_client
+from utils.multicall_helpers import aggregate_calls
+from utils.oracle_helpers import get_historical_oracle_calls
+
+load_dotenv()
+
+# constants
+SUMMARY_FIELDS = [
+    "skew",
+    "size",
+    "max_open_interest",
+    "current_funding_rate",
+    "current_funding_velocity",
+    "index_price",
+]
+
+
+def sample_blocks(start_block, end_block, num_blocks):
+    """Pick evenly spaced blocks between two blocks, inclusive"""
+    if num_blocks <= 1 or start_block == end_block:
+        return [end_block]
+
+    step = (end_block - start_block) / (num_blocks - 1)
+    return sorted({round(start_block + step * ind) for ind in range(num_blocks)})
+
+
+def fetch_market_state(snx, block_number, market_ids):
+    """Fetch the summary of each perps market at a block in one pinned multicall"""
+    market_proxy = snx.perps.market_proxy
+    block = snx.web3.eth.get_block(block_number)
+
+    feed_ids = [snx.perps.market_meta[market_id]["feed_id"] for market_id in market_ids]
+    oracle_calls = get_historical_oracle_calls(snx, feed_ids, block.timestamp)
+
+    calls = [(market_proxy, "interestRate", ())] + [
+        (market_proxy, "getMarketSummary", (market_id,)) for market_id in market_ids
+    ]
+    interest_rate, *summaries = aggregate_calls(
+        snx, calls, prepended_calls=oracle_calls, block=block_number
+    )
+
+    # the oracle update doesn't require success, so if it fails every market does
+    skipped = sum(summary is None for summary in summaries)
+    if len(summaries) > 0 and skipped == len(summaries):
+        raise Exception(f"Every market summary failed at block {block_number}")
+    if skipped > 0:
+        # e.g. markets that weren't created yet
+        snx.logger.warning(
+            f"Skipped {skipped}/{len(summaries)} markets that failed at block "
+            f"{block_number}"
+        )
+
+    rows = []
+    for market_id, summary in zip(market_ids, summaries):
+        if summary is None:
+            continue
+
+        row = {
+            "block_number": block_number,
+            "timestamp": block.timestamp,
+            "market_id": market_id,
+            "market_name": snx.perps.market_meta[market_id]["symbol"],
+            "interest_rate": (
+                wei_to_ether(interest_rate) if interest_rate is not None else None
+            ),
+        }
+        row.update(
+            {
+                field: wei_to_ether(value)
+                for field, value in zip(SUMMARY_FIELDS, summary)
+            }
+        )
+        rows.append(row)
+    return rows
+
+
+def backfill(snx, blocks, market_ids, workers=8):
+    """Fetch market state for a list of blocks concurrently"""
+    rows = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_market_state, snx, block, market_ids): block
+            for block in blocks
+        }
+        for ind, future in enumerate(as_completed(futures), 1):
+            block = futures[future]
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                snx.logger.warning(f"Failed to fetch block {block}: {e}")
+                failed.append(block)
+
+            if ind % 10 == 0 or ind == len(futures):
+                snx.logger.info(f"Fetched {ind}/{len(futures)} blocks")
+    return rows, failed
+
+
+def save_market_state(rows, output):
+    """Merge rows into a parquet file, keeping one row per block and market"""
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    if os.path.exists(output):
+        df = pd.concat([pd.read_parquet(output), df], ignore_index=True)
+
+    df = (
+        df.drop_duplicates(subset=["block_number", "market_id"], keep="last")
+        .sort_values(["block_number", "market_id"])
+        .reset_index(drop=True)
+    )
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="s", utc=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    df.to_parquet(output, index=False)
+    return df
+
+
+def load_existing_blocks(output):
+    """Get the blocks already stored in an output file"""
+    if not os.path.exists(output):
+        return set()
+
+    import pandas as pd
+
+    return set(pd.read_parquet(output, columns=["block_number"])["block_number"])
+
+
+@click.command()
+@click.option(
+    "--rpc",
+    default=lambda: os.getenv("NETWORK_42161_RPC"),
+    help="Archive node RPC (default: NETWORK_42161_RPC)",
+)
+@click.option("--start-block", type=int, required=True, help="First block to sample")
+@click.option("--end-block", type=int, help="Last block to sample (default: latest)")
+@click.option("--num-blocks", default=100, show_default=True, help="Blocks to sample")
+@click.option(
+    "--market",
+    "markets",
+    multiple=True,
+    help="Only sample these markets, by name (default: all markets)",
+)
+@click.option("--workers", default=8, show_default=True, help="Concurrent blocks")
+@click.option(
+    "--output",
+    help="Parquet file to write (default: data/market_state_<network id>.parquet)",
+)
+def cli(rpc, start_block, end_block, num_blocks, markets, workers, output):
+    snx = get_client(provider_rpc=rpc)
+
+    end_block = end_block or snx.web3.eth.block_number
+    output = output or os.path.join("data", f"market_state_{snx.network_id}.parquet")
+
+    market_ids = [
+        market_id
+        for market_id, market in snx.perps.market_meta.items()
+        if not markets or market["symbol"] in markets
+    ]
+
+    # skip blocks that were already backfilled
+    existing_blocks = load_existing_blocks(output)
+    blocks = [
+        block
+        for block in sample_blocks(start_block, end_block, num_blocks)
+        if block not in existing_blocks
+    ]
+    click.echo(
+        f"Backfilling {len(market_ids)} markets at {len(blocks)} blocks "
+        f"between {start_block} and {end_block}"
+    )
+    if len(blocks) == 0:
+        return
+
+    rows, failed = backfill(snx, blocks, market_ids, workers=workers)
+    if len(rows) > 0:
+        df = save_market_state(rows, output)
+        click.echo(f"Saved {len(df)} rows to {output}")
+    if len(failed) > 0:
+        click.echo(f"Failed to fetch {len(failed)} blocks: {sorted(failed)}")
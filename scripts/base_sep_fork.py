@@ -1,7 +1,6 @@
 import click
 from functools import wraps
-from ape import accounts, networks, chain
-from synthetix import Synthetix
+from ape import networks, chain
 
 
 # wrapper for chain fork
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import statistics
+import subprocess
+import click
+from dotenv import load_dotenv
+from web3 import HTTPProvider, IPCProvider, Web3
+from utils.batch_helpers import batch_reads
+from utils.cache_helpers import ROOT_DIR, cache_path, load_json, save_json
+from utils.fork_helpers import get_fork_blocks, get_upstream_rpc, start_anvil
+from utils.provider_helpers import LocalIPCProvider
+
+load_dotenv()
+
+# constants
+RESULTS_FILE = cache_path("benchmarks", "ipc.json")
+BATCH_SIZE = 50
+ADDRESS = "0x000000000000000000000000000000000000dEaD"
+
+
+def get_calls(web3):
+    """Requests to time, from the smallest response to a large one"""
+    block = web3.eth.block_number
+    return {
+        "eth_chainId": ("eth_chainId", []),
+        "eth_getBalance": ("eth_getBalance", [ADDRESS, "latest"]),
+        "eth_getBlockByNumber": ("eth_getBlockByNumber", [hex(block), True]),
+    }
+
+
+def time_calls(provider, method, params, calls):
+    """Send a request ``calls`` times, returning the time of each in seconds"""
+    provider.make_request(method, params)
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = provider.make_request(method, params)
+        times.append(time.perf_counter() - start)
+        if "error" in response:
+            raise click.ClickException(f"{method} failed: {response['error']}")
+    return times
+
+
+def time_batches(provider, calls, batch_size=BATCH_SIZE):
+    """Time batches of balance reads sent with ``batch_reads``"""
+    web3 = Web3(provider)
+    addresses = [
+        Web3.to_checksum_address(hex(index).ljust(42, "0"))
+        for index in range(1, batch_size + 1)
+    ]
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        with batch_reads(web3) as batch:
+            for address in addresses:
+                batch.balance(address)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "median_us": statistics.median(times) * 1e6,
+        "p95_us": times[int(len(times) * 0.95) - 1] * 1e6,
+    }
+
+
+def run_suite(suite, network, transport, extra_args=()):
+    """Run a test suite with a transport, returning its wall time"""
+    ape = os.path.join(os.path.dirname(sys.executable), "ape")
+    args = [ape, "test", suite, "--network", network]
+    args += ["--fork-transport", transport, "-q"] + list(extra_args)
+
+    start = time.perf_counter()
+    process = subprocess.run(args, cwd=ROOT_DIR)
+    return {
+        "wall_s": time.perf_counter() - start,
+        "exit_code": process.returncode,
+    }
+
+
+@click.command()
+@click.option(
+    "--network",
+    default="arbitrum:mainnet",
+    show_default=True,
+    help="Network to fork, at its pinned block",
+)
+@click.option("--local", is_flag=True, help="Use a fresh local chain, not a fork")
+@click.option("--calls", default=1000, show_default=True, help="Requests per method")
+@click.option(
+    "--suite",
+    help="Also time a test suite over each transport, like tests/arbitrum-mainnet-fork",
+)
+@click.option("--suite-arg", "suite_args", multiple=True, help="Extra pytest args")
+@click.option("--no-save", is_flag=True, help="Don't store the results")
+def cli(network, local, calls, suite, suite_args, no_save):
+    fork_url, block = None, None
+    if not local:
+        fork_url = get_upstream_rpc(network)
+        if not fork_url or fork_url.startswith("$"):
+            raise click.ClickException(f"No RPC is configured for {network}")
+        block = get_fork_blocks().get(network)
+
+    click.echo(f"Starting anvil ({'local' if local else f'{network} at {block}'})")
+    with start_anvil(fork_url, block, ipc=True) as fork:
+        providers = {
+            "http": HTTPProvider(fork.uri, request_kwargs={"timeout": 120}),
+            "ipc (web3)": IPCProvider(fork.ipc_path, timeout=120),
+            "ipc": LocalIPCProvider(fork.ipc_path),
+        }
+
+        results = {}
+        for name, (method, params) in get_calls(fork.web3).items():
+            results[name] = {
+                transport: summarize(time_calls(provider, method, params, calls))
+                for transport, provider in providers.items()
+            }
+        results[f"batch of {BATCH_SIZE}"] = {
+            transport: summarize(time_batches(provider, max(calls // 10, 10)))
+            for transport, provider in providers.items()
+        }
+
+    click.echo(
+        f"\n{'request':<24}{'transport':<14}{'median':>12}{'p95':>12}{'vs http':>10}"
+    )
+    for name, transports in results.items():
+        http_us = transports["http"]["median_us"]
+        for transport, summary in transports.items():
+            click.echo(
+                f"{name:<24}{transport:<14}{summary['median_us']:>10.0f}us"
+                f"{summary['p95_us']:>10.0f}us{http_us / summary['median_us']:>9.1f}x"
+            )
+
+    suites = {}
+    if suite:
+        suite_network = f"{network}-fork:foundry"
+        for transport in ("http", "ipc"):
+            click.echo(f"\nRunning {suite} over {transport}...")
+            suites[transport] = run_suite(suite, suite_network, transport, suite_args)
+
+        click.echo(f"\n{'transport':<14}{'wall':>10}{'exit':>6}")
+        for transport, result in suites.items():
+            click.echo(
+                f"{transport:<14}{result['wall_s']:>9.1f}s{result['exit_code']:>6}"
+            )
+
+    if not no_save:
+        history = load_json(RESULTS_FILE, [])
+        history.append(
+            {
+                "timestamp": int(time.time()),
+                "python": sys.version.split()[0],
+                "network": "local" if local else network,
+                "fork_block": block,
+                "calls": calls,
+                "results": results,
+                "suite": suite,
+                "suites": suites,
+            }
+        )
+        save_json(RESULTS_FILE, history)
+        click.echo(f"\nResults saved to {RESULTS_FILE}")
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import statistics
+import click
+from dotenv import load_dotenv
+from web3._utils.method_formatters import log_entry_formatter
+from web3.datastructures import AttributeDict
+from utils.cache_helpers import cache_path, load_json, save_json
+from utils.client_helpers import get_client
+from utils.log_helpers import LogDecoder, iter_abis
+
+load_dotenv()
+
+# constants
+RESULTS_FILE = cache_path("benchmarks", "log_decoding.json")
+CHUNK_SIZE = 2000
+
+# busy tokens that are skipped by default, since they emit far more logs
+TOKEN_CONTRACTS = ["USDC", "WETH"]
+
+
+def fetch_logs(snx, addresses, from_block, to_block, chunk_size=CHUNK_SIZE):
+    """Fetch raw logs for a list of contracts, in chunks of blocks"""
+    path = cache_path(
+        "benchmarks", f"logs_{snx.network_id}_{from_block}_{to_block}.json"
+    )
+    logs = load_json(path)
+    if logs is not None:
+        return logs
+
+    logs = []
+    for start in range(from_block, to_block + 1, chunk_size):
+        end = min(start + chunk_size - 1, to_block)
+        response = snx.web3.provider.make_request(
+            "eth_getLogs",
+            [{"address": addresses, "fromBlock": hex(start), "toBlock": hex(end)}],
+        )
+        if "error" in response:
+            raise ValueError(
+                f"eth_getLogs failed for {start}-{end}: {response['error']}"
+            )
+        logs.extend(response["result"])
+        snx.logger.info(f"Fetched {len(logs)} logs up to block {end}")
+
+    save_json(path, logs)
+    return logs
+
+
+def get_web3_events(snx, decoder):
+    """
+    Map each contract address and topic to a web3 event, so the baseline only pays
+    for decoding, as if the event were known in advance
+    """
+    events = {}
+    for _, address, abi in iter_abis(snx.contracts):
+        if not address:
+            continue
+        contract = snx.web3.eth.contract(address=address, abi=abi)
+        names = [item["name"] for item in abi if item.get("type") == "event"]
+        address_events = decoder.address_events[address.lower()]
+        for (topic, num_topics), entry in address_events.items():
+            if entry.name in names:
+                key = (address.lower(), topic, num_topics)
+                events.setdefault(key, contract.events[entry.name]())
+    return events
+
+
+def decode_web3(events, logs):
+    """Decode logs one at a time with web3, skipping unknown events"""
+    decoded = []
+    for log in logs:
+        if len(log["topics"]) == 0:
+            continue
+        key = (log["address"].lower(), bytes(log["topics"][0]), len(log["topics"]))
+        event = events.get(key)
+        if event is not None:
+            decoded.append(event.process_log(log))
+    return decoded
+
+
+def time_runs(fn, repeat):
+    """Run a function several times, returning its last result and median time"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+@click.command()
+@click.option(
+    "--rpc",
+    default=lambda: os.getenv("NETWORK_8453_RPC"),
+    help="Node RPC (default: NETWORK_8453_RPC)",
+)
+@click.option("--to-block", type=int, help="Last block to fetch (default: latest)")
+@click.option("--blocks", default=20000, show_default=True, help="Blocks to fetch")
+@click.option(
+    "--chunk-size", default=CHUNK_SIZE, show_default=True, help="Blocks per request"
+)
+@click.option("--include-tokens", is_flag=True, help="Also fetch USDC and WETH logs")
+@click.option("--repeat", default=3, show_default=True, help="Runs per decoder")
+@click.option("--no-save", is_flag=True, help="Don't store the results")
+def cli(rpc, to_block, blocks, chunk_size, include_tokens, repeat, no_save):
+    snx = get_client(provider_rpc=rpc)
+
+    start = time.perf_counter()
+    decoder = LogDecoder(snx.contracts, snx.web3.codec)
+    index_s = time.perf_counter() - start
+    click.echo(
+        f"Indexed {len(decoder.events)} events and {len(decoder.errors)} errors "
+        f"from {len(decoder.contract_names)} contracts in {index_s:.3f}s"
+    )
+
+    # logs of the indexed contracts, pinned to a block range so they can be cached
+    to_block = to_block or snx.web3.eth.block_number
+    from_block = to_block - blocks + 1
+    addresses = [
+        snx.web3.to_checksum_address(address)
+        for address, contract in decoder.contract_names.items()
+        if include_tokens or contract not in TOKEN_CONTRACTS
+    ]
+    raw_logs = fetch_logs(snx, addresses, from_block, to_block, chunk_size)
+    logs = [AttributeDict.recursive(log_entry_formatter(log)) for log in raw_logs]
+    click.echo(f"Decoding {len(logs)} logs from blocks {from_block} to {to_block}")
+
+    events = get_web3_events(snx, decoder)
+    web3_decoded, web3_s = time_runs(lambda: decode_web3(events, logs), repeat)
+    decoded, decoder_s = time_runs(lambda: decoder.decode_logs(logs), repeat)
+    _, raw_s = time_runs(lambda: decoder.decode_logs(raw_logs), repeat)
+
+    # both decoders should agree on every log
+    mismatches = sum(
+        a["event"] != b.event or a["args"] != b.args
+        for a, b in zip(web3_decoded, decoded)
+    )
+    if len(web3_decoded) != len(decoded) or mismatches > 0:
+        click.echo(
+            f"Decoders disagree: {len(web3_decoded)} and {len(decoded)} logs, "
+            f"{mismatches} mismatches"
+        )
+
+    results = {
+        "web3": web3_s,
+        "decoder": decoder_s,
+        "decoder_raw": raw_s,
+    }
+    click.echo(f"\n{'decoder':<16}{'time':>10}{'logs/s':>12}{'speedup':>10}")
+    for name, seconds in results.items():
+        click.echo(
+            f"{name:<16}{seconds:>9.3f}s{len(decoded) / seconds:>12.0f}"
+            f"{web3_s / seconds:>9.1f}x"
+        )
+
+    counts = {}
+    for log in decoded:
+        counts[log.event] = counts.get(log.event, 0) + 1
+    click.echo("\nMost common events:")
+    for event, count in sorted(counts.items(), key=lambda x: x[1], reverse=True)[:10]:
+        click.echo(f"    {event:<36}{count:>8}")
+
+    if not no_save:
+        history = load_json(RESULTS_FILE, [])
+        history.append(
+            {
+                "timestamp": int(time.time()),
+                "python": sys.version.split()[0],
+                "network_id": snx.network_id,
+                "from_block": from_block,
+                "to_block": to_block,
+                "logs": len(decoded),
+                "index_s": index_s,
+                "results": results,
+            }
+        )
+        save_json(RESULTS_FILE, history)
+        click.echo(f"\nResults saved to {RESULTS_FILE}")
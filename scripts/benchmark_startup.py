@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import statistics
+import click
+from utils.cache_helpers import ROOT_DIR, cache_path, load_json, save_json
+
+# constants
+RESULTS_FILE = cache_path("benchmarks", "startup.json")
+SCRIPTS_DIR = os.path.join(ROOT_DIR, "scripts")
+TOP_IMPORTS = 5
+# scripts whose `cli` only reads with its default options. The others start
+# anvil, serve forks or submit transactions, so only their imports are measured
+CLI_SCRIPTS = ["pin_fork_blocks", "stress_prices"]
+
+# runs in a fresh interpreter: import the script, then run `main`, or the click
+# `cli` of the scripts in CLI_SCRIPTS with its default options, until the first
+# json-rpc request is about to be sent and abort it before it leaves
+PROBE = """
+import sys, json, time, importlib
+
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+result = {"import_s": time.perf_counter() - start, "first_rpc_s": None, "error": None}
+
+
+class FirstRequest(BaseException):
+    pass
+
+
+def make_request(self, method, params):
+    raise FirstRequest(method)
+
+
+if sys.argv[2] == "1":
+    import click
+    from web3 import HTTPProvider, IPCProvider, WebsocketProvider
+
+    entry_point = None
+    if hasattr(module, "main"):
+        entry_point = module.main
+    elif sys.argv[3] == "1" and isinstance(getattr(module, "cli", None), click.Command):
+        entry_point = lambda: module.cli.main(args=[], standalone_mode=False)
+
+    for provider in (HTTPProvider, IPCProvider, WebsocketProvider):
+        provider.make_request = make_request
+    if entry_point is None:
+        result["error"] = "not measured: no main, and the cli isn't in CLI_SCRIPTS"
+    else:
+        try:
+            entry_point()
+            result["error"] = "returned without a json-rpc request"
+        except FirstRequest:
+            result["first_rpc_s"] = time.perf_counter() - start
+        except click.ClickException as err:
+            result["error"] = f"not measured: {err.format_message()}"
+        except BaseException as err:
+            result["error"] = f"{type(err).__name__}: {err}"
+
+print("BENCHMARK_RESULT " + json.dumps(result))
+"""
+
+
+def list_scripts():
+    """List the scripts that can be benchmarked, excluding this one"""
+    this_script = os.path.splitext(os.path.basename(__file__))[0]
+    return sorted(
+        name[:-3]
+        for name in os.listdir(SCRIPTS_DIR)
+        if name.endswith(".py") and name[:-3] not in (this_script, "__init__")
+    )
+
+
+def run_probe(script, first_rpc=True, importtime=False, timeout=300):
+    """Run the probe for a script in a subprocess"""
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    args += ["-c", PROBE, f"scripts.{script}", "1" if first_rpc else "0"]
+    args += ["1" if script in CLI_SCRIPTS else "0"]
+
+    # in its own process group, so anything the script started is killed with it
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        args,
+        cwd=ROOT_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+    wall_time = time.perf_counter() - start
+
+    stderr_lines = stderr.strip().splitlines()
+    result = {"error": stderr_lines[-1] if len(stderr_lines) > 0 else None}
+    for line in stdout.splitlines():
+        if line.startswith("BENCHMARK_RESULT "):
+            result = json.loads(line[len("BENCHMARK_RESULT ") :])
+    result["wall_s"] = wall_time
+    return result, stderr
+
+
+def parse_importtime(stderr, top=TOP_IMPORTS):
+    """Get the slowest top-level imports from `-X importtime` output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, cumulative, package = line[len("import time:") :].split("|")
+        if package.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        imports.append((package.strip(), int(cumulative) / 1e6))
+
+    return sorted(imports, key=lambda x: x[1], reverse=True)[:top]
+
+
+def benchmark_script(script, repeat=3, first_rpc=True):
+    """Benchmark a script, returning the median of each measurement"""
+    runs = [run_probe(script, first_rpc=first_rpc)[0] for _ in range(repeat)]
+    _, stderr = run_probe(script, first_rpc=False, importtime=True)
+
+    def median(key):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        return statistics.median(values) if len(values) > 0 else None
+
+    return {
+        "import_s": median("import_s"),
+        "first_rpc_s": median("first_rpc_s"),
+        "wall_s": median("wall_s"),
+        "error": runs[-1].get("error"),
+        "top_imports": parse_importtime(stderr),
+    }
+
+
+def get_revision():
+    """Get the current git revision, if available"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_seconds(value, previous=None):
+    if value is None:
+        return "-"
+    text = f"{value:.3f}s"
+    if previous is not None:
+        text += f" ({value - previous:+.3f})"
+    return text
+
+
+@click.command()
+@click.option(
+    "--script",
+    "scripts",
+    multiple=True,
+    help="Only benchmark these scripts (default: all scripts)",
+)
+@click.option("--repeat", default=3, show_default=True, help="Runs per script")
+@click.option(
+    "--no-rpc",
+    is_flag=True,
+    help="Only measure import time, without running `main` or `cli`",
+)
+@click.option("--no-save", is_flag=True, help="Don't store the results")
+def cli(scripts, repeat, no_rpc, no_save):
+    scripts = scripts or list_scripts()
+    history = load_json(RESULTS_FILE, [])
+
+    # compare with the most recent stored result for each script
+    previous = {}
+    for run in history:
+        previous.update(run["results"])
+
+    results = {}
+    for script in scripts:
+        click.echo(f"Benchmarking {script}...")
+        results[script] = benchmark_script(script, repeat=repeat, first_rpc=not no_rpc)
+
+    click.echo(f"\n{'script':<24}{'import':>20}{'first rpc':>20}")
+    for script, result in results.items():
+        last = previous.get(script, {})
+        click.echo(
+            f"{script:<24}"
+            f"{format_seconds(result['import_s'], last.get('import_s')):>20}"
+            f"{format_seconds(result['first_rpc_s'], last.get('first_rpc_s')):>20}"
+        )
+        for package, seconds in result["top_imports"]:
+            click.echo(f"    {package:<36}{seconds:>8.3f}s")
+        if result["error"] and not no_rpc:
+            click.echo(f"    error: {result['error']}")
+
+    if not no_save:
+        history.append(
+            {
+                "timestamp": int(time.time()),
+                "revision": get_revision(),
+                "python": sys.version.split()[0],
+                "results": results,
+            }
+        )
+        save_json(RESULTS_FILE, history)
+        click.echo(f"\nResults saved to {RESULTS_FILE}")
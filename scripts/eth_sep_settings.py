@@ -1,8 +1,9 @@
 import click
 import re
 from functools import wraps
-from ape import accounts, networks, chain, Contract
-from synthetix import Synthetix
+from ape import networks, chain
+from utils.client_helpers import get_client
+from utils.token_helpers import get_token_metadata, get_tokens_metadata
 
 
 # functions
@@ -27,11 +28,7 @@ def format_value(key, value):
 
 def print_collateral_config(snx, collateral_config):
     click.echo("\n--- Collateral Configuration ---")
-    token = Contract(
-        address=collateral_config.tokenAddress,
-        abi=snx.contracts["common"]["ERC20"]["abi"],
-    )
-    token_name = token.call_view_method("name")
+    token_name = get_token_metadata(snx, collateral_config.tokenAddress)["name"]
     click.echo(f"Token: {token_name}")
 
     for key, value in collateral_config.items():
@@ -52,6 +49,9 @@ def chain_fork(func):
 
 @chain_fork
 def main():
+    # ape contract types are only loaded when the script runs
+    from ape import Contract
+
     click.echo(
         f"""
     Fork provider started: {chain.provider.uri}
@@ -59,7 +59,7 @@ def main():
     """
     )
 
-    snx = Synthetix(
+    snx = get_client(
         provider_rpc=chain.provider.uri,
         is_fork=True,
         request_kwargs={"timeout": 120},
@@ -83,6 +83,12 @@ def main():
     collateral_configurations = CoreProxy.call_view_method(
         "getCollateralConfigurations", False
     )
+
+    # fetch all token metadata up front
+    get_tokens_metadata(
+        snx, [collateral.tokenAddress for collateral in collateral_configurations]
+    )
+
     for index, collateral in enumerate(collateral_configurations, 1):
         click.echo(f"\nCollateral #{index}")
         print_collateral_config(snx, collateral)
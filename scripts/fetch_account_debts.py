@@ -1,8 +1,13 @@
 import os
-import pandas as pd
-from synthetix import Synthetix
-from synthetix.utils.multicall import multicall_erc7412
+import sys
+
+if __name__ == "__main__":
+    # let ``python scripts/<name>.py`` import utils from the repo root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from dotenv import load_dotenv
+from utils.client_helpers import get_client
+from utils.multicall_helpers import OraclePrefetch, multicall_erc7412
 
 load_dotenv()
 
@@ -33,7 +38,8 @@ def get_debts(snx, account_ids):
     # create chunks
     chunks = [account_ids[x : x + 500] for x in range(0, len(account_ids), 500)]
 
-    # run a query for each chunk
+    # run a query for each chunk, reusing the oracle updates of the first chunk
+    prefetch = OraclePrefetch(snx)
     debts = []
     for chunk in chunks:
         fn_inputs = [(account_id,) for account_id in chunk]
@@ -42,6 +48,7 @@ def get_debts(snx, account_ids):
             snx.perps.market_proxy,
             "debt",
             fn_inputs,
+            prefetch=prefetch,
         )
         account_debt = [x / 1e18 for x in account_debt]
         debts.extend(zip(chunk, account_debt))
@@ -50,7 +57,7 @@ def get_debts(snx, account_ids):
 
 
 def main():
-    snx = Synthetix(
+    snx = get_client(
         provider_rpc=RPC,
         cannon_config={
             "package": "synthetix-omnibus",
@@ -68,6 +75,8 @@ def main():
     debts = get_debts(snx, account_ids)
 
     # convert to pandas and save to csv
+    import pandas as pd
+
     df_debts = pd.DataFrame(debts, columns=["account_id", "debt"])
     df_debts.to_csv("data/debts.csv", index=False)
 
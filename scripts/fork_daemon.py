@@ -0,0 +1,63 @@
+import time
+import click
+from dotenv import load_dotenv
+from utils.daemon_helpers import (
+    DAEMON_SOCKET,
+    FORK_NETWORKS,
+    REFRESH_AFTER,
+    ForkDaemon,
+    daemon_status,
+)
+
+load_dotenv()
+
+
+def print_forks(forks):
+    click.echo(f"\n{'fork':<22}{'leased':>8}{'leases':>8}{'snapshot':>10}  rpc")
+    for fork in forks:
+        click.echo(
+            f"{fork['name']:<22}{'yes' if fork['leased'] else 'no':>8}"
+            f"{fork['leases']:>8}{fork['snapshot_age']:>9.0f}s"
+            f"  {fork['ipc_path'] or fork['uri']}"
+        )
+
+
+@click.command()
+@click.option(
+    "--network",
+    "networks",
+    multiple=True,
+    type=click.Choice(list(FORK_NETWORKS)),
+    help="Networks to fork (default: all)",
+)
+@click.option("--forks", default=1, show_default=True, help="Forks per network")
+@click.option("--socket", "socket_path", default=DAEMON_SOCKET, show_default=True)
+@click.option(
+    "--refresh",
+    default=REFRESH_AFTER,
+    show_default=True,
+    help="Seconds before idle forks get fresh prices",
+)
+@click.option("--http", is_flag=True, help="Don't serve the forks over IPC")
+@click.option("--status", is_flag=True, help="Show the forks of a running daemon")
+def cli(networks, forks, socket_path, refresh, http, status):
+    if status:
+        print_forks(daemon_status(socket_path))
+        return
+
+    click.echo("Starting the forks...")
+    daemon = ForkDaemon(
+        networks or list(FORK_NETWORKS),
+        forks_per_network=forks,
+        socket_path=socket_path,
+        refresh_after=refresh,
+        ipc=not http,
+    )
+    with daemon.start():
+        print_forks(daemon.status())
+        click.echo(f"\nServing leases at {socket_path}, press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            click.echo("Stopping the forks...")
@@ -0,0 +1,334 @@
+import json
+import os
+import random
+import threading
+import time
+import click
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from web3 import Web3
+from utils.client_helpers import get_client
+from utils.funding_helpers import derive_accounts, fund_token, set_eth_balances
+from utils.token_helpers import get_token_decimals
+
+load_dotenv()
+
+# constants
+LOAD_NETWORKS = {
+    8453: {
+        "preset": "andromeda",
+        "usdc_whale": "0xD34EA7278e6BD48DefE656bbE263aEf11101469c",
+        "core_collateral": "sUSDC",
+    },
+    42161: {
+        "preset": "main",
+        "usdc_whale": "0x1F7bc4dA1a0c2e49d7eF542F74CD46a3FE592cb1",
+        "core_collateral": "USDC",
+    },
+}
+OPERATIONS = ["perps", "spot", "core"]
+ETH_BALANCE = 10
+USDC_PER_ACCOUNT = 10000
+SETUP_WRAP_AMOUNT = 5000
+PERPS_COLLATERAL = 2000
+SPOT_WRAP_AMOUNT = 10
+CORE_DEPOSIT_AMOUNT = 10
+PERCENTILES = [50, 90, 99]
+
+
+def parse_mix(mix):
+    """Parse an operation mix like ``perps=2,spot=1,core=1`` into weights"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise click.BadParameter(f"Unknown operation {name}, use {OPERATIONS}")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of values"""
+    values = sorted(values)
+    if len(values) == 0:
+        return None
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class LoadWorker:
+    """Drive a random mix of operations with one client and its accounts"""
+
+    def __init__(self, snx, config, market_name, order_size, seed):
+        self.snx = snx
+        self.config = config
+        self.market_name = market_name
+        self.order_size = order_size
+        self.random = random.Random(seed)
+        self.samples = []
+        self.perps_account_id = None
+        self.core_account_id = None
+        self.core_decimals = None
+        self.position_sign = 1
+
+    def _collateral_address(self):
+        name = self.config["core_collateral"]
+        if name in self.snx.spot.markets_by_name:
+            return self.snx.spot.markets_by_name[name]["contract"].address
+        return self.snx.contracts[name]["address"]
+
+    def _submit(self, operation, submit):
+        """Submit a transaction and record its latency and outcome"""
+        start = time.perf_counter()
+        try:
+            tx_hash = submit()
+            receipt = self.snx.wait(tx_hash)
+            status = "ok" if receipt["status"] == 1 else "reverted"
+        except Exception as e:
+            self.snx.logger.debug(f"{operation} failed: {e}")
+            status = "error"
+        self.samples.append(
+            {
+                "operation": operation,
+                "latency": time.perf_counter() - start,
+                "status": status,
+            }
+        )
+        return status == "ok"
+
+    def setup(self):
+        """Create accounts, approve the proxies and deposit perps margin"""
+        snx = self.snx
+        usdc = snx.contracts["USDC"]["address"]
+        spot_proxy = snx.spot.market_proxy.address
+        core_proxy = snx.core.core_proxy.address
+        perps_proxy = snx.perps.market_proxy.address
+        collateral = self._collateral_address()
+        # the SDK assumes 18 decimals, but USDC has 6
+        self.core_decimals = get_token_decimals(snx, collateral)
+
+        snx.wait(snx.perps.create_account(submit=True))
+        self.perps_account_id = snx.perps.get_account_ids()[-1]
+        snx.wait(snx.core.create_account(submit=True))
+        self.core_account_id = snx.core.get_account_ids()[-1]
+
+        snx.wait(snx.approve(usdc, spot_proxy, submit=True))
+        snx.wait(snx.approve(collateral, core_proxy, submit=True))
+        snx.wait(snx.spot.approve(spot_proxy, market_name="sUSDC", submit=True))
+        snx.wait(snx.spot.approve(perps_proxy, market_name="sUSD", submit=True))
+
+        # wrap USDC, and sell some of it for sUSD perps margin
+        snx.wait(snx.spot.wrap(SETUP_WRAP_AMOUNT, market_name="sUSDC", submit=True))
+        snx.wait(
+            snx.spot.atomic_order(
+                "sell", PERPS_COLLATERAL, market_name="sUSDC", submit=True
+            )
+        )
+        susd_balance = snx.get_susd_balance()["balance"]
+        snx.wait(
+            snx.perps.modify_collateral(
+                int(susd_balance),
+                market_name="sUSD",
+                account_id=self.perps_account_id,
+                submit=True,
+            )
+        )
+
+    def run_perps(self):
+        # alternate sides so positions stay small
+        size = self.order_size * self.position_sign
+        self.position_sign *= -1
+        committed = self._submit(
+            "perps.commit_order",
+            lambda: self.snx.perps.commit_order(
+                size,
+                market_name=self.market_name,
+                account_id=self.perps_account_id,
+                submit=True,
+            ),
+        )
+        if committed:
+            self._submit(
+                "perps.settle_order",
+                lambda: self.snx.perps.settle_order(
+                    account_id=self.perps_account_id, submit=True
+                ),
+            )
+
+    def run_spot(self):
+        self._submit(
+            "spot.wrap",
+            lambda: self.snx.spot.wrap(
+                SPOT_WRAP_AMOUNT, market_name="sUSDC", submit=True
+            ),
+        )
+
+    def run_core(self):
+        self._submit(
+            "core.deposit",
+            lambda: self.snx.core.deposit(
+                self._collateral_address(),
+                CORE_DEPOSIT_AMOUNT,
+                decimals=self.core_decimals,
+                account_id=self.core_account_id,
+                submit=True,
+            ),
+        )
+
+    def run(self, weights, iterations=None, deadline=None, stop=None):
+        names = list(weights)
+        count = 0
+        while iterations is None or count < iterations:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if stop is not None and stop.is_set():
+                break
+            operation = self.random.choices(names, weights=list(weights.values()))[0]
+            getattr(self, f"run_{operation}")()
+            count += 1
+        return self.samples
+
+
+def summarize(samples, elapsed):
+    """Summarize throughput, latency percentiles and failure rates by operation"""
+    by_operation = {}
+    for sample in samples:
+        by_operation.setdefault(sample["operation"], []).append(sample)
+
+    def stats(group):
+        latencies = [sample["latency"] for sample in group]
+        statuses = [sample["status"] for sample in group]
+        return {
+            "count": len(group),
+            "tps": statuses.count("ok") / elapsed if elapsed > 0 else 0,
+            "revert_rate": statuses.count("reverted") / len(group),
+            "error_rate": statuses.count("error") / len(group),
+            **{f"p{pct}": percentile(latencies, pct) for pct in PERCENTILES},
+        }
+
+    summary = {
+        operation: stats(group) for operation, group in sorted(by_operation.items())
+    }
+    if len(samples) > 0:
+        summary["total"] = stats(samples)
+    return summary
+
+
+def format_summary(summary, elapsed):
+    lines = [
+        f"{'operation':<22}{'count':>8}{'tps':>8}{'reverts':>9}{'errors':>8}"
+        + "".join(f"{f'p{pct} (s)':>10}" for pct in PERCENTILES)
+    ]
+    for operation, stats in summary.items():
+        lines.append(
+            f"{operation:<22}{stats['count']:>8}{stats['tps']:>8.2f}"
+            f"{stats['revert_rate']:>9.1%}{stats['error_rate']:>8.1%}"
+            + "".join(f"{stats[f'p{pct}']:>10.2f}" for pct in PERCENTILES)
+        )
+    lines.append(f"Elapsed: {elapsed:.1f}s")
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option("--rpc", required=True, help="RPC of a running fork, e.g. from base_fork")
+@click.option("--accounts", default=10, show_default=True, help="Accounts to drive")
+@click.option(
+    "--mix",
+    default="perps=1,spot=1,core=1",
+    show_default=True,
+    help="Relative weight of each operation",
+)
+@click.option("--duration", type=float, help="Seconds to run for")
+@click.option("--iterations", type=int, help="Operations per account")
+@click.option("--market", default="ETH", show_default=True, help="Perps market")
+@click.option("--order-size", default=0.01, show_default=True, help="Perps order size")
+@click.option("--seed", default=0, show_default=True, help="Random seed for the mix")
+@click.option("--output", help="Write the samples and summary to a JSON file")
+def cli(
+    rpc,
+    accounts,
+    mix,
+    duration,
+    iterations,
+    market,
+    order_size,
+    seed,
+    output,
+):
+    weights = parse_mix(mix)
+    if duration is None and iterations is None:
+        iterations = 10
+
+    # the fork reports the chain id of the network it forked
+    network_id = Web3(Web3.HTTPProvider(rpc)).eth.chain_id
+    if network_id not in LOAD_NETWORKS:
+        raise click.UsageError(f"Network {network_id} is not supported")
+    config = LOAD_NETWORKS[network_id]
+    client_kwargs = {
+        "provider_rpc": rpc,
+        "network_id": network_id,
+        "cannon_config": {
+            "package": "synthetix-omnibus",
+            "version": "latest",
+            "preset": config["preset"],
+        },
+        "pyth_cache_ttl": 0,
+        "price_service_endpoint": os.getenv("PRICE_SERVICE_ENDPOINT"),
+        "request_kwargs": {"timeout": 120},
+    }
+
+    # fund all accounts in bulk before creating their clients
+    snx = get_client(**client_kwargs)
+    signers = derive_accounts(accounts)
+    addresses = [signer.address for signer in signers]
+    set_eth_balances(snx, addresses, ETH_BALANCE)
+    fund_token(
+        snx,
+        snx.contracts["USDC"]["address"],
+        addresses,
+        USDC_PER_ACCOUNT,
+        config["usdc_whale"],
+    )
+
+    click.echo(f"Setting up {accounts} accounts")
+    workers = [
+        LoadWorker(
+            get_client(
+                address=signer.address,
+                private_key=signer.key.hex(),
+                **client_kwargs,
+            ),
+            config,
+            market,
+            order_size,
+            seed + index,
+        )
+        for index, signer in enumerate(signers)
+    ]
+    with ThreadPoolExecutor(max_workers=accounts) as executor:
+        list(executor.map(lambda worker: worker.setup(), workers))
+
+    click.echo(f"Running {mix} with {accounts} accounts")
+    stop = threading.Event()
+    start = time.monotonic()
+    deadline = start + duration if duration is not None else None
+    with ThreadPoolExecutor(max_workers=accounts) as executor:
+        futures = [
+            executor.submit(worker.run, weights, iterations, deadline, stop)
+            for worker in workers
+        ]
+        try:
+            samples = [sample for future in futures for sample in future.result()]
+        except KeyboardInterrupt:
+            stop.set()
+            samples = [sample for future in futures for sample in future.result()]
+    elapsed = time.monotonic() - start
+
+    summary = summarize(samples, elapsed)
+    click.echo(format_summary(summary, elapsed))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"summary": summary, "samples": samples}, f, indent=2)
+        click.echo(f"Saved results to {output}")
@@ -0,0 +1,294 @@
+import json
+import os
+import queue
+import threading
+import time
+import click
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.account_helpers import bootstrap_core_account
+from utils.arb_helpers import mock_arb_precompiles
+from utils.client_helpers import get_client
+from utils.fork_helpers import (
+    dump_state,
+    get_fork_blocks,
+    load_state,
+    revert,
+    snapshot,
+    start_anvil,
+)
+from utils.funding_helpers import derive_accounts, fund_token, set_eth_balances
+from utils.perps_helpers import COLLATERALS, FLOWS, check_tx
+
+load_dotenv()
+
+# constants
+NETWORK_ID = 42161
+CANNON_CONFIG = {
+    "package": "synthetix-omnibus",
+    "version": "latest",
+    "preset": "main",
+}
+SNX_DEPLOYER = "0xD3DFa13CDc7c133b1700c243f03A8C6Df513A93b"
+USDC_WHALE = "0x1F7bc4dA1a0c2e49d7eF542F74CD46a3FE592cb1"
+ACCOUNT_TIMEOUT_KEY = (
+    "0x6163636f756e7454696d656f7574576974686472617700000000000000000000"
+)
+USDC_LP_AMOUNT = 500000
+USDX_MINT_AMOUNT = 50000
+
+
+def _client(uri, signer):
+    return get_client(
+        provider_rpc=uri,
+        network_id=NETWORK_ID,
+        cannon_config=CANNON_CONFIG,
+        address=signer.address,
+        private_key=signer.key.hex(),
+        price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
+        request_kwargs={"timeout": 120},
+        pyth_cache_ttl=0,
+    )
+
+
+def mint_usdx(snx):
+    """Mint sUSD against USDC, the same way the arbitrum fork tests do"""
+    usdc = snx.contracts["USDC"]["address"]
+
+    # let the minted sUSD be withdrawn right away
+    snx.web3.provider.make_request("anvil_impersonateAccount", [SNX_DEPLOYER])
+    set_eth_balances(snx, [SNX_DEPLOYER], 1)
+    tx_params = snx.core.core_proxy.functions.setConfig(
+        ACCOUNT_TIMEOUT_KEY, "0x" + "00" * 32
+    ).build_transaction(
+        {
+            "from": SNX_DEPLOYER,
+            "nonce": snx.web3.eth.get_transaction_count(SNX_DEPLOYER),
+        }
+    )
+    check_tx(snx, snx.web3.eth.send_transaction(tx_params), "Set account timeout")
+
+    # create an account, deposit, delegate, mint and withdraw in one transaction
+    bootstrap_core_account(snx, usdc, USDC_LP_AMOUNT, mint_amount=USDX_MINT_AMOUNT)
+
+
+def seed_fork(snx, collaterals):
+    """
+    Fund the signer on the primary fork with each collateral, approve the perps
+    market, and create the perps account used by every case
+    """
+    mock_arb_precompiles(snx)
+    set_eth_balances(snx, [snx.address], 1000)
+    fund_token(
+        snx, snx.contracts["USDC"]["address"], [snx.address], 1000000, USDC_WHALE
+    )
+    mint_usdx(snx)
+
+    spot_proxy = snx.spot.market_proxy.address
+    perps_proxy = snx.perps.market_proxy.address
+    for name in collaterals:
+        config = COLLATERALS[name]
+        if "token" in config:
+            token = snx.contracts[config["token"]]["address"]
+            # each case starts from this state, so one deposit's worth is enough
+            amount = config["amount"]
+            if "whale" in config:
+                fund_token(snx, token, [snx.address], amount, config["whale"])
+            else:
+                check_tx(snx, snx.wrap_eth(amount, submit=True), "Wrap ETH")
+            check_tx(snx, snx.approve(token, spot_proxy, submit=True), "Approve")
+            check_tx(
+                snx,
+                snx.spot.wrap(amount, market_name=name, submit=True),
+                f"Wrap {name}",
+            )
+        check_tx(
+            snx,
+            snx.spot.approve(perps_proxy, market_name=name, submit=True),
+            f"Approve {name}",
+        )
+
+    check_tx(snx, snx.perps.create_account(submit=True), "Create perps account")
+    return snx.perps.get_account_ids()[-1]
+
+
+class MatrixWorker:
+    """A fork loaded with the seeded state, reverted to it before each case"""
+
+    def __init__(self, fork, signer, account_id):
+        self.fork = fork
+        self.account_id = account_id
+        self.snx = _client(fork.uri, signer)
+        self.snapshot_id = snapshot(fork.web3)
+
+    def reset(self):
+        revert(self.fork.web3, self.snapshot_id)
+        self.snapshot_id = snapshot(self.fork.web3)
+        # the chain nonce went back with the revert
+        self.snx.nonce = self.snx.web3.eth.get_transaction_count(self.snx.address)
+
+    def run_case(self, case):
+        market_name, collateral_name, flow = case
+        start = time.perf_counter()
+        try:
+            FLOWS[flow](self.snx, self.account_id, market_name, collateral_name)
+            status, error = "passed", None
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            self.reset()
+
+        return {
+            "market": market_name,
+            "collateral": collateral_name,
+            "flow": flow,
+            "status": status,
+            "seconds": time.perf_counter() - start,
+            "error": error,
+            "port": self.fork.port,
+        }
+
+    def run(self, cases, results, echo):
+        while True:
+            try:
+                case = cases.get_nowait()
+            except queue.Empty:
+                return
+            result = self.run_case(case)
+            results.append(result)
+            echo(
+                f"[{len(results)}] {result['status']:<6} {result['seconds']:>6.1f}s "
+                f"{result['market']} / {result['collateral']} / {result['flow']}"
+                + (f": {result['error']}" if result["error"] else "")
+            )
+
+
+def summarize_by_market(results):
+    """Count passes and failures, and add up case times, for each market"""
+    summary = {}
+    for result in results:
+        market = summary.setdefault(
+            result["market"], {"cases": 0, "passed": 0, "failed": 0, "seconds": 0.0}
+        )
+        market["cases"] += 1
+        market[result["status"]] += 1
+        market["seconds"] += result["seconds"]
+    return dict(sorted(summary.items()))
+
+
+def format_report(summary, elapsed):
+    lines = [f"{'market':<10}{'cases':>7}{'passed':>8}{'failed':>8}{'seconds':>10}"]
+    for market, stats in summary.items():
+        lines.append(
+            f"{market:<10}{stats['cases']:>7}{stats['passed']:>8}"
+            f"{stats['failed']:>8}{stats['seconds']:>10.1f}"
+        )
+    serial = sum(stats["seconds"] for stats in summary.values())
+    lines.append(
+        f"Elapsed {elapsed:.1f}s for {serial:.1f}s of cases "
+        f"({serial / elapsed if elapsed > 0 else 0:.1f}x)"
+    )
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option(
+    "--rpc",
+    default=lambda: os.getenv("NETWORK_42161_RPC"),
+    help="Upstream RPC to fork (default: NETWORK_42161_RPC)",
+)
+@click.option(
+    "--block",
+    type=int,
+    default=lambda: get_fork_blocks().get("arbitrum:mainnet"),
+    help="Block to fork (default: the arbitrum:mainnet pin, or latest)",
+)
+@click.option("--workers", default=8, show_default=True, help="Forks to run cases on")
+@click.option("--market", "markets", multiple=True, help="Markets (default: all)")
+@click.option(
+    "--collateral",
+    "collaterals",
+    multiple=True,
+    type=click.Choice(list(COLLATERALS)),
+    help="Collaterals (default: sUSD)",
+)
+@click.option(
+    "--flow",
+    "flows",
+    multiple=True,
+    type=click.Choice(list(FLOWS)),
+    help="Flows (default: round_trip)",
+)
+@click.option("--anvil-path", default="anvil", show_default=True)
+@click.option("--output", help="Write the results to a JSON file")
+def cli(rpc, block, workers, markets, collaterals, flows, anvil_path, output):
+    collaterals = list(collaterals) or ["sUSD"]
+    flows = list(flows) or ["round_trip"]
+    signer = derive_accounts(1)[0]
+
+    forks = []
+    try:
+        # seed one fork, and share its state with the workers
+        primary = start_anvil(rpc, fork_block_number=block, anvil_path=anvil_path)
+        forks.append(primary)
+        block = primary.web3.eth.get_block("latest").number
+        snx = _client(primary.uri, signer)
+
+        click.echo(f"Seeding a fork of block {block}")
+        account_id = seed_fork(snx, collaterals)
+        markets = list(markets) or sorted(snx.perps.markets_by_name)
+        state = dump_state(primary.web3)
+
+        def start_worker(_):
+            fork = start_anvil(rpc, fork_block_number=block, anvil_path=anvil_path)
+            forks.append(fork)
+            load_state(fork.web3, state)
+            return MatrixWorker(fork, signer, account_id)
+
+        cases = [
+            (market, collateral, flow)
+            for market in markets
+            for collateral in collaterals
+            for flow in flows
+        ]
+        workers = min(workers, len(cases))
+        click.echo(f"Starting {workers} forks for {len(cases)} cases")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            matrix_workers = list(executor.map(start_worker, range(workers)))
+
+        case_queue = queue.Queue()
+        for case in cases:
+            case_queue.put(case)
+
+        results = []
+        lock = threading.Lock()
+
+        def echo(message):
+            with lock:
+                click.echo(message)
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(
+                executor.map(
+                    lambda worker: worker.run(case_queue, results, echo),
+                    matrix_workers,
+                )
+            )
+        elapsed = time.monotonic() - start
+    finally:
+        for fork in forks:
+            fork.stop()
+
+    summary = summarize_by_market(results)
+    click.echo(format_report(summary, elapsed))
+    if output:
+        with open(output, "w") as f:
+            json.dump(
+                {"block": block, "summary": summary, "results": results}, f, indent=2
+            )
+        click.echo(f"Saved results to {output}")
+
+    failed = [result for result in results if result["status"] == "failed"]
+    if len(failed) > 0:
+        raise SystemExit(1)
@@ -0,0 +1,73 @@
+import click
+from dotenv import load_dotenv
+from web3 import Web3
+from utils.fork_helpers import get_fork_blocks, get_upstream_rpc, set_fork_block
+
+load_dotenv()
+
+
+def get_head(network, tag="finalized"):
+    """Get the latest finalized block of a network, or the latest block"""
+    rpc = get_upstream_rpc(network)
+    if not rpc or rpc.startswith("$"):
+        raise click.ClickException(f"No RPC is configured for {network}")
+
+    web3 = Web3(Web3.HTTPProvider(rpc, request_kwargs={"timeout": 30}))
+    try:
+        return web3.eth.get_block(tag).number
+    except Exception:
+        # some nodes don't support the finalized tag
+        return web3.eth.block_number
+
+
+@click.command()
+@click.option(
+    "--network",
+    "networks",
+    multiple=True,
+    help="Forked networks, like arbitrum:mainnet (default: all pinned networks)",
+)
+@click.option(
+    "--block",
+    help="Block to pin, or `finalized` or `latest` to advance to the upstream head",
+)
+@click.option("--unpin", is_flag=True, help="Fork the latest block again")
+def cli(networks, block, unpin):
+    pins = get_fork_blocks()
+    for network in networks:
+        if network not in pins:
+            raise click.ClickException(f"{network} is not a fork in ape-config.yaml")
+    networks = list(networks) or [
+        network for network, pinned in pins.items() if pinned is not None
+    ]
+
+    if block is None and not unpin:
+        # show the pins and how far behind the upstream head they are
+        click.echo(f"{'network':<20}{'pinned':>14}{'finalized':>14}{'behind':>10}")
+        for network in list(networks) or list(pins):
+            pinned = pins[network]
+            try:
+                head = get_head(network)
+            except Exception as e:
+                click.echo(f"{network:<20}{pinned or 'latest':>14}  failed: {e}")
+                continue
+            behind = "-" if pinned is None else head - pinned
+            click.echo(f"{network:<20}{pinned or 'latest':>14}{head:>14}{behind:>10}")
+        return
+
+    if len(networks) == 0:
+        raise click.ClickException("No networks are pinned, so pass --network")
+
+    for network in networks:
+        if unpin:
+            set_fork_block(network, None)
+            click.echo(f"{network}: forking the latest block")
+            continue
+
+        block_number = (
+            get_head(network, block)
+            if block in ("finalized", "latest", "safe")
+            else int(block)
+        )
+        set_fork_block(network, block_number)
+        click.echo(f"{network}: {pins[network] or 'latest'} -> {block_number}")
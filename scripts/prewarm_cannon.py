@@ -0,0 +1,29 @@
+import click
+
+
+@click.command()
+@click.option(
+    "--refresh",
+    is_flag=True,
+    help="Re-resolve versions like `latest` from the cannon registry",
+)
+@click.option(
+    "--network-id",
+    type=int,
+    multiple=True,
+    help="Only prewarm deployments for these network ids",
+)
+def cli(refresh, network_id):
+    # web3 and the sdk are only loaded when the command runs
+    from utils.cannon_helpers import CANNON_DEPLOYMENTS, prewarm_cannon_cache
+
+    deployments = [
+        deployment
+        for deployment in CANNON_DEPLOYMENTS
+        if not network_id or deployment[0] in network_id
+    ]
+    click.echo(f"Prewarming {len(deployments)} cannon deployments...")
+
+    resolved = prewarm_cannon_cache(deployments, refresh=refresh)
+    for key, ipfs_hash in resolved.items():
+        click.echo(f"{key}: ipfs://{ipfs_hash}")
@@ -0,0 +1,106 @@
+import time
+import statistics
+import click
+from web3 import Web3
+from utils.fork_helpers import DelayProxy, start_anvil
+from utils.provider_helpers import HedgedProvider
+
+# constants
+ANVIL_ACCOUNT = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+RECIPIENT = "0x70997970C51812dc3A0B58cfdd5dF1cBA1F4D9B4"
+
+
+def parse_floats(text, count):
+    """Parse a comma separated list of floats, padding with the last value"""
+    values = [float(value) for value in text.split(",")]
+    return (values + values[-1:] * count)[:count]
+
+
+def run_reads(web3, count):
+    """Time a number of reads, returning the latency of each"""
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        web3.eth.get_balance(ANVIL_ACCOUNT)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def format_latencies(name, latencies):
+    quantiles = statistics.quantiles(latencies, n=100)
+    return (
+        f"{name:<12}{len(latencies):>8}"
+        f"{statistics.median(latencies):>10.3f}s{quantiles[94]:>10.3f}s"
+        f"{max(latencies):>10.3f}s"
+    )
+
+
+@click.command()
+@click.option("--fork-url", help="RPC to fork (default: fresh local chains)")
+@click.option("--endpoints", default=3, show_default=True, help="anvil instances")
+@click.option(
+    "--delays",
+    default="0.02,0.3,1",
+    show_default=True,
+    help="Injected latency of each endpoint, in seconds",
+)
+@click.option(
+    "--fail-rates",
+    default="0",
+    show_default=True,
+    help="Share of requests each endpoint rejects with a 429",
+)
+@click.option("--reads", default=100, show_default=True, help="Reads per phase")
+@click.option("--hedge-after", default=0.1, show_default=True, help="Hedge budget")
+@click.option("--anvil-path", default="anvil", show_default=True)
+def cli(fork_url, endpoints, delays, fail_rates, reads, hedge_after, anvil_path):
+    delays = parse_floats(delays, endpoints)
+    fail_rates = parse_floats(fail_rates, endpoints)
+
+    forks, proxies = [], []
+    try:
+        for delay, fail_rate in zip(delays, fail_rates):
+            fork = start_anvil(fork_url, anvil_path=anvil_path)
+            forks.append(fork)
+            proxies.append(DelayProxy(fork.uri, delay=delay, fail_rate=fail_rate))
+
+        provider = HedgedProvider(
+            [proxy.uri for proxy in proxies], hedge_after=hedge_after
+        )
+        web3 = Web3(provider)
+
+        # writes stick to one endpoint, so the nonces stay in order, and their
+        # receipts are fetched from the endpoint that accepted them
+        for _ in range(3):
+            tx_hash = web3.eth.send_transaction(
+                {"from": ANVIL_ACCOUNT, "to": RECIPIENT, "value": 1}
+            )
+            web3.eth.wait_for_transaction_receipt(tx_hash)
+        click.echo(f"Sent 3 transactions to {provider.sticky_endpoint.uri}")
+
+        phases = {"healthy": run_reads(web3, reads)}
+
+        # take the fastest endpoint down, then bring it back
+        fastest = min(provider.endpoints, key=lambda e: e.latency or float("inf"))
+        proxy = proxies[provider.endpoints.index(fastest)]
+        proxy.fail_rate = 1
+        phases["failing"] = run_reads(web3, reads)
+        proxy.fail_rate = 0
+        time.sleep(max(fastest.quarantined_until - time.monotonic(), 0))
+        phases["recovered"] = run_reads(web3, reads)
+
+        click.echo(f"\n{'phase':<12}{'reads':>8}{'p50':>11}{'p95':>11}{'max':>11}")
+        for name, latencies in phases.items():
+            click.echo(format_latencies(name, latencies))
+
+        click.echo(f"\n{'endpoint':<28}{'delay':>8}{'latency':>10}{'requests':>10}")
+        for endpoint, delay, proxy in zip(provider.endpoints, delays, proxies):
+            latency = "-" if endpoint.latency is None else f"{endpoint.latency:.3f}s"
+            click.echo(
+                f"{endpoint.uri:<28}{delay:>7}s{latency:>10}{proxy.requests:>10}"
+            )
+    finally:
+        for proxy in proxies:
+            proxy.stop()
+        for fork in forks:
+            fork.stop()
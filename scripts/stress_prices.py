@@ -0,0 +1,299 @@
+import json
+import os
+import time
+import click
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.client_helpers import get_client
+from utils.fork_helpers import get_fork_blocks, start_anvil
+from utils.whatif_helpers import CHUNK_SIZE, WhatIf, get_open_accounts
+
+load_dotenv()
+
+# constants
+NETWORK_ID = 42161
+CANNON_CONFIG = {
+    "package": "synthetix-omnibus",
+    "version": "latest",
+    "preset": "main",
+}
+DEFAULT_KEY = "*"
+
+
+def parse_shock(value):
+    """Parse ``ETH=-0.3`` into a market name and a relative price change"""
+    name, _, shock = value.partition("=")
+    try:
+        return name, float(shock)
+    except ValueError:
+        raise click.BadParameter(f"Can't parse the shock of {value}")
+
+
+def load_scenarios(path, shocks, default_shock):
+    """
+    Read scenarios from a JSON file of ``{name: {market: shock}}``, where
+    ``"*"`` shocks the markets that aren't listed, or make one from the options
+    """
+    if path:
+        with open(path) as f:
+            return json.load(f)
+
+    scenario = dict(shocks)
+    if default_shock:
+        scenario[DEFAULT_KEY] = default_shock
+    name = ", ".join(f"{market} {shock:+.0%}" for market, shock in scenario.items())
+    return {name or "no shock": scenario}
+
+
+def build_scenario(whatif, name, shocks, markets, index_prices):
+    """
+    Set the Pyth price of every market to its index price at the block, shocked.
+    Unshocked markets are set too, so no call needs an oracle update.
+    """
+    scenario = whatif.scenario(name)
+    feeds = {}
+    for market_id, market in markets.items():
+        shock = shocks.get(market["symbol"], shocks.get(DEFAULT_KEY, 0))
+        feeds[market["feed_id"]] = index_prices[market_id] * (1 + shock)
+    for feed_id, price in feeds.items():
+        scenario.set_price(feed_id, price)
+    return scenario
+
+
+def get_calls(snx, market_ids, account_ids):
+    market_proxy = snx.perps.market_proxy
+    calls = [
+        (market_proxy, "getMarketSummary", (market_id,)) for market_id in market_ids
+    ]
+    for account_id in account_ids:
+        calls += [
+            (market_proxy, "canLiquidate", (account_id,)),
+            (market_proxy, "getAvailableMargin", (account_id,)),
+            (market_proxy, "getRequiredMargins", (account_id,)),
+        ]
+    return calls
+
+
+def summarize(results, markets, accounts, sizes, baseline=None):
+    """
+    Count liquidatable accounts, and add up bad debt and margin shortfall. Each
+    account's bad debt and shortfall are split between its markets by notional.
+    """
+    per_market = {}
+    for market_id, summary in zip(markets, results[: len(markets)]):
+        index_price = summary[5] / 1e18
+        per_market[market_id] = {
+            "market": markets[market_id]["symbol"],
+            "index_price": index_price,
+            "skew": summary[0] / 1e18,
+            "skew_usd": summary[0] / 1e18 * index_price,
+            "size": summary[1] / 1e18,
+            "liquidatable": 0,
+            "shortfall": 0.0,
+            "bad_debt": 0.0,
+        }
+
+    liquidatable = set()
+    account_results = results[len(markets) :]
+    for ind, (account_id, market_ids) in enumerate(accounts.items()):
+        can_liquidate, available, (_, maintenance, _) = account_results[
+            ind * 3 : ind * 3 + 3
+        ]
+        shortfall = max(maintenance - available, 0) / 1e18
+        bad_debt = max(-available, 0) / 1e18
+        if can_liquidate:
+            liquidatable.add(account_id)
+
+        notional = {
+            market_id: abs(sizes[(account_id, market_id)])
+            * per_market[market_id]["index_price"]
+            for market_id in market_ids
+            if market_id in per_market
+        }
+        total_notional = sum(notional.values())
+        for market_id, value in notional.items():
+            share = value / total_notional if total_notional > 0 else 0
+            per_market[market_id]["liquidatable"] += int(can_liquidate)
+            per_market[market_id]["shortfall"] += shortfall * share
+            per_market[market_id]["bad_debt"] += bad_debt * share
+
+    return {
+        "liquidatable": len(liquidatable),
+        "new": len(liquidatable - baseline) if baseline is not None else 0,
+        "shortfall": sum(market["shortfall"] for market in per_market.values()),
+        "bad_debt": sum(market["bad_debt"] for market in per_market.values()),
+        "markets": list(per_market.values()),
+        "account_ids": sorted(liquidatable),
+    }
+
+
+def format_report(name, result, top):
+    lines = [
+        f"\n{name}: {result['liquidatable']} liquidatable ({result['new']} new), "
+        f"bad debt {result['bad_debt']:,.0f}, shortfall {result['shortfall']:,.0f}",
+        f"{'market':<12}{'price':>14}{'skew':>16}{'liquidatable':>14}"
+        f"{'shortfall':>14}{'bad debt':>14}",
+    ]
+    markets = sorted(
+        result["markets"],
+        key=lambda market: (market["shortfall"], abs(market["skew_usd"])),
+        reverse=True,
+    )
+    for market in markets[:top]:
+        lines.append(
+            f"{market['market']:<12}{market['index_price']:>14,.4f}"
+            f"{market['skew_usd']:>16,.0f}{market['liquidatable']:>14}"
+            f"{market['shortfall']:>14,.0f}{market['bad_debt']:>14,.0f}"
+        )
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option(
+    "--rpc",
+    default=lambda: os.getenv("NETWORK_42161_RPC"),
+    help="RPC to read from (default: NETWORK_42161_RPC)",
+)
+@click.option(
+    "--block",
+    type=int,
+    default=lambda: get_fork_blocks().get("arbitrum:mainnet"),
+    help=(
+        "Block to evaluate, with Pyth prices from its time "
+        "(default: the arbitrum:mainnet pin, or latest)"
+    ),
+)
+@click.option(
+    "--shock",
+    "shocks",
+    multiple=True,
+    help="A market and the change of its price, e.g. ETH=-0.3",
+)
+@click.option("--default-shock", type=float, help="Change of the other prices")
+@click.option(
+    "--scenarios",
+    "scenarios_path",
+    type=click.Path(exists=True),
+    help='JSON file of {"name": {"ETH": -0.3, "*": -0.1}} scenarios',
+)
+@click.option("--max-accounts", type=int, help="Only evaluate the first accounts")
+@click.option("--top", default=10, show_default=True, help="Markets to show")
+@click.option("--fork", is_flag=True, help="Evaluate on a local anvil fork")
+@click.option("--anvil-path", default="anvil", show_default=True)
+@click.option("--workers", default=8, show_default=True, help="Concurrent multicalls")
+@click.option("--output", help="Write the results to a JSON file")
+def cli(
+    rpc,
+    block,
+    shocks,
+    default_shock,
+    scenarios_path,
+    max_accounts,
+    top,
+    fork,
+    anvil_path,
+    workers,
+    output,
+):
+    scenarios = load_scenarios(
+        scenarios_path, [parse_shock(shock) for shock in shocks], default_shock
+    )
+
+    anvil = None
+    try:
+        # finding the Pyth slots needs debug_traceCall, which anvil supports
+        if fork:
+            anvil = start_anvil(rpc, fork_block_number=block, anvil_path=anvil_path)
+            rpc = anvil.uri
+            block = None
+
+        snx = get_client(
+            provider_rpc=rpc,
+            network_id=NETWORK_ID,
+            cannon_config=CANNON_CONFIG,
+            price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
+            request_kwargs={"timeout": 120},
+            # oracle updates on a fork use prices from the fork's time
+            is_fork=fork,
+        )
+        whatif = WhatIf(snx, block=block, max_workers=workers)
+        markets = {
+            market["market_id"]: snx.perps.market_meta[market["market_id"]]
+            for market in snx.perps.markets_by_name.values()
+        }
+        symbols = {market["symbol"] for market in markets.values()}
+        for scenario_shocks in scenarios.values():
+            unknown = set(scenario_shocks) - symbols - {DEFAULT_KEY}
+            if unknown:
+                raise click.ClickException(f"Unknown markets: {sorted(unknown)}")
+
+        start = time.monotonic()
+        accounts = get_open_accounts(whatif, max_accounts)
+        position_calls = [
+            (snx.perps.market_proxy, "getOpenPositionSize", (account_id, market_id))
+            for account_id, market_ids in accounts.items()
+            for market_id in market_ids
+        ]
+        position_sizes = whatif.evaluate(
+            position_calls, [whatif.scenario()], chunk_size=CHUNK_SIZE
+        )[0]
+        sizes = {
+            args: size / 1e18
+            for (_, _, args), size in zip(position_calls, position_sizes)
+        }
+        click.echo(
+            f"Found {len(accounts)} accounts with {len(sizes)} positions "
+            f"in {time.monotonic() - start:.1f}s"
+        )
+
+        start = time.monotonic()
+        calls = get_calls(snx, list(markets), list(accounts))
+        (baseline,) = whatif.evaluate(
+            calls, [whatif.scenario("baseline")], chunk_size=CHUNK_SIZE
+        )
+        index_prices = {
+            market_id: summary[5] / 1e18
+            for market_id, summary in zip(markets, baseline[: len(markets)])
+        }
+
+        # find the Pyth slot of each feed once, then scenarios are built locally
+        feed_ids = {market["feed_id"] for market in markets.values()}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda feed_id: whatif.patch_price(feed_id, 1), feed_ids))
+        stressed = [
+            build_scenario(whatif, name, scenario_shocks, markets, index_prices)
+            for name, scenario_shocks in scenarios.items()
+        ]
+        results = whatif.evaluate(calls, stressed, chunk_size=CHUNK_SIZE)
+        elapsed = time.monotonic() - start
+    finally:
+        if anvil is not None:
+            anvil.stop()
+
+    baseline = summarize(baseline, markets, accounts, sizes)
+    report = {}
+    click.echo(format_report("baseline", baseline, top))
+    for name, result in zip(scenarios, results):
+        report[name] = summarize(
+            result, markets, accounts, sizes, set(baseline["account_ids"])
+        )
+        click.echo(format_report(name, report[name], top))
+    click.echo(
+        f"\nEvaluated {len(scenarios)} scenarios of {len(markets)} markets "
+        f"and {len(accounts)} accounts at block {whatif.block} in {elapsed:.1f}s"
+    )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(
+                {
+                    "block": whatif.block,
+                    "accounts": len(accounts),
+                    "scenarios": scenarios,
+                    "baseline": baseline,
+                    "results": report,
+                },
+                f,
+                indent=2,
+            )
+        click.echo(f"Saved results to {output}")
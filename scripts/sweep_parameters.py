@@ -0,0 +1,298 @@
+import itertools
+import json
+import os
+import time
+import click
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.client_helpers import get_client
+from utils.fork_helpers import get_fork_blocks, start_anvil
+from utils.whatif_helpers import CHUNK_SIZE, WhatIf, get_open_accounts
+
+load_dotenv()
+
+# constants
+NETWORK_ID = 42161
+CANNON_CONFIG = {
+    "package": "synthetix-omnibus",
+    "version": "latest",
+    "preset": "main",
+}
+# index of each parameter in getLiquidationParameters
+LIQUIDATION_PARAMETERS = {
+    "initial_margin_ratio": 0,
+    "minimum_initial_margin_ratio": 1,
+    "maintenance_margin_scalar": 2,
+    "flag_reward_ratio": 3,
+    "minimum_position_margin": 4,
+}
+# index of each parameter in getCollateralConfigurationFull
+COLLATERAL_PARAMETERS = {
+    "upper_limit_discount": 1,
+    "lower_limit_discount": 2,
+    "discount_scalar": 3,
+}
+PARAMETERS = list(LIQUIDATION_PARAMETERS) + list(COLLATERAL_PARAMETERS)
+
+
+def parse_param(value):
+    """Parse ``name=1,1.5,2`` into a parameter name and its multipliers"""
+    name, _, multipliers = value.partition("=")
+    if name not in PARAMETERS:
+        raise click.BadParameter(f"{name} is not one of {', '.join(PARAMETERS)}")
+    try:
+        return name, [float(multiplier) for multiplier in multipliers.split(",")]
+    except ValueError:
+        raise click.BadParameter(f"Can't parse the multipliers of {value}")
+
+
+def get_grid(params):
+    """Every combination of the multipliers, as ``{name: multiplier}``"""
+    names = [name for name, _ in params]
+    return [
+        dict(zip(names, point))
+        for point in itertools.product(*[multipliers for _, multipliers in params])
+    ]
+
+
+def get_parameters(whatif, market_ids, collateral_ids):
+    """Read the current liquidation parameters and collateral configurations"""
+    market_proxy = whatif.snx.perps.market_proxy
+    calls = [
+        (market_proxy, "getLiquidationParameters", (market_id,))
+        for market_id in market_ids
+    ] + [
+        (market_proxy, "getCollateralConfigurationFull", (collateral_id,))
+        for collateral_id in collateral_ids
+    ]
+    results = whatif.call(calls)
+    liquidation = dict(zip(market_ids, results[: len(market_ids)]))
+    collateral = dict(zip(collateral_ids, results[len(market_ids) :]))
+    return liquidation, collateral
+
+
+def _scale(current, indexes, point):
+    params = list(current)
+    for name, ind in indexes.items():
+        if name in point:
+            params[ind] = int(params[ind] * point[name])
+    return params
+
+
+def build_scenario(whatif, owner, point, liquidation, collateral):
+    """
+    Apply the setter transactions of a grid point, like ``liquidation_setup``,
+    to a scenario. Parameters that don't change are skipped.
+    """
+    market_proxy = whatif.snx.perps.market_proxy
+    name = ", ".join(f"{param}={value:g}" for param, value in point.items())
+    scenario = whatif.scenario(name)
+
+    for market_id, current in liquidation.items():
+        params = _scale(current, LIQUIDATION_PARAMETERS, point)
+        if params != list(current):
+            scenario.apply(
+                market_proxy.functions.setLiquidationParameters(market_id, *params),
+                owner,
+            )
+    for collateral_id, current in collateral.items():
+        params = _scale(current, COLLATERAL_PARAMETERS, point)
+        if params != list(current):
+            scenario.apply(
+                market_proxy.functions.setCollateralConfiguration(
+                    collateral_id, *params
+                ),
+                owner,
+            )
+    return scenario
+
+
+def summarize(results, account_ids, baseline=None):
+    """Count liquidatable accounts and add up their margins"""
+    liquidatable = set()
+    available_margin = 0
+    maintenance_margin = 0
+    for ind, account_id in enumerate(account_ids):
+        can_liquidate, available, (_, maintenance, _) = results[ind * 3 : ind * 3 + 3]
+        if can_liquidate:
+            liquidatable.add(account_id)
+        available_margin += available
+        maintenance_margin += maintenance
+
+    return {
+        "liquidatable": len(liquidatable),
+        "new": len(liquidatable - baseline) if baseline is not None else 0,
+        "share": len(liquidatable) / len(account_ids) if len(account_ids) else 0,
+        "available_margin": available_margin / 1e18,
+        "maintenance_margin": maintenance_margin / 1e18,
+        "account_ids": sorted(liquidatable),
+    }
+
+
+def format_table(rows, params):
+    lines = [
+        "".join(f"{name:>30}" for name in params)
+        + f"{'liquidatable':>14}{'new':>8}{'share':>8}{'maintenance':>16}"
+    ]
+    for row in rows:
+        lines.append(
+            "".join(f"{row['point'].get(name, 1):>29g}x" for name in params)
+            + f"{row['liquidatable']:>14}{row['new']:>8}{row['share']:>8.1%}"
+            f"{row['maintenance_margin']:>16,.0f}"
+        )
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option(
+    "--rpc",
+    default=lambda: os.getenv("NETWORK_42161_RPC"),
+    help="RPC to read from (default: NETWORK_42161_RPC)",
+)
+@click.option(
+    "--block",
+    type=int,
+    default=lambda: get_fork_blocks().get("arbitrum:mainnet"),
+    help=(
+        "Block to evaluate, with Pyth prices from its time "
+        "(default: the arbitrum:mainnet pin, or latest)"
+    ),
+)
+@click.option(
+    "--param",
+    "params",
+    multiple=True,
+    required=True,
+    help=(
+        "A parameter and the multipliers of its current value to sweep, e.g. "
+        f"maintenance_margin_scalar=0.5,1,2. One of: {', '.join(PARAMETERS)}"
+    ),
+)
+@click.option("--market", "markets", multiple=True, help="Markets (default: all)")
+@click.option(
+    "--collateral",
+    "collaterals",
+    multiple=True,
+    help="Collaterals, by synth name (default: all)",
+)
+@click.option("--max-accounts", type=int, help="Only evaluate the first accounts")
+@click.option("--fork", is_flag=True, help="Evaluate on a local anvil fork")
+@click.option("--anvil-path", default="anvil", show_default=True)
+@click.option("--workers", default=8, show_default=True, help="Concurrent multicalls")
+@click.option("--output", help="Write the results to a JSON file")
+def cli(
+    rpc,
+    block,
+    params,
+    markets,
+    collaterals,
+    max_accounts,
+    fork,
+    anvil_path,
+    workers,
+    output,
+):
+    params = [parse_param(param) for param in params]
+    param_names = [name for name, _ in params]
+    grid = get_grid(params)
+
+    anvil = None
+    try:
+        # debug_traceCall is needed to apply the setters, which anvil supports
+        if fork:
+            anvil = start_anvil(rpc, fork_block_number=block, anvil_path=anvil_path)
+            rpc = anvil.uri
+            block = None
+
+        snx = get_client(
+            provider_rpc=rpc,
+            network_id=NETWORK_ID,
+            cannon_config=CANNON_CONFIG,
+            price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
+            request_kwargs={"timeout": 120},
+            # oracle updates on a fork use prices from the fork's time
+            is_fork=fork,
+        )
+        whatif = WhatIf(snx, block=block, max_workers=workers)
+        market_proxy = snx.perps.market_proxy
+        owner = market_proxy.functions.owner().call(block_identifier=whatif.block)
+
+        market_ids = [
+            market_id
+            for market_id, market in snx.perps.market_meta.items()
+            if not markets or market["symbol"] in markets
+        ]
+        collateral_ids = []
+        if any(name in COLLATERAL_PARAMETERS for name in param_names):
+            supported = market_proxy.functions.getSupportedCollaterals().call(
+                block_identifier=whatif.block
+            )
+            collateral_ids = [
+                collateral_id
+                for collateral_id in supported
+                if not collaterals
+                or snx.spot.markets_by_id.get(collateral_id, {}).get("market_name")
+                in collaterals
+            ]
+        if not any(name in LIQUIDATION_PARAMETERS for name in param_names):
+            market_ids = []
+
+        start = time.monotonic()
+        account_ids = list(get_open_accounts(whatif, max_accounts))
+        click.echo(
+            f"Evaluating {len(account_ids)} accounts at block {whatif.block} "
+            f"under {len(grid)} parameter sets"
+        )
+        liquidation, collateral = get_parameters(whatif, market_ids, collateral_ids)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            scenarios = list(
+                executor.map(
+                    lambda point: build_scenario(
+                        whatif, owner, point, liquidation, collateral
+                    ),
+                    grid,
+                )
+            )
+
+        calls = []
+        for account_id in account_ids:
+            calls += [
+                (market_proxy, "canLiquidate", (account_id,)),
+                (market_proxy, "getAvailableMargin", (account_id,)),
+                (market_proxy, "getRequiredMargins", (account_id,)),
+            ]
+        baseline, *results = whatif.evaluate(
+            calls, [whatif.scenario("baseline")] + scenarios, chunk_size=CHUNK_SIZE
+        )
+        elapsed = time.monotonic() - start
+    finally:
+        if anvil is not None:
+            anvil.stop()
+
+    baseline = summarize(baseline, account_ids)
+    rows = []
+    for point, result in zip(grid, results):
+        row = summarize(result, account_ids, set(baseline["account_ids"]))
+        rows.append({"point": point, **row})
+
+    click.echo(
+        f"\nBaseline: {baseline['liquidatable']} of {len(account_ids)} accounts "
+        "are liquidatable\n"
+    )
+    click.echo(format_table(rows, param_names))
+    click.echo(f"\nEvaluated {len(grid)} parameter sets in {elapsed:.1f}s")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(
+                {
+                    "block": whatif.block,
+                    "accounts": len(account_ids),
+                    "baseline": baseline,
+                    "results": rows,
+                },
+                f,
+                indent=2,
+            )
+        click.echo(f"Saved results to {output}")
@@ -2,11 +2,13 @@ import os
 from dotenv import load_dotenv
 from functools import wraps
 import pytest
-from synthetix import Synthetix
-from synthetix.utils import ether_to_wei
 from ape import networks, chain
 from utils.arb_helpers import mock_arb_precompiles
 from utils.chain_helpers import mine_block
+from utils.client_helpers import get_client
+from utils.fork_helpers import get_fork_rpc
+from utils.account_helpers import AccountPool, bootstrap_core_account
+from utils.funding_helpers import resolve_asset_needs, top_up_tokens
 
 load_dotenv()
 
@@ -22,6 +24,17 @@ USDC_MINT_AMOUNT = 1000000
 USDC_LP_AMOUNT = 500000
 USDX_MINT_AMOUNT = 10000
 
+# assets tests can ask for with the `needs` marker
+TOKEN_WHALES = {
+    "ARB": ("ARB", ARB_WHALE, 100000),
+    "USDC": ("USDC", USDC_WHALE, USDC_MINT_AMOUNT),
+    "USDe": ("USDe", USDE_WHALE, 100000),
+    "tBTC": ("tBTC", TBTC_WHALE, 2),
+    "wSOL": ("WSOL", WSOL_WHALE, 10),
+}
+ASSETS = list(TOKEN_WHALES) + ["WETH", "sUSD"]
+ASSET_DEPENDENCIES = {"sUSD": ["USDC"]}
+
 
 def chain_fork(func):
     @wraps(func)
@@ -37,8 +50,8 @@ def chain_fork(func):
 @pytest.fixture(scope="package")
 def snx(pytestconfig):
     # set up the snx instance
-    snx = Synthetix(
-        provider_rpc=chain.provider.uri,
+    snx = get_client(
+        provider_rpc=get_fork_rpc(chain.provider),
         network_id=42161,
         # is_fork=True,
         price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
@@ -52,14 +65,10 @@ def snx(pytestconfig):
     )
     mock_arb_precompiles(snx)
     set_timeout(snx)
-    steal_arb(snx)
-    steal_usdc(snx)
-    steal_usde(snx)
-    steal_tbtc(snx)
-    steal_wsol(snx)
-    update_prices(snx)
-    mint_usdx_with_usdc(snx)
-    wrap_eth(snx)
+    fund_assets(
+        snx,
+        resolve_asset_needs(pytestconfig, __file__, ASSETS, ASSET_DEPENDENCIES),
+    )
     mine_block(snx, chain)
     update_prices(snx)
     return snx
@@ -134,273 +143,33 @@ def update_prices(snx):
 
 
 @chain_fork
-def steal_arb(snx):
-    """The instance can steal ARB tokens"""
-    # check arb balance
-    arb_contract = snx.contracts["ARB"]["contract"]
-    arb_balance = arb_contract.functions.balanceOf(snx.address).call()
-    arb_balance = arb_balance / 10**18
-
-    # get some arb
-    if arb_balance < 100000:
-        transfer_amount = int((100000 - arb_balance) * 10**18)
-        snx.web3.provider.make_request("anvil_impersonateAccount", [ARB_WHALE])
-
-        tx_params = arb_contract.functions.transfer(
-            snx.address, transfer_amount
-        ).build_transaction(
-            {
-                "from": ARB_WHALE,
-                "nonce": snx.web3.eth.get_transaction_count(ARB_WHALE),
-            }
-        )
-
-        # Send the transaction directly without signing
-        tx_hash = snx.web3.eth.send_transaction(tx_params)
-        receipt = snx.wait(tx_hash)
-        if receipt["status"] != 1:
-            raise Exception("ARB Transfer failed")
-
-        assert tx_hash is not None
-        assert receipt is not None
-        assert receipt.status == 1
-        snx.logger.info(f"Stole ARB from {ARB_WHALE}")
-
-
-@chain_fork
-def steal_usdc(snx):
-    """The instance can steal USDC tokens"""
-    # check usdc balance
-    usdc_contract = snx.contracts["USDC"]["contract"]
-    usdc_balance = usdc_contract.functions.balanceOf(snx.address).call()
-    usdc_balance = usdc_balance / 10**6
-
-    # get some usdc
-    if usdc_balance < USDC_MINT_AMOUNT:
-        transfer_amount = int((USDC_MINT_AMOUNT - usdc_balance) * 10**6)
-        snx.web3.provider.make_request("anvil_impersonateAccount", [USDC_WHALE])
-
-        tx_params = usdc_contract.functions.transfer(
-            snx.address, transfer_amount
-        ).build_transaction(
-            {
-                "from": USDC_WHALE,
-                "nonce": snx.web3.eth.get_transaction_count(USDC_WHALE),
-            }
-        )
-
-        # Send the transaction directly without signing
-        tx_hash = snx.web3.eth.send_transaction(tx_params)
-        receipt = snx.wait(tx_hash)
-        if receipt["status"] != 1:
-            raise Exception("USDC Transfer failed")
-
-        assert tx_hash is not None
-        assert receipt is not None
-        assert receipt.status == 1
-        snx.logger.info(f"Stole USDC from {USDC_WHALE}")
-
-
-@chain_fork
-def steal_usde(snx):
-    """The instance can steal USDe tokens"""
-    # check USDe balance
-    usde_contract = snx.contracts["USDe"]["contract"]
-    usde_balance = usde_contract.functions.balanceOf(snx.address).call()
-    usde_balance = usde_balance / 10**18
-
-    # get some usde
-    if usde_balance < 100000:
-        # send some eth to the whale
-        send_tx_params = snx._get_tx_params(to=USDE_WHALE, value=ether_to_wei(1))
-        send_tx_hash = snx.execute_transaction(send_tx_params)
-        send_tx_receipt = snx.wait(send_tx_hash)
-
-        assert send_tx_hash is not None
-        assert send_tx_receipt is not None
-        assert send_tx_receipt.status == 1
-
-        transfer_amount = int((100000 - usde_balance) * 10**18)
-        snx.web3.provider.make_request("anvil_impersonateAccount", [USDE_WHALE])
-
-        tx_params = usde_contract.functions.transfer(
-            snx.address, transfer_amount
-        ).build_transaction(
-            {
-                "from": USDE_WHALE,
-                "nonce": snx.web3.eth.get_transaction_count(USDE_WHALE),
-            }
-        )
-
-        # Send the transaction directly without signing
-        tx_hash = snx.web3.eth.send_transaction(tx_params)
-        receipt = snx.wait(tx_hash)
-        if receipt["status"] != 1:
-            raise Exception("USDe Transfer failed")
-
-        assert tx_hash is not None
-        assert receipt is not None
-        assert receipt.status == 1
-        snx.logger.info(f"Stole USDe from {USDE_WHALE}")
-
-
-@chain_fork
-def steal_tbtc(snx):
-    """The instance can steal tBTC tokens"""
-    # check USDe balance
-    tbtc_contract = snx.contracts["tBTC"]["contract"]
-    tbtc_balance = tbtc_contract.functions.balanceOf(snx.address).call()
-    tbtc_balance = tbtc_balance / 10**18
-
-    # get some tbtc
-    if tbtc_balance < 2:
-        # send some eth to the whale
-        send_tx_params = snx._get_tx_params(to=TBTC_WHALE, value=ether_to_wei(1))
-        send_tx_hash = snx.execute_transaction(send_tx_params)
-        send_tx_receipt = snx.wait(send_tx_hash)
-
-        assert send_tx_hash is not None
-        assert send_tx_receipt is not None
-        assert send_tx_receipt.status == 1
-
-        transfer_amount = int((2 - tbtc_balance) * 10**18)
-        snx.web3.provider.make_request("anvil_impersonateAccount", [TBTC_WHALE])
-
-        tx_params = tbtc_contract.functions.transfer(
-            snx.address, transfer_amount
-        ).build_transaction(
-            {
-                "from": TBTC_WHALE,
-                "nonce": snx.web3.eth.get_transaction_count(TBTC_WHALE),
-            }
-        )
-
-        # Send the transaction directly without signing
-        tx_hash = snx.web3.eth.send_transaction(tx_params)
-        receipt = snx.wait(tx_hash)
-        if receipt["status"] != 1:
-            raise Exception("tBTC Transfer failed")
-
-        assert tx_hash is not None
-        assert receipt is not None
-        assert receipt.status == 1
-        snx.logger.info(f"Stole tBTC from {TBTC_WHALE}")
-
-
-@chain_fork
-def steal_wsol(snx):
-    """The instance can steal WSOL tokens"""
-    # check wSOL balance
-    wsol_contract = snx.contracts["WSOL"]["contract"]
-    wsol_balance = wsol_contract.functions.balanceOf(snx.address).call()
-    wsol_balance = wsol_balance / 10**9
-
-    # get some wsol
-    if wsol_balance < 10:
-        # send some eth to the whale
-        send_tx_params = snx._get_tx_params(to=WSOL_WHALE, value=ether_to_wei(1))
-        send_tx_hash = snx.execute_transaction(send_tx_params)
-        send_tx_receipt = snx.wait(send_tx_hash)
-
-        assert send_tx_hash is not None
-        assert send_tx_receipt is not None
-        assert send_tx_receipt.status == 1
-
-        transfer_amount = int((10 - wsol_balance) * 10**9)
-        snx.web3.provider.make_request("anvil_impersonateAccount", [WSOL_WHALE])
-
-        tx_params = wsol_contract.functions.transfer(
-            snx.address, transfer_amount
-        ).build_transaction(
-            {
-                "from": WSOL_WHALE,
-                "nonce": snx.web3.eth.get_transaction_count(WSOL_WHALE),
-            }
-        )
-
-        # Send the transaction directly without signing
-        tx_hash = snx.web3.eth.send_transaction(tx_params)
-        receipt = snx.wait(tx_hash)
-        if receipt["status"] != 1:
-            raise Exception("wSOL Transfer failed")
-
-        assert tx_hash is not None
-        assert receipt is not None
-        assert receipt.status == 1
-        snx.logger.info(f"Stole wSOL from {WSOL_WHALE}")
+def fund_assets(snx, needs):
+    """Fund only the assets the selected tests need"""
+    snx.logger.info(f"Funding {sorted(needs)}")
+    top_up_tokens(
+        snx,
+        [
+            (snx.contracts[contract]["contract"].address, amount, whale)
+            for asset, (contract, whale, amount) in TOKEN_WHALES.items()
+            if asset in needs
+        ],
+    )
+    if "sUSD" in needs:
+        update_prices(snx)
+        mint_usdx_with_usdc(snx)
+    if "WETH" in needs:
+        wrap_eth(snx)
 
 
 @chain_fork
 def mint_usdx_with_usdc(snx):
     """The instance can mint USDx tokens using USDC as collateral"""
-    # set up token contracts
     token = snx.contracts["USDC"]["contract"]
-    usdc_decimals = token.functions.decimals().call()
-
-    susd = snx.contracts["system"]["USDProxy"]["contract"]
-    susd_decimals = susd.functions.decimals().call()
-
-    # get an account
-    create_account_tx = snx.core.create_account(submit=True)
-    snx.wait(create_account_tx)
-    new_account_id = snx.core.account_ids[-1]
-
-    # approve
-    allowance = snx.allowance(token.address, snx.core.core_proxy.address)
-    if allowance < USDC_LP_AMOUNT:
-        approve_core_tx = snx.approve(
-            token.address, snx.core.core_proxy.address, submit=True
-        )
-        snx.wait(approve_core_tx)
-
-    # deposit the token
-    deposit_tx_hash = snx.core.deposit(
-        token.address,
-        USDC_LP_AMOUNT,
-        decimals=usdc_decimals,
-        account_id=new_account_id,
-        submit=True,
-    )
-    deposit_tx_receipt = snx.wait(deposit_tx_hash)
-    assert deposit_tx_receipt.status == 1
 
-    # delegate the collateral
-    mine_block(snx, chain)
-    delegate_tx_hash = snx.core.delegate_collateral(
-        token.address,
-        USDC_LP_AMOUNT,
-        1,
-        account_id=new_account_id,
-        submit=True,
+    # create an account, deposit, delegate, mint and withdraw in one transaction
+    bootstrap_core_account(
+        snx, token.address, USDC_LP_AMOUNT, mint_amount=USDX_MINT_AMOUNT
     )
-    delegate_tx_receipt = snx.wait(delegate_tx_hash)
-    if delegate_tx_receipt.status != 1:
-        import pdb
-
-        pdb.set_trace()
-    assert delegate_tx_receipt.status == 1
-
-    # mint sUSD
-    mint_tx_hash = snx.core.mint_usd(
-        token.address,
-        USDX_MINT_AMOUNT,
-        1,
-        account_id=new_account_id,
-        submit=True,
-    )
-    mint_tx_receipt = snx.wait(mint_tx_hash)
-    assert mint_tx_receipt.status == 1
-
-    # withdraw
-    withdraw_tx_hash = snx.core.withdraw(
-        USDX_MINT_AMOUNT,
-        token_address=susd.address,
-        decimals=susd_decimals,
-        account_id=new_account_id,
-        submit=True,
-    )
-    withdraw_tx_receipt = snx.wait(withdraw_tx_hash)
-    assert withdraw_tx_receipt.status == 1
 
     # check balance
     usdx_balance = snx.get_susd_balance()["balance"]
@@ -448,29 +217,32 @@ def wrap_eth(snx):
 
 
 @chain_fork
-@pytest.fixture(scope="function")
-def perps_account_id(snx):
-    snx.logger.info("Creating a new perps account")
-    create_tx = snx.perps.create_account(submit=True)
-    snx.wait(create_tx)
+@pytest.fixture(scope="package")
+def perps_account_pool(snx):
+    # create perps accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "perps")
+    pool.fill()
+    return pool
 
-    account_ids = snx.perps.get_account_ids()
-    new_account_id = account_ids[-1]
 
-    yield new_account_id
+@chain_fork
+@pytest.fixture(scope="package")
+def core_account_pool(snx):
+    # create core accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "core")
+    pool.fill()
+    return pool
 
 
-@chain_fork
 @pytest.fixture(scope="function")
-def core_account_id(snx):
-    # create a core account
-    tx_hash = snx.core.create_account(submit=True)
-    tx_receipt = snx.wait(tx_hash)
+def perps_account_id(perps_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield perps_account_pool.lease()
+    perps_account_pool.refill()
 
-    assert tx_hash is not None
-    assert tx_receipt is not None
-    assert tx_receipt.status == 1
 
-    account_id = snx.core.account_ids[-1]
-    snx.logger.info(f"Created core account: {account_id}")
-    return account_id
+@pytest.fixture(scope="function")
+def core_account_id(core_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield core_account_pool.lease()
+    core_account_pool.refill()
@@ -23,10 +23,10 @@ def test_core_module(snx):
 @pytest.mark.parametrize(
     "token_name, test_amount, decimals",
     [
-        ("USDC", USD_TEST_AMOUNT, 6),
-        ("WETH", WETH_TEST_AMOUNT, 18),
-        ("ARB", ARB_TEST_AMOUNT, 18),
-        ("USDe", USD_TEST_AMOUNT, 18),
+        pytest.param("USDC", USD_TEST_AMOUNT, 6, marks=pytest.mark.needs("USDC")),
+        pytest.param("WETH", WETH_TEST_AMOUNT, 18, marks=pytest.mark.needs("WETH")),
+        pytest.param("ARB", ARB_TEST_AMOUNT, 18, marks=pytest.mark.needs("ARB")),
+        pytest.param("USDe", USD_TEST_AMOUNT, 18, marks=pytest.mark.needs("USDe")),
     ],
 )
 def test_deposit_flow(
@@ -81,10 +81,10 @@ def test_deposit_flow(
 @pytest.mark.parametrize(
     "token_name, test_amount, decimals",
     [
-        ("USDC", USD_TEST_AMOUNT, 6),
-        ("WETH", WETH_TEST_AMOUNT, 18),
-        ("ARB", ARB_TEST_AMOUNT, 18),
-        ("USDe", USD_TEST_AMOUNT, 18),
+        pytest.param("USDC", USD_TEST_AMOUNT, 6, marks=pytest.mark.needs("USDC")),
+        pytest.param("WETH", WETH_TEST_AMOUNT, 18, marks=pytest.mark.needs("WETH")),
+        pytest.param("ARB", ARB_TEST_AMOUNT, 18, marks=pytest.mark.needs("ARB")),
+        pytest.param("USDe", USD_TEST_AMOUNT, 18, marks=pytest.mark.needs("USDe")),
     ],
 )
 def test_delegate_flow(
@@ -139,10 +139,26 @@ def test_delegate_flow(
 @pytest.mark.parametrize(
     "token_name, test_amount, mint_amount, decimals",
     [
-        ("USDC", USD_TEST_AMOUNT, USD_MINT_AMOUNT, 6),
-        ("WETH", WETH_TEST_AMOUNT, USD_MINT_AMOUNT, 18),
-        ("ARB", ARB_TEST_AMOUNT, USD_MINT_AMOUNT, 18),
-        ("USDe", USD_TEST_AMOUNT, USD_MINT_AMOUNT, 18),
+        pytest.param(
+            "USDC", USD_TEST_AMOUNT, USD_MINT_AMOUNT, 6, marks=pytest.mark.needs("USDC")
+        ),
+        pytest.param(
+            "WETH",
+            WETH_TEST_AMOUNT,
+            USD_MINT_AMOUNT,
+            18,
+            marks=pytest.mark.needs("WETH"),
+        ),
+        pytest.param(
+            "ARB", ARB_TEST_AMOUNT, USD_MINT_AMOUNT, 18, marks=pytest.mark.needs("ARB")
+        ),
+        pytest.param(
+            "USDe",
+            USD_TEST_AMOUNT,
+            USD_MINT_AMOUNT,
+            18,
+            marks=pytest.mark.needs("USDe"),
+        ),
     ],
 )
 def test_account_delegate_mint(
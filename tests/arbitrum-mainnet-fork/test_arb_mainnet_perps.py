@@ -3,39 +3,43 @@ import math
 from conftest import chain_fork, liquidation_setup, update_prices
 from ape import chain
 from utils.chain_helpers import mine_block
+from utils.log_helpers import get_log_decoder
+from utils.perps_helpers import COLLATERALS, FLOWS
 
 # tests
-MARKET_NAMES = [
+# markets the flows run on, or every market with --all-markets
+MARKET_NAMES = ["BTC", "ETH", "SOL", "WIF"]
+ALL_MARKET_NAMES = [
     "BTC",
     "ETH",
     "SOL",
     "WIF",
-    # "AAVE",
-    # "ADA",
-    # "ARB",
-    # "AVAX",
-    # "BCH",
-    # "BNB",
-    # "CRV",
-    # "DOGE",
-    # "DYDX",
-    # "GMX",
-    # "LINK",
-    # "LTC",
-    # "MKR",
-    # "NEAR",
-    # "OP",
-    # "ORDI",
-    # "PEPE",
-    # "POL",
-    # "PYTH",
-    # "RUNE",
-    # "SHIB",
-    # "STX",
-    # "TIA",
-    # "UNI",
-    # "XLM",
-    # "XRP",
+    "AAVE",
+    "ADA",
+    "ARB",
+    "AVAX",
+    "BCH",
+    "BNB",
+    "CRV",
+    "DOGE",
+    "DYDX",
+    "GMX",
+    "LINK",
+    "LTC",
+    "MKR",
+    "NEAR",
+    "OP",
+    "ORDI",
+    "PEPE",
+    "POL",
+    "PYTH",
+    "RUNE",
+    "SHIB",
+    "STX",
+    "TIA",
+    "UNI",
+    "XLM",
+    "XRP",
 ]
 TEST_USD_COLLATERAL_AMOUNT = 1000
 TEST_ETH_COLLATERAL_AMOUNT = 0.5
@@ -44,6 +48,14 @@ TEST_SOL_COLLATERAL_AMOUNT = 5
 TEST_POSITION_SIZE_USD = 50
 
 
+def pytest_generate_tests(metafunc):
+    if "perps_market" in metafunc.fixturenames:
+        all_markets = metafunc.config.getoption("all_markets")
+        metafunc.parametrize(
+            "perps_market", ALL_MARKET_NAMES if all_markets else MARKET_NAMES
+        )
+
+
 @chain_fork
 def test_perps_module(snx):
     """The instance has a perps module"""
@@ -56,7 +68,7 @@ def test_perps_module(snx):
 
 
 @chain_fork
-def test_perps_markets(snx):
+def test_perps_markets(snx, pytestconfig):
     markets_by_id, markets_by_name = snx.perps.get_markets()
 
     snx.logger.info(f"Markets by id: {markets_by_id}")
@@ -65,7 +77,14 @@ def test_perps_markets(snx):
     assert markets_by_id is not None
     assert markets_by_name is not None
 
-    for market in MARKET_NAMES:
+    market_names = MARKET_NAMES
+    if pytestconfig.getoption("all_markets"):
+        # new markets have to be added, so the flows cover them
+        missing = set(markets_by_name) - set(ALL_MARKET_NAMES)
+        assert len(missing) == 0, f"Markets missing from ALL_MARKET_NAMES: {missing}"
+        market_names = ALL_MARKET_NAMES
+
+    for market in market_names:
         assert (
             market in markets_by_name
         ), f"Market {market} is missing in markets_by_name"
@@ -91,11 +110,21 @@ def test_perps_account_fetch(snx, perps_account_id):
 @pytest.mark.parametrize(
     "collateral_name, collateral_amount",
     [
-        ("sUSD", TEST_USD_COLLATERAL_AMOUNT),
-        ("stBTC", TEST_BTC_COLLATERAL_AMOUNT),
-        ("sETH", TEST_ETH_COLLATERAL_AMOUNT),
-        ("sUSDe", TEST_USD_COLLATERAL_AMOUNT),
-        ("swSOL", TEST_SOL_COLLATERAL_AMOUNT),
+        pytest.param(
+            "sUSD", TEST_USD_COLLATERAL_AMOUNT, marks=pytest.mark.needs("sUSD")
+        ),
+        pytest.param(
+            "stBTC", TEST_BTC_COLLATERAL_AMOUNT, marks=pytest.mark.needs("tBTC")
+        ),
+        pytest.param(
+            "sETH", TEST_ETH_COLLATERAL_AMOUNT, marks=pytest.mark.needs("WETH")
+        ),
+        pytest.param(
+            "sUSDe", TEST_USD_COLLATERAL_AMOUNT, marks=pytest.mark.needs("USDe")
+        ),
+        pytest.param(
+            "swSOL", TEST_SOL_COLLATERAL_AMOUNT, marks=pytest.mark.needs("wSOL")
+        ),
     ],
 )
 def test_modify_collateral(
@@ -184,128 +213,43 @@ def test_modify_collateral(
 
 
 @chain_fork
-@pytest.mark.parametrize(
-    "market_name, collateral_name, collateral_amount",
-    [
-        ("ETH", "sUSD", TEST_USD_COLLATERAL_AMOUNT),
-        ("BTC", "sUSD", TEST_USD_COLLATERAL_AMOUNT),
-        ("SOL", "sUSD", TEST_USD_COLLATERAL_AMOUNT),
-        ("WIF", "sUSD", TEST_USD_COLLATERAL_AMOUNT),
-    ],
-)
-def test_usd_account_flow(
-    snx, perps_account_id, market_name, collateral_name, collateral_amount
-):
-    # get block and print
+@pytest.mark.needs("sUSD")
+@pytest.mark.parametrize("flow", list(FLOWS))
+def test_usd_account_flow(snx, perps_account_id, perps_market, flow):
+    """Run a perps flow shared with scripts/perps_matrix.py, with sUSD collateral"""
     block = snx.web3.eth.get_block("latest")
     susd_balance = snx.get_susd_balance()
-
     snx.logger.info(f"Block: {block.number} - sUSD balance: {susd_balance}")
 
     # check allowance
     allowance = snx.spot.get_allowance(
-        snx.perps.market_proxy.address, market_name=collateral_name
+        snx.perps.market_proxy.address, market_name="sUSD"
     )
-    if allowance < collateral_amount:
+    if allowance < COLLATERALS["sUSD"]["amount"]:
         approve_tx = snx.spot.approve(
-            snx.perps.market_proxy.address, market_name=collateral_name, submit=True
+            snx.perps.market_proxy.address, market_name="sUSD", submit=True
         )
         snx.wait(approve_tx)
 
-    # deposit collateral
-    modify_tx = snx.perps.modify_collateral(
-        collateral_amount,
-        market_name=collateral_name,
-        account_id=perps_account_id,
-        submit=True,
-    )
-    modify_receipt = snx.wait(modify_tx)
-    assert modify_receipt["status"] == 1
-    snx.logger.info(snx.perps.get_margin_info(perps_account_id))
-
-    # get an updated price
-    index_price = snx.perps.markets_by_name[market_name]["index_price"]
-
-    # commit order
-    mine_block(snx, chain)
-    position_size = TEST_POSITION_SIZE_USD / index_price
-    commit_tx = snx.perps.commit_order(
-        position_size,
-        market_name=market_name,
-        account_id=perps_account_id,
-        settlement_strategy_id=0,
-        submit=True,
-    )
-    commit_receipt = snx.wait(commit_tx)
-    assert commit_receipt["status"] == 1
-
-    # wait for the order settlement
-    mine_block(snx, chain)
-    settle_tx = snx.perps.settle_order(
-        account_id=perps_account_id, max_tx_tries=5, submit=True
-    )
-    settle_receipt = snx.wait(settle_tx)
-
-    # check the result
-    position = snx.perps.get_open_position(
-        market_name=market_name, account_id=perps_account_id
-    )
-    assert round(position["position_size"], 12) == round(position_size, 12)
-
-    # get the position size
-    position = snx.perps.get_open_position(
-        market_name=market_name, account_id=perps_account_id
-    )
-    size = position["position_size"]
-
-    # commit order
-    mine_block(snx, chain)
-    commit_tx_2 = snx.perps.commit_order(
-        -size,
-        market_name=market_name,
-        account_id=perps_account_id,
-        settlement_strategy_id=0,
-        submit=True,
-    )
-    commit_receipt_2 = snx.wait(commit_tx_2)
-    assert commit_receipt_2["status"] == 1
-
-    # wait for the order settlement
-    mine_block(snx, chain)
-    settle_tx_2 = snx.perps.settle_order(
-        account_id=perps_account_id, max_tx_tries=5, submit=True
-    )
-    settle_receipt_2 = snx.wait(settle_tx_2)
-
-    # check the result
-    position = snx.perps.get_open_position(
-        market_name=market_name, account_id=perps_account_id
-    )
-    assert position["position_size"] == 0
-
-    # check the margin and withdraw
-    margin_info = snx.perps.get_margin_info(perps_account_id)
-    withdrawable_margin = margin_info["withdrawable_margin"]
-    withdrawable_margin = math.floor(withdrawable_margin * 1e8) / 1e8
-
-    modify_tx_2 = snx.perps.modify_collateral(
-        withdrawable_margin,
-        market_name=collateral_name,
-        account_id=perps_account_id,
-        submit=True,
-    )
-    modify_receipt_2 = snx.wait(modify_tx_2)
-    assert modify_receipt_2["status"] == 1
+    FLOWS[flow](snx, perps_account_id, perps_market, "sUSD")
 
 
 @chain_fork
 @pytest.mark.parametrize(
     "market_name, collateral_name, collateral_amount",
     [
-        ("ETH", "stBTC", TEST_BTC_COLLATERAL_AMOUNT),
-        ("ETH", "sETH", TEST_ETH_COLLATERAL_AMOUNT),
-        ("ETH", "sUSDe", TEST_USD_COLLATERAL_AMOUNT),
-        ("ETH", "swSOL", TEST_SOL_COLLATERAL_AMOUNT),
+        pytest.param(
+            "ETH", "stBTC", TEST_BTC_COLLATERAL_AMOUNT, marks=pytest.mark.needs("tBTC")
+        ),
+        pytest.param(
+            "ETH", "sETH", TEST_ETH_COLLATERAL_AMOUNT, marks=pytest.mark.needs("WETH")
+        ),
+        pytest.param(
+            "ETH", "sUSDe", TEST_USD_COLLATERAL_AMOUNT, marks=pytest.mark.needs("USDe")
+        ),
+        pytest.param(
+            "ETH", "swSOL", TEST_SOL_COLLATERAL_AMOUNT, marks=pytest.mark.needs("wSOL")
+        ),
     ],
 )
 def test_alt_account_flow(
@@ -461,6 +405,7 @@ def test_alt_account_flow(
 
 
 @chain_fork
+@pytest.mark.needs("sUSD")
 @pytest.mark.parametrize(
     ["market_1", "market_2"],
     [
@@ -588,6 +533,7 @@ def test_multiple_positions(snx, perps_account_id, market_1, market_2):
 
 
 @chain_fork
+@pytest.mark.needs("sUSD")
 def test_usd_liquidation(snx, perps_account_id):
     market_name = "ETH"
     market_id, market_name = snx.perps._resolve_market(None, market_name)
@@ -654,35 +600,41 @@ def test_usd_liquidation(snx, perps_account_id):
 @pytest.mark.parametrize(
     "collateral_config",
     [
-        [
-            {
-                "market_name": "ETH",
-                "token_name": "WETH",
-                "collateral_amount": TEST_ETH_COLLATERAL_AMOUNT,
-            },
-            {
-                "market_name": "tBTC",
-                "token_name": "tBTC",
-                "collateral_amount": TEST_BTC_COLLATERAL_AMOUNT,
-            },
-        ],
-        [
-            {
-                "market_name": "tBTC",
-                "token_name": "tBTC",
-                "collateral_amount": TEST_BTC_COLLATERAL_AMOUNT,
-            },
-            {
-                "market_name": "USDe",
-                "token_name": "USDe",
-                "collateral_amount": TEST_USD_COLLATERAL_AMOUNT,
-            },
-            {
-                "market_name": "wSOL",
-                "token_name": "wSOL",
-                "collateral_amount": TEST_SOL_COLLATERAL_AMOUNT,
-            },
-        ],
+        pytest.param(
+            [
+                {
+                    "market_name": "ETH",
+                    "token_name": "WETH",
+                    "collateral_amount": TEST_ETH_COLLATERAL_AMOUNT,
+                },
+                {
+                    "market_name": "tBTC",
+                    "token_name": "tBTC",
+                    "collateral_amount": TEST_BTC_COLLATERAL_AMOUNT,
+                },
+            ],
+            marks=pytest.mark.needs("WETH", "tBTC"),
+        ),
+        pytest.param(
+            [
+                {
+                    "market_name": "tBTC",
+                    "token_name": "tBTC",
+                    "collateral_amount": TEST_BTC_COLLATERAL_AMOUNT,
+                },
+                {
+                    "market_name": "USDe",
+                    "token_name": "USDe",
+                    "collateral_amount": TEST_USD_COLLATERAL_AMOUNT,
+                },
+                {
+                    "market_name": "wSOL",
+                    "token_name": "wSOL",
+                    "collateral_amount": TEST_SOL_COLLATERAL_AMOUNT,
+                },
+            ],
+            marks=pytest.mark.needs("tBTC", "USDe", "wSOL"),
+        ),
     ],
 )
 def test_alts_liquidation(snx, contracts, perps_account_id, collateral_config):
@@ -793,8 +745,8 @@ def test_alts_liquidation(snx, contracts, perps_account_id, collateral_config):
     assert liquidate_receipt["status"] == 1
 
     # log the RewardDistributed events
-    reward_events = snx.core.core_proxy.events.RewardsDistributed().process_receipt(
-        liquidate_receipt
+    reward_events = get_log_decoder(snx).decode_receipt(
+        liquidate_receipt, "RewardsDistributed"
     )
     assert len(reward_events) >= 1
     for event in reward_events:
@@ -2,6 +2,8 @@ import time
 import pytest
 from synthetix.utils import ether_to_wei, wei_to_ether, format_wei
 from conftest import chain_fork
+from utils.log_helpers import get_log_decoder
+from utils.batch_helpers import batch_reads
 from ape import chain
 from utils.chain_helpers import mine_block
 
@@ -33,11 +35,11 @@ def test_spot_markets(snx):
 @pytest.mark.parametrize(
     "token_name, test_amount, decimals",
     [
-        ("USDC", TEST_USD_AMOUNT, 6),
-        ("WETH", TEST_ETH_AMOUNT, 18),
-        ("tBTC", TEST_BTC_AMOUNT, 18),
-        ("USDe", TEST_USD_AMOUNT, 18),
-        ("wSOL", TEST_SOL_AMOUNT, 9),
+        pytest.param("USDC", TEST_USD_AMOUNT, 6, marks=pytest.mark.needs("USDC")),
+        pytest.param("WETH", TEST_ETH_AMOUNT, 18, marks=pytest.mark.needs("WETH")),
+        pytest.param("tBTC", TEST_BTC_AMOUNT, 18, marks=pytest.mark.needs("tBTC")),
+        pytest.param("USDe", TEST_USD_AMOUNT, 18, marks=pytest.mark.needs("USDe")),
+        pytest.param("wSOL", TEST_SOL_AMOUNT, 9, marks=pytest.mark.needs("wSOL")),
     ],
 )
 def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
@@ -48,10 +50,14 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
     wrapped_token = snx.spot.markets_by_id[market_id]["contract"]
 
     # make sure we have some USDC
-    starting_balance_wei = token.functions.balanceOf(snx.address).call()
-    starting_balance = format_wei(starting_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        starting_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        starting_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    starting_synth_balance = snx.spot.get_balance(market_id=market_id)
+    starting_balance = format_wei(starting_balance_wei.result(), decimals)
+    starting_synth_balance = wei_to_ether(starting_synth_balance_wei.result())
 
     assert starting_balance > test_amount
 
@@ -73,10 +79,14 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
     snx.wait(wrap_tx)
 
     # get new balances
-    wrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    wrapped_balance = format_wei(wrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        wrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        wrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    wrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    wrapped_balance = format_wei(wrapped_balance_wei.result(), decimals)
+    wrapped_synth_balance = wei_to_ether(wrapped_synth_balance_wei.result())
 
     assert wrapped_balance == starting_balance - test_amount
     assert wrapped_synth_balance == starting_synth_balance + test_amount
@@ -101,10 +111,14 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
     snx.wait(unwrap_tx)
 
     # get new balances
-    unwrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    unwrapped_balance = format_wei(unwrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        unwrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        unwrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    unwrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    unwrapped_balance = format_wei(unwrapped_balance_wei.result(), decimals)
+    unwrapped_synth_balance = wei_to_ether(unwrapped_synth_balance_wei.result())
 
     assert unwrapped_balance == wrapped_balance + test_amount
     assert unwrapped_synth_balance == wrapped_synth_balance - test_amount
@@ -114,7 +128,7 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
 @pytest.mark.parametrize(
     "token_name, test_amount, decimals",
     [
-        ("USDC", TEST_USD_AMOUNT, 6),
+        pytest.param("USDC", TEST_USD_AMOUNT, 6, marks=pytest.mark.needs("USDC")),
     ],
 )
 def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
@@ -127,11 +141,18 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     susd_token = snx.spot.markets_by_id[0]["contract"]
 
     # make sure we have some USDC
-    starting_balance_wei = token.functions.balanceOf(snx.address).call()
-    starting_balance = format_wei(starting_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        starting_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        starting_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        starting_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    starting_synth_balance = snx.spot.get_balance(market_id=market_id)
-    starting_susd_balance = snx.spot.get_balance(market_id=0)
+    starting_balance = format_wei(starting_balance_wei.result(), decimals)
+    starting_synth_balance = wei_to_ether(starting_synth_balance_wei.result())
+    starting_susd_balance = wei_to_ether(starting_susd_balance_wei.result())
 
     assert starting_balance > test_amount
 
@@ -153,11 +174,18 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     snx.wait(wrap_tx)
 
     # check balances
-    wrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    wrapped_balance = format_wei(wrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        wrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        wrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        wrapped_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    wrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
-    wrapped_susd_balance = snx.spot.get_balance(market_id=0)
+    wrapped_balance = format_wei(wrapped_balance_wei.result(), decimals)
+    wrapped_synth_balance = wei_to_ether(wrapped_synth_balance_wei.result())
+    wrapped_susd_balance = wei_to_ether(wrapped_susd_balance_wei.result())
 
     assert wrapped_balance == starting_balance - test_amount
     assert wrapped_synth_balance == starting_synth_balance + test_amount
@@ -195,13 +223,11 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     assert commit_receipt.status == 1
 
     # get the event to check the order id
-    event_data = snx.spot.market_proxy.events.OrderCommitted().process_receipt(
-        commit_receipt
-    )
+    event_data = get_log_decoder(snx).decode_receipt(commit_receipt, "OrderCommitted")
     assert len(event_data) == 1
 
     # unpack the event
-    event = event_data[0]["args"]
+    event = event_data[0].args
     async_order_id = event["asyncOrderId"]
 
     # settle the order
@@ -214,11 +240,16 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     assert settle_receipt is not None
 
     # check balances
-    sold_balance_wei = token.functions.balanceOf(snx.address).call()
-    sold_balance = format_wei(sold_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        sold_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        sold_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        sold_susd_balance_wei = batch.call(susd_token.functions.balanceOf(snx.address))
 
-    sold_synth_balance = snx.spot.get_balance(market_id=market_id)
-    sold_susd_balance = snx.spot.get_balance(market_id=0)
+    sold_balance = format_wei(sold_balance_wei.result(), decimals)
+    sold_synth_balance = wei_to_ether(sold_synth_balance_wei.result())
+    sold_susd_balance = wei_to_ether(sold_susd_balance_wei.result())
 
     assert sold_balance == wrapped_balance
     assert sold_synth_balance >= wrapped_synth_balance - test_amount - 1
@@ -250,13 +281,13 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     commit_buy_receipt = snx.wait(commit_buy_tx)
 
     # get the event to check the order id
-    event_data_buy = snx.spot.market_proxy.events.OrderCommitted().process_receipt(
-        commit_buy_receipt
+    event_data_buy = get_log_decoder(snx).decode_receipt(
+        commit_buy_receipt, "OrderCommitted"
     )
     assert len(event_data_buy) == 1
 
     # unpack the event
-    event_buy = event_data_buy[0]["args"]
+    event_buy = event_data_buy[0].args
     async_order_id_buy = event_buy["asyncOrderId"]
 
     # settle the order
@@ -270,11 +301,16 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     assert settle_buy_receipt is not None
 
     # check balances
-    buy_balance_wei = token.functions.balanceOf(snx.address).call()
-    buy_balance = format_wei(buy_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        buy_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        buy_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        buy_susd_balance_wei = batch.call(susd_token.functions.balanceOf(snx.address))
 
-    buy_synth_balance = snx.spot.get_balance(market_id=market_id)
-    buy_susd_balance = snx.spot.get_balance(market_id=0)
+    buy_balance = format_wei(buy_balance_wei.result(), decimals)
+    buy_synth_balance = wei_to_ether(buy_synth_balance_wei.result())
+    buy_susd_balance = wei_to_ether(buy_susd_balance_wei.result())
 
     assert buy_balance == sold_balance
     assert buy_synth_balance >= sold_synth_balance + test_amount - 3
@@ -289,10 +325,14 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
     assert unwrap_receipt.status == 1
 
     # get new balances
-    unwrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    unwrapped_balance = format_wei(unwrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        unwrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        unwrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    unwrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    unwrapped_balance = format_wei(unwrapped_balance_wei.result(), decimals)
+    unwrapped_synth_balance = wei_to_ether(unwrapped_synth_balance_wei.result())
 
     assert unwrapped_balance == starting_balance - 2
     assert unwrapped_synth_balance >= buy_synth_balance - test_amount - 1
@@ -302,7 +342,9 @@ def test_spot_async_order(snx, contracts, token_name, test_amount, decimals):
 @pytest.mark.parametrize(
     "token_name, test_amount, decimals, slippage_tolerance",
     [
-        ("USDC", TEST_USD_AMOUNT, 6, 0.002),
+        pytest.param(
+            "USDC", TEST_USD_AMOUNT, 6, 0.002, marks=pytest.mark.needs("USDC")
+        ),
         # ("USDe", TEST_USD_AMOUNT, 18, 0.05),
         # ("WETH", TEST_ETH_AMOUNT, 18, 0.05),
         # ("tBTC", TEST_BTC_AMOUNT, 18, 0.05),
@@ -326,11 +368,18 @@ def test_spot_atomic_order(
     snx.logger.info(f"Price {price}")
 
     # check asset balances
-    starting_balance_wei = token.functions.balanceOf(snx.address).call()
-    starting_balance = format_wei(starting_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        starting_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        starting_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        starting_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    starting_synth_balance = snx.spot.get_balance(market_id=market_id)
-    starting_susd_balance = snx.spot.get_balance(market_id=0)
+    starting_balance = format_wei(starting_balance_wei.result(), decimals)
+    starting_synth_balance = wei_to_ether(starting_synth_balance_wei.result())
+    starting_susd_balance = wei_to_ether(starting_susd_balance_wei.result())
 
     assert starting_balance > test_amount
 
@@ -352,10 +401,14 @@ def test_spot_atomic_order(
     snx.wait(wrap_tx)
 
     # get new balances
-    wrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    wrapped_balance = format_wei(wrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        wrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        wrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    wrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    wrapped_balance = format_wei(wrapped_balance_wei.result(), decimals)
+    wrapped_synth_balance = wei_to_ether(wrapped_synth_balance_wei.result())
 
     assert wrapped_balance == starting_balance - test_amount
     assert wrapped_synth_balance == starting_synth_balance + test_amount
@@ -390,11 +443,18 @@ def test_spot_atomic_order(
     assert swap_receipt.status == 1
 
     # check balances
-    swapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    swapped_balance = format_wei(swapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        swapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        swapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        swapped_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    swapped_synth_balance = snx.spot.get_balance(market_id=market_id)
-    swapped_susd_balance = snx.spot.get_balance(market_id=0)
+    swapped_balance = format_wei(swapped_balance_wei.result(), decimals)
+    swapped_synth_balance = wei_to_ether(swapped_synth_balance_wei.result())
+    swapped_susd_balance = wei_to_ether(swapped_susd_balance_wei.result())
 
     # assert swapped_balance == starting_balance - test_amount
     # assert swapped_synth_balance == wrapped_synth_balance - test_amount
@@ -428,11 +488,18 @@ def test_spot_atomic_order(
     assert buy_receipt.status == 1
 
     # check balances
-    bought_balance_wei = token.functions.balanceOf(snx.address).call()
-    bought_balance = format_wei(bought_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        bought_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        bought_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        bought_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    bought_synth_balance = snx.spot.get_balance(market_id=market_id)
-    bought_susd_balance = snx.spot.get_balance(market_id=0)
+    bought_balance = format_wei(bought_balance_wei.result(), decimals)
+    bought_synth_balance = wei_to_ether(bought_synth_balance_wei.result())
+    bought_susd_balance = wei_to_ether(bought_susd_balance_wei.result())
 
     # assert bought_balance == swapped_balance
     # assert bought_synth_balance >= swapped_synth_balance + test_amount
@@ -462,10 +529,14 @@ def test_spot_atomic_order(
     assert unwrap_receipt.status == 1
 
     # get new balances
-    unwrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    unwrapped_balance = format_wei(unwrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        unwrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        unwrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    unwrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    unwrapped_balance = format_wei(unwrapped_balance_wei.result(), decimals)
+    unwrapped_synth_balance = wei_to_ether(unwrapped_synth_balance_wei.result())
 
     # assert unwrapped_balance == starting_balance
     # assert unwrapped_synth_balance == bought_synth_balance - test_amount
@@ -2,10 +2,13 @@ import os
 from dotenv import load_dotenv
 from functools import wraps
 import pytest
-from synthetix import Synthetix
 from synthetix.utils import ether_to_wei
 from ape import networks, chain
 from utils.arb_helpers import mock_arb_precompiles
+from utils.client_helpers import get_client
+from utils.fork_helpers import get_fork_rpc
+from utils.batch_helpers import batch_reads
+from utils.account_helpers import AccountPool, bootstrap_core_account
 
 load_dotenv()
 
@@ -32,8 +35,8 @@ def chain_fork(func):
 @pytest.fixture(scope="package")
 def snx(pytestconfig):
     # set up the snx instance
-    snx = Synthetix(
-        provider_rpc=chain.provider.uri,
+    snx = get_client(
+        provider_rpc=get_fork_rpc(chain.provider),
         network_id=421614,
         # is_fork=True,
         price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
@@ -62,8 +65,8 @@ def snx(pytestconfig):
 @pytest.fixture(scope="package")
 def snx_lite(pytestconfig):
     # set up the snx instance
-    snx_lite = Synthetix(
-        provider_rpc=chain.provider.uri,
+    snx_lite = get_client(
+        provider_rpc=get_fork_rpc(chain.provider),
         network_id=421614,
         price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
         request_kwargs={"timeout": 120},
@@ -100,8 +103,10 @@ def mint_token(snx, token_name):
     token_contract = snx.contracts[f"{token_name}_mock_collateral"]["MintableToken"][
         "contract"
     ]
-    token_balance = token_contract.functions.balanceOf(snx.address).call()
-    token_balance = token_balance / 10**18
+    with batch_reads(snx) as batch:
+        token_balance = batch.call(token_contract.functions.balanceOf(snx.address))
+        deployer_nonce = batch.transaction_count(SNX_DEPLOYER)
+    token_balance = token_balance.result() / 10**18
 
     # mint some arb
     mint_amount = max(100000 - token_balance, 0)
@@ -114,7 +119,7 @@ def mint_token(snx, token_name):
         ).build_transaction(
             {
                 "from": SNX_DEPLOYER,
-                "nonce": snx.web3.eth.get_transaction_count(SNX_DEPLOYER),
+                "nonce": deployer_nonce.result(),
             }
         )
 
@@ -181,8 +186,10 @@ def steal_usdc(snx):
     """The instance can steal USDC tokens"""
     # check usdc balance
     usdc_contract = snx.contracts["USDC"]["contract"]
-    usdc_balance = usdc_contract.functions.balanceOf(snx.address).call()
-    usdc_balance = usdc_balance / 10**6
+    with batch_reads(snx) as batch:
+        usdc_balance = batch.call(usdc_contract.functions.balanceOf(snx.address))
+        whale_nonce = batch.transaction_count(USDC_WHALE)
+    usdc_balance = usdc_balance.result() / 10**6
 
     # get some usdc
     if usdc_balance < USDC_MINT_AMOUNT:
@@ -194,7 +201,7 @@ def steal_usdc(snx):
         ).build_transaction(
             {
                 "from": USDC_WHALE,
-                "nonce": snx.web3.eth.get_transaction_count(USDC_WHALE),
+                "nonce": whale_nonce.result(),
             }
         )
 
@@ -228,69 +235,12 @@ def wrap_eth(snx):
 @chain_fork
 def mint_usdx_with_usdc(snx):
     """The instance can mint USDx tokens using USDC as collateral"""
-    # set up token contracts
     token = snx.contracts["USDC"]["contract"]
-    usdc_decimals = token.functions.decimals().call()
 
-    susd = snx.contracts["system"]["USDProxy"]["contract"]
-    susd_decimals = susd.functions.decimals().call()
-
-    # get an account
-    create_account_tx = snx.core.create_account(submit=True)
-    snx.wait(create_account_tx)
-    new_account_id = snx.core.account_ids[-1]
-
-    # approve
-    allowance = snx.allowance(token.address, snx.core.core_proxy.address)
-    if allowance < USDC_LP_AMOUNT:
-        approve_core_tx = snx.approve(
-            token.address, snx.core.core_proxy.address, submit=True
-        )
-        snx.wait(approve_core_tx)
-
-    # deposit the token
-    deposit_tx_hash = snx.core.deposit(
-        token.address,
-        USDC_LP_AMOUNT,
-        decimals=usdc_decimals,
-        account_id=new_account_id,
-        submit=True,
-    )
-    deposit_tx_receipt = snx.wait(deposit_tx_hash)
-    assert deposit_tx_receipt.status == 1
-
-    # delegate the collateral
-    delegate_tx_hash = snx.core.delegate_collateral(
-        token.address,
-        USDC_LP_AMOUNT,
-        1,
-        account_id=new_account_id,
-        submit=True,
+    # create an account, deposit, delegate, mint and withdraw in one transaction
+    bootstrap_core_account(
+        snx, token.address, USDC_LP_AMOUNT, mint_amount=USDX_MINT_AMOUNT
     )
-    delegate_tx_receipt = snx.wait(delegate_tx_hash)
-    assert delegate_tx_receipt.status == 1
-
-    # mint sUSD
-    mint_tx_hash = snx.core.mint_usd(
-        token.address,
-        USDX_MINT_AMOUNT,
-        1,
-        account_id=new_account_id,
-        submit=True,
-    )
-    mint_tx_receipt = snx.wait(mint_tx_hash)
-    assert mint_tx_receipt.status == 1
-
-    # withdraw
-    withdraw_tx_hash = snx.core.withdraw(
-        USDX_MINT_AMOUNT,
-        token_address=susd.address,
-        decimals=susd_decimals,
-        account_id=new_account_id,
-        submit=True,
-    )
-    withdraw_tx_receipt = snx.wait(withdraw_tx_hash)
-    assert withdraw_tx_receipt.status == 1
 
     # check balance
     usdx_balance = snx.get_susd_balance()["balance"]
@@ -322,29 +272,32 @@ def liquidation_setup(snx, market_id):
 
 
 @chain_fork
-@pytest.fixture(scope="function")
-def perps_account_id(snx):
-    snx.logger.info("Creating a new perps account")
-    create_tx = snx.perps.create_account(submit=True)
-    snx.wait(create_tx)
+@pytest.fixture(scope="package")
+def perps_account_pool(snx):
+    # create perps accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "perps")
+    pool.fill()
+    return pool
 
-    account_ids = snx.perps.get_account_ids()
-    new_account_id = account_ids[-1]
 
-    yield new_account_id
+@chain_fork
+@pytest.fixture(scope="package")
+def core_account_pool(snx):
+    # create core accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "core")
+    pool.fill()
+    return pool
 
 
-@chain_fork
 @pytest.fixture(scope="function")
-def core_account_id(snx):
-    # create a core account
-    tx_hash = snx.core.create_account(submit=True)
-    tx_receipt = snx.wait(tx_hash)
+def perps_account_id(perps_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield perps_account_pool.lease()
+    perps_account_pool.refill()
 
-    assert tx_hash is not None
-    assert tx_receipt is not None
-    assert tx_receipt.status == 1
 
-    account_id = snx.core.account_ids[-1]
-    snx.logger.info(f"Created core account: {account_id}")
-    return account_id
+@pytest.fixture(scope="function")
+def core_account_id(core_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield core_account_pool.lease()
+    core_account_pool.refill()
@@ -1,4 +1,5 @@
 from conftest import chain_fork
+from utils.token_helpers import get_tokens_metadata
 
 # tests
 ETH_LP_AMOUNT = 10
@@ -18,10 +19,12 @@ def test_delegate(snx_lite):
 
     # set up token contracts
     token = snx.contracts["WETH"]["contract"]
-    token_decimals = token.functions.decimals().call()
-
     susd = snx.contracts["system"]["USDProxy"]["contract"]
-    susd_decimals = susd.functions.decimals().call()
+
+    # look up decimals from the metadata cache
+    metadata = get_tokens_metadata(snx, [token.address, susd.address])
+    token_decimals = metadata[token.address]["decimals"]
+    susd_decimals = metadata[susd.address]["decimals"]
 
     # get an account
     create_account_tx = snx.core.create_account(submit=True)
@@ -4,6 +4,7 @@ import math
 from conftest import chain_fork, liquidation_setup, update_prices
 from ape import chain
 from utils.chain_helpers import mine_block
+from utils.log_helpers import get_log_decoder
 
 # tests
 MARKET_NAMES = [
@@ -740,8 +741,8 @@ def test_alts_liquidation(snx, contracts, perps_account_id, collateral_config):
     assert liquidate_receipt["status"] == 1
 
     # log the RewardDistributed events
-    reward_events = snx.core.core_proxy.events.RewardsDistributed().process_receipt(
-        liquidate_receipt
+    reward_events = get_log_decoder(snx).decode_receipt(
+        liquidate_receipt, "RewardsDistributed"
     )
     assert len(reward_events) >= 1
     for event in reward_events:
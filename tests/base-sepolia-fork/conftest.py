@@ -2,9 +2,11 @@ import os
 from dotenv import load_dotenv
 from functools import wraps
 import pytest
-from synthetix import Synthetix
 from synthetix.utils import ether_to_wei, format_wei, format_ether
 from ape import networks, chain
+from utils.client_helpers import get_client
+from utils.fork_helpers import get_fork_rpc
+from utils.account_helpers import AccountPool
 
 
 load_dotenv()
@@ -28,8 +30,8 @@ def chain_fork(func):
 @pytest.fixture(scope="package")
 def snx():
     # set up the snx instance
-    snx = Synthetix(
-        provider_rpc=chain.provider.uri,
+    snx = get_client(
+        provider_rpc=get_fork_rpc(chain.provider),
         network_id=84532,
         referrer=KWENTA_REFERRER,
         # is_fork=True,
@@ -272,29 +274,32 @@ def account_id(snx):
 
 
 @chain_fork
-@pytest.fixture(scope="function")
-def new_account_id(snx):
-    snx.logger.info("Creating a new perps account")
-    create_tx = snx.perps.create_account(submit=True)
-    snx.wait(create_tx)
+@pytest.fixture(scope="package")
+def perps_account_pool(snx):
+    # create perps accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "perps")
+    pool.fill()
+    return pool
 
-    account_ids = snx.perps.get_account_ids()
-    new_account_id = account_ids[-1]
 
-    yield new_account_id
+@chain_fork
+@pytest.fixture(scope="package")
+def core_account_pool(snx):
+    # create core accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "core")
+    pool.fill()
+    return pool
 
 
-@chain_fork
 @pytest.fixture(scope="function")
-def core_account_id(snx):
-    # create a core account
-    tx_hash = snx.core.create_account(submit=True)
-    tx_receipt = snx.wait(tx_hash)
+def new_account_id(perps_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield perps_account_pool.lease()
+    perps_account_pool.refill()
 
-    assert tx_hash is not None
-    assert tx_receipt is not None
-    assert tx_receipt.status == 1
 
-    account_id = snx.core.account_ids[-1]
-    snx.logger.info(f"Created core account: {account_id}")
-    return account_id
+@pytest.fixture(scope="function")
+def core_account_id(core_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield core_account_pool.lease()
+    core_account_pool.refill()
@@ -1,6 +1,7 @@
 import pytest
 from synthetix.utils import ether_to_wei, wei_to_ether, format_wei
 from conftest import chain_fork
+from utils.batch_helpers import batch_reads
 
 # constants
 TEST_AMOUNT = 100
@@ -41,10 +42,14 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
     wrapped_token = snx.spot.markets_by_id[market_id]["contract"]
 
     # make sure we have some USDC
-    starting_balance_wei = token.functions.balanceOf(snx.address).call()
-    starting_balance = format_wei(starting_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        starting_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        starting_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    starting_synth_balance = snx.spot.get_balance(market_id=market_id)
+    starting_balance = format_wei(starting_balance_wei.result(), decimals)
+    starting_synth_balance = wei_to_ether(starting_synth_balance_wei.result())
 
     assert starting_balance > test_amount
 
@@ -66,10 +71,14 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
     snx.wait(wrap_tx)
 
     # get new balances
-    wrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    wrapped_balance = format_wei(wrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        wrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        wrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    wrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    wrapped_balance = format_wei(wrapped_balance_wei.result(), decimals)
+    wrapped_synth_balance = wei_to_ether(wrapped_synth_balance_wei.result())
 
     assert wrapped_balance == starting_balance - test_amount
     assert wrapped_synth_balance == starting_synth_balance + test_amount
@@ -94,10 +103,14 @@ def test_spot_wrapper(snx, contracts, token_name, test_amount, decimals):
     snx.wait(unwrap_tx)
 
     # get new balances
-    unwrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    unwrapped_balance = format_wei(unwrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        unwrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        unwrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    unwrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    unwrapped_balance = format_wei(unwrapped_balance_wei.result(), decimals)
+    unwrapped_synth_balance = wei_to_ether(unwrapped_synth_balance_wei.result())
 
     assert unwrapped_balance == wrapped_balance + test_amount
     assert unwrapped_synth_balance == wrapped_synth_balance - test_amount
@@ -119,11 +132,18 @@ def test_spot_atomic_order(snx, contracts, token_name, test_amount, decimals):
     susd_token = snx.spot.markets_by_id[0]["contract"]
 
     # make sure we have some USDC
-    starting_balance_wei = token.functions.balanceOf(snx.address).call()
-    starting_balance = format_wei(starting_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        starting_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        starting_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        starting_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    starting_synth_balance = snx.spot.get_balance(market_id=market_id)
-    starting_susd_balance = snx.spot.get_balance(market_id=0)
+    starting_balance = format_wei(starting_balance_wei.result(), decimals)
+    starting_synth_balance = wei_to_ether(starting_synth_balance_wei.result())
+    starting_susd_balance = wei_to_ether(starting_susd_balance_wei.result())
 
     assert starting_balance > test_amount
 
@@ -145,10 +165,14 @@ def test_spot_atomic_order(snx, contracts, token_name, test_amount, decimals):
     snx.wait(wrap_tx)
 
     # get new balances
-    wrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    wrapped_balance = format_wei(wrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        wrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        wrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    wrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    wrapped_balance = format_wei(wrapped_balance_wei.result(), decimals)
+    wrapped_synth_balance = wei_to_ether(wrapped_synth_balance_wei.result())
 
     assert wrapped_balance == starting_balance - test_amount
     assert wrapped_synth_balance == starting_synth_balance + test_amount
@@ -179,11 +203,18 @@ def test_spot_atomic_order(snx, contracts, token_name, test_amount, decimals):
     assert swap_receipt.status == 1
 
     # check balances
-    swapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    swapped_balance = format_wei(swapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        swapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        swapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        swapped_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    swapped_synth_balance = snx.spot.get_balance(market_id=market_id)
-    swapped_susd_balance = snx.spot.get_balance(market_id=0)
+    swapped_balance = format_wei(swapped_balance_wei.result(), decimals)
+    swapped_synth_balance = wei_to_ether(swapped_synth_balance_wei.result())
+    swapped_susd_balance = wei_to_ether(swapped_susd_balance_wei.result())
 
     assert swapped_balance == starting_balance - test_amount
     assert swapped_synth_balance == wrapped_synth_balance - test_amount
@@ -216,11 +247,18 @@ def test_spot_atomic_order(snx, contracts, token_name, test_amount, decimals):
     assert buy_receipt.status == 1
 
     # check balances
-    bought_balance_wei = token.functions.balanceOf(snx.address).call()
-    bought_balance = format_wei(bought_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        bought_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        bought_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
+        bought_susd_balance_wei = batch.call(
+            susd_token.functions.balanceOf(snx.address)
+        )
 
-    bought_synth_balance = snx.spot.get_balance(market_id=market_id)
-    bought_susd_balance = snx.spot.get_balance(market_id=0)
+    bought_balance = format_wei(bought_balance_wei.result(), decimals)
+    bought_synth_balance = wei_to_ether(bought_synth_balance_wei.result())
+    bought_susd_balance = wei_to_ether(bought_susd_balance_wei.result())
 
     assert bought_balance == swapped_balance
     assert bought_synth_balance == swapped_synth_balance + test_amount
@@ -250,10 +288,14 @@ def test_spot_atomic_order(snx, contracts, token_name, test_amount, decimals):
     assert unwrap_receipt.status == 1
 
     # get new balances
-    unwrapped_balance_wei = token.functions.balanceOf(snx.address).call()
-    unwrapped_balance = format_wei(unwrapped_balance_wei, decimals)
+    with batch_reads(snx) as batch:
+        unwrapped_balance_wei = batch.call(token.functions.balanceOf(snx.address))
+        unwrapped_synth_balance_wei = batch.call(
+            wrapped_token.functions.balanceOf(snx.address)
+        )
 
-    unwrapped_synth_balance = snx.spot.get_balance(market_id=market_id)
+    unwrapped_balance = format_wei(unwrapped_balance_wei.result(), decimals)
+    unwrapped_synth_balance = wei_to_ether(unwrapped_synth_balance_wei.result())
 
     assert unwrapped_balance == starting_balance
     assert unwrapped_synth_balance == bought_synth_balance - test_amount
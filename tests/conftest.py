@@ -0,0 +1,352 @@
+import json
+import os
+import socket
+from collections import defaultdict
+import pytest
+from _pytest.junitxml import xml_key
+from utils.cache_helpers import cache_path
+from utils.fork_helpers import (
+    enable_anvil_ipc,
+    get_fork_block_number,
+    get_fork_blocks,
+)
+from utils.gas_helpers import compare_gas, summarize_gas, track_gas
+from utils.profile_helpers import (
+    PHASES,
+    SAMPLE_INTERVAL,
+    SamplingProfiler,
+    profile_file,
+)
+from utils.receipt_helpers import install_receipt_waiter
+
+# constants
+CLIENT_FIXTURES = ["snx", "snx_lite"]
+DEFAULT_GAS_BASELINE = os.path.join(os.path.dirname(__file__), "gas_baseline.json")
+
+# gas usage samples by network and operation
+gas_samples = defaultdict(lambda: defaultdict(list))
+
+# the block each network's fork was started from
+fork_blocks = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("gas")
+    group.addoption(
+        "--gas-report",
+        action="store_true",
+        help="Record gas used by SDK operations and compare it with the baseline",
+    )
+    group.addoption(
+        "--gas-baseline",
+        default=DEFAULT_GAS_BASELINE,
+        help="Gas baseline file (default: tests/gas_baseline.json)",
+    )
+    group.addoption(
+        "--gas-threshold",
+        type=float,
+        default=0.05,
+        help="Fail when an operation uses this much more gas than the baseline",
+    )
+    group.addoption(
+        "--gas-update-baseline",
+        action="store_true",
+        help="Write the recorded gas usage to the baseline file",
+    )
+    parser.addoption(
+        "--all-markets",
+        action="store_true",
+        help="Run the perps flows on every market, not just the main ones",
+    )
+    parser.addoption(
+        "--rpc-metrics",
+        metavar="PATH",
+        help="Write JSON-RPC metrics for the client fixtures in Prometheus format",
+    )
+    parser.addoption(
+        "--poll-receipts",
+        action="store_true",
+        help="Poll for each receipt, instead of waiting for new blocks",
+    )
+    parser.addoption(
+        "--fork-transport",
+        choices=["ipc", "http"],
+        default="ipc",
+        help="How the client fixtures connect to the forks (default: ipc, or http "
+        "where unix sockets aren't available)",
+    )
+    parser.addoption(
+        "--fund-all",
+        action="store_true",
+        help="Fund every asset on the forks, not only what the selected tests need",
+    )
+    group = parser.getgroup("profile")
+    group.addoption(
+        "--profile-fork",
+        nargs="?",
+        const=cache_path("profiles"),
+        metavar="DIR",
+        help="Profile fixture setup and each test, writing folded stacks to DIR "
+        "(default: .cache/profiles)",
+    )
+    group.addoption(
+        "--profile-interval",
+        type=float,
+        default=SAMPLE_INTERVAL * 1000,
+        help="Milliseconds between profile samples",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "needs(*assets): assets the test needs funded on the fork, like USDC or sUSD",
+    )
+    # before ape starts the forks, so they serve an ipc socket as well
+    if config.getoption("fork_transport") == "ipc" and hasattr(socket, "AF_UNIX"):
+        enable_anvil_ipc()
+
+    path = config.getoption("gas_baseline")
+    if config.getoption("gas_report") and not os.path.exists(path):
+        config.issue_config_time_warning(
+            pytest.PytestWarning(
+                f"No gas baseline at {path}, so gas regressions can't be detected. "
+                "Record one with --gas-update-baseline."
+            ),
+            stacklevel=2,
+        )
+
+
+def pytest_collection_finish(session):
+    """
+    Collect the assets the selected tests in each directory need, from their
+    ``needs`` markers, so the client fixtures fund only those
+    """
+    if session.config.getoption("fund_all"):
+        session.config.asset_needs = None
+        return
+
+    asset_needs = defaultdict(set)
+    for item in session.items:
+        needs = asset_needs[str(item.path.parent)]
+        for marker in item.iter_markers("needs"):
+            needs.update(marker.args)
+    session.config.asset_needs = dict(asset_needs)
+
+
+def _gas_enabled(config):
+    return config.getoption("gas_report") or config.getoption("gas_update_baseline")
+
+
+def _start_profile(config, name):
+    """Start a profiler, unless profiling is off or a profile is already running"""
+    if not config.getoption("profile_fork") or getattr(config, "fork_profiler", None):
+        return None
+
+    interval = config.getoption("profile_interval") / 1000
+    config.fork_profiler = SamplingProfiler(name, interval).start()
+    return config.fork_profiler
+
+
+def _stop_profile(config, profiler):
+    profile = profiler.stop()
+    config.fork_profiler = None
+    if profile.total > 0:
+        path = profile_file(config.getoption("profile_fork"), profile.name)
+        profile.write(path)
+        config.__dict__.setdefault("fork_profiles", []).append((profile, path))
+
+
+def pytest_report_header(config):
+    pins = get_fork_blocks()
+    pinned = [f"{network}={block}" for network, block in pins.items() if block]
+    if len(pinned) == 0:
+        return "fork blocks: latest (pin with `ape run pin_fork_blocks`)"
+    return f"fork blocks: {', '.join(pinned)}, others latest"
+
+
+def _record_fork_block(config, snx):
+    network = str(snx.network_id)
+    if network in fork_blocks:
+        return
+    try:
+        fork_blocks[network] = get_fork_block_number(snx.web3)
+    except Exception:
+        fork_blocks[network] = None
+
+    # add it to the junit report, when one is written
+    xml = config.stash.get(xml_key, None)
+    if xml is not None and fork_blocks[network] is not None:
+        xml.add_global_property(f"fork_block_{network}", fork_blocks[network])
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    profiler = _start_profile(item.config, item.nodeid)
+    yield
+    if profiler is not None:
+        _stop_profile(item.config, profiler)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    # fixtures set up inside another fixture are part of its profile, and each
+    # package has its own snx, so the name includes the package
+    parts = ["setup", fixturedef.scope, fixturedef.baseid, fixturedef.argname]
+    profiler = _start_profile(request.config, "-".join(part for part in parts if part))
+    outcome = yield
+    if profiler is not None:
+        _stop_profile(request.config, profiler)
+    if fixturedef.argname not in CLIENT_FIXTURES or outcome.excinfo is not None:
+        return
+
+    snx = outcome.get_result()
+    _record_fork_block(request.config, snx)
+    if request.config.getoption("rpc_metrics"):
+        # only patch the SDK's ERC-7412 handler when metrics are requested
+        from utils.metrics_helpers import attach_rpc_metrics
+
+        attach_rpc_metrics(snx)
+    # before gas tracking, which wraps snx.wait
+    if not request.config.getoption("poll_receipts"):
+        install_receipt_waiter(snx)
+    if not _gas_enabled(request.config) or snx.__dict__.get("gas_tracked"):
+        return
+
+    def on_record(operation, gas_usage):
+        gas_samples[str(snx.network_id)][operation].append(gas_usage)
+
+    track_gas(snx, on_record)
+    snx.__dict__["gas_tracked"] = True
+
+
+def _gas_results():
+    return {
+        network: {
+            operation: summarize_gas(samples)
+            for operation, samples in sorted(operations.items())
+        }
+        for network, operations in sorted(gas_samples.items())
+    }
+
+
+def _load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if config.getoption("rpc_metrics"):
+        from utils.metrics_helpers import rpc_metrics
+
+        rpc_metrics.write(config.getoption("rpc_metrics"))
+
+    if not _gas_enabled(config) or len(gas_samples) == 0:
+        return
+
+    path = config.getoption("gas_baseline")
+    baseline = _load_baseline(path)
+    results = _gas_results()
+
+    if config.getoption("gas_update_baseline"):
+        for network, operations in results.items():
+            baseline.setdefault(network, {}).update(operations)
+        with open(path, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        config.gas_regressions = []
+        return
+
+    config.gas_regressions = compare_gas(
+        results, baseline, config.getoption("gas_threshold")
+    )
+    # operations without a baseline can't regress, so they are reported
+    config.gas_missing = [
+        (network, operation)
+        for network, operations in results.items()
+        for operation in operations
+        if operation not in baseline.get(network, {})
+    ]
+    if len(config.gas_regressions) > 0 and exitstatus == 0:
+        session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if len(fork_blocks) > 0:
+        terminalreporter.section("fork blocks")
+        for network, block in sorted(fork_blocks.items()):
+            terminalreporter.write_line(f"{network:<10}{block or 'not a fork'}")
+    _profile_summary(terminalreporter, config)
+    if not _gas_enabled(config) or len(gas_samples) == 0:
+        return
+
+    baseline = _load_baseline(config.getoption("gas_baseline"))
+    terminalreporter.section("gas usage")
+    terminalreporter.write_line(
+        f"{'network':<10}{'operation':<28}{'runs':>6}"
+        f"{'l2 gas':>12}{'l1 gas':>10}{'l1 fee (wei)':>20}{'l2 change':>12}"
+    )
+    for network, operations in _gas_results().items():
+        for operation, summary in operations.items():
+            expected = baseline.get(network, {}).get(operation, {})
+            change = "-"
+            if expected.get("l2_gas"):
+                change = f"{summary['l2_gas'] / expected['l2_gas'] - 1:+.2%}"
+            l2_gas, l1_gas, l1_fee = [
+                "-" if summary[metric] is None else summary[metric]
+                for metric in ("l2_gas", "l1_gas", "l1_fee")
+            ]
+            terminalreporter.write_line(
+                f"{network:<10}{operation:<28}{summary['samples']:>6}"
+                f"{l2_gas:>12}{l1_gas:>10}{l1_fee:>20}"
+                f"{change:>12}"
+            )
+
+    threshold = config.getoption("gas_threshold")
+    for network, operation, metric, expected, result in getattr(
+        config, "gas_regressions", []
+    ):
+        terminalreporter.write_line(
+            f"REGRESSION {network} {operation} {metric}: {expected} -> {result} "
+            f"(threshold {threshold:.0%})",
+            red=True,
+        )
+    missing = getattr(config, "gas_missing", [])
+    if len(missing) > 0:
+        path = config.getoption("gas_baseline")
+        terminalreporter.write_line(
+            f"NO BASELINE for {len(missing)} operations in {path}, so they can't "
+            "regress. Record it with --gas-update-baseline:",
+            yellow=True,
+            bold=True,
+        )
+        for network, operation in missing:
+            terminalreporter.write_line(f"  {network} {operation}", yellow=True)
+    if config.getoption("gas_update_baseline"):
+        terminalreporter.write_line(
+            f"Updated gas baseline {config.getoption('gas_baseline')}"
+        )
+
+
+def _profile_summary(terminalreporter, config):
+    profiles = getattr(config, "fork_profiles", [])
+    if len(profiles) == 0:
+        return
+
+    terminalreporter.section("fork profile")
+    terminalreporter.write_line(
+        f"{'wall':>9}{'receipt':>9}{'rpc':>9}{'sleep':>9}{'cpu':>9}  name"
+    )
+    for profile, _ in sorted(profiles, key=lambda x: x[0].duration, reverse=True):
+        phases = profile.phases()
+        terminalreporter.write_line(
+            f"{profile.duration:>8.2f}s"
+            + "".join(f"{phases[phase]:>8.2f}s" for phase in PHASES)
+            + f"  {profile.name}"
+        )
+    terminalreporter.write_line(
+        f"Folded stacks written to {config.getoption('profile_fork')}"
+    )
@@ -3,9 +3,12 @@ from dotenv import load_dotenv
 import time
 from functools import wraps
 import pytest
-from synthetix import Synthetix
 from synthetix.utils import ether_to_wei
 from ape import networks, chain
+from utils.client_helpers import get_client
+from utils.fork_helpers import get_fork_rpc
+from utils.batch_helpers import batch_reads
+from utils.account_helpers import AccountPool, bootstrap_core_account
 
 load_dotenv()
 
@@ -38,8 +41,8 @@ def mine_block(snx, chain, seconds=3):
 @pytest.fixture(scope="package")
 def snx(pytestconfig):
     # set up the snx instance
-    snx = Synthetix(
-        provider_rpc=chain.provider.uri,
+    snx = get_client(
+        provider_rpc=get_fork_rpc(chain.provider),
         network_id=11155111,
         # is_fork=True,
         price_service_endpoint=os.getenv("PRICE_SERVICE_ENDPOINT"),
@@ -139,8 +142,10 @@ def mint_weth(snx):
     """The instance can mint the WETH mintable tokens"""
     # check arb balance
     token_contract = snx.contracts["weth_mock_collateral"]["MintableToken"]["contract"]
-    token_balance = token_contract.functions.balanceOf(snx.address).call()
-    token_balance = token_balance / 10**18
+    with batch_reads(snx) as batch:
+        token_balance = batch.call(token_contract.functions.balanceOf(snx.address))
+        deployer_nonce = batch.transaction_count(SNX_DEPLOYER)
+    token_balance = token_balance.result() / 10**18
 
     # mint some arb
     mint_amount = max(1000 - token_balance, 0)
@@ -153,7 +158,7 @@ def mint_weth(snx):
         ).build_transaction(
             {
                 "from": SNX_DEPLOYER,
-                "nonce": snx.web3.eth.get_transaction_count(SNX_DEPLOYER),
+                "nonce": deployer_nonce.result(),
             }
         )
 
@@ -169,7 +174,6 @@ def mint_weth(snx):
 def add_snx_liquidity(snx):
     """Add liquidity to the pool"""
     token = snx.contracts["SNX"]["contract"]
-    susd = snx.contracts["system"]["USDProxy"]["contract"]
 
     # get balance
     balance = token.functions.balanceOf(snx.address).call() / 1e18
@@ -196,63 +200,10 @@ def add_snx_liquidity(snx):
         else:
             snx.logger.info("SNX transferred")
 
-    # approve
-    allowance = snx.allowance(token.address, snx.core.core_proxy.address)
-    if allowance < SNX_LIQUIDITY_AMOUNT:
-        approve_core_tx = snx.approve(
-            token.address, snx.core.core_proxy.address, submit=True
-        )
-        approve_receipt = snx.wait(approve_core_tx)
-        assert approve_receipt["status"] == 1
-
-    # make an account
-    core_tx = snx.core.create_account(submit=True)
-    core_receipt = snx.wait(core_tx)
-    assert core_receipt.status == 1
-
-    # deposit the token
-    core_account_id = snx.core.account_ids[-1]
-    deposit_tx_hash = snx.core.deposit(
-        token.address,
-        SNX_LIQUIDITY_AMOUNT,
-        account_id=core_account_id,
-        submit=True,
-    )
-    deposit_tx_receipt = snx.wait(deposit_tx_hash)
-    assert deposit_tx_receipt.status == 1
-
-    # delegate the collateral
-    delegate_tx_hash = snx.core.delegate_collateral(
-        token.address,
-        SNX_LIQUIDITY_AMOUNT,
-        1,
-        account_id=core_account_id,
-        submit=True,
-    )
-    delegate_tx_receipt = snx.wait(delegate_tx_hash)
-    assert delegate_tx_receipt.status == 1
-
-    # mint sUSD
-    mint_tx_hash = snx.core.mint_usd(
-        token.address,
-        SUSD_MINT_AMOUNT,
-        1,
-        account_id=core_account_id,
-        submit=True,
-    )
-
-    mint_tx_receipt = snx.wait(mint_tx_hash)
-    assert mint_tx_receipt.status == 1
-
-    # withdraw
-    withdraw_tx_hash = snx.core.withdraw(
-        SUSD_MINT_AMOUNT,
-        token_address=susd.address,
-        account_id=core_account_id,
-        submit=True,
+    # create an account, deposit, delegate, mint and withdraw in one transaction
+    bootstrap_core_account(
+        snx, token.address, SNX_LIQUIDITY_AMOUNT, mint_amount=SUSD_MINT_AMOUNT
     )
-    withdraw_tx_receipt = snx.wait(withdraw_tx_hash)
-    assert withdraw_tx_receipt.status == 1
 
     # check balance
     susd_balance = snx.get_susd_balance()["balance"]
@@ -289,32 +240,32 @@ def liquidation_setup(snx, market_id):
 
 
 @chain_fork
-@pytest.fixture(scope="function")
-def core_account_id(snx):
-    # create a core account
-    tx_hash = snx.core.create_account(submit=True)
-    tx_receipt = snx.wait(tx_hash)
+@pytest.fixture(scope="package")
+def perps_account_pool(snx):
+    # create perps accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "perps")
+    pool.fill()
+    return pool
 
-    assert tx_hash is not None
-    assert tx_receipt is not None
-    assert tx_receipt.status == 1
 
-    account_id = snx.core.account_ids[-1]
-    snx.logger.info(f"Created core account: {account_id}")
-    return account_id
+@chain_fork
+@pytest.fixture(scope="package")
+def core_account_pool(snx):
+    # create core accounts in one transaction, refilled between tests
+    pool = AccountPool(snx, "core")
+    pool.fill()
+    return pool
 
 
 @pytest.fixture(scope="function")
-def perps_account_id(snx):
-    snx.logger.info("Creating a new perps account")
-    create_tx = snx.perps.create_account(submit=True)
-    tx_receipt = snx.wait(create_tx)
-
-    assert create_tx is not None
-    assert tx_receipt is not None
-    assert tx_receipt.status == 1
+def core_account_id(core_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield core_account_pool.lease()
+    core_account_pool.refill()
 
-    account_ids = snx.perps.get_account_ids()
-    new_account_id = account_ids[-1]
 
-    yield new_account_id
+@pytest.fixture(scope="function")
+def perps_account_id(perps_account_pool):
+    # lease a pre-created account, and top up the pool after the test
+    yield perps_account_pool.lease()
+    perps_account_pool.refill()
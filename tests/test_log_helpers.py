@@ -0,0 +1,135 @@
+import json
+import os
+import random
+import pytest
+import synthetix
+from eth_utils import keccak
+from web3 import Web3
+from web3._utils.abi import collapse_if_tuple
+from web3._utils.events import get_event_data
+from utils.log_helpers import LogDecoder
+
+# constants
+DEPLOYMENTS_DIR = os.path.join(
+    os.path.dirname(synthetix.__file__), "contracts", "deployments"
+)
+ADDRESS = "0x000000000000000000000000000000000000dEaD"
+
+
+def load_deployments():
+    """Load the bundled deployment ABIs of each network, like ``snx.contracts``"""
+    networks = {}
+    for network_id in sorted(os.listdir(DEPLOYMENTS_DIR)):
+        network_dir = os.path.join(DEPLOYMENTS_DIR, network_id)
+        if not os.path.isdir(network_dir) or not network_id.isdigit():
+            continue
+
+        contracts = {}
+        for root, _, files in os.walk(network_dir):
+            for file in files:
+                if file.endswith(".json"):
+                    with open(os.path.join(root, file)) as f:
+                        definition = json.load(f)
+                    if isinstance(definition, dict) and "abi" in definition:
+                        path = os.path.relpath(os.path.join(root, file), network_dir)
+                        contracts[path[: -len(".json")]] = definition
+        networks[network_id] = contracts
+    return networks
+
+
+def random_value(abi_input, rng):
+    """A random value of an ABI type, in the form web3 encodes it"""
+    abi_type = abi_input["type"]
+    if abi_type.endswith("]"):
+        inner = {**abi_input, "type": abi_type[: abi_type.rindex("[")]}
+        size = abi_type[abi_type.rindex("[") + 1 : -1]
+        length = int(size) if size else rng.randint(0, 3)
+        return [random_value(inner, rng) for _ in range(length)]
+    if abi_type == "tuple":
+        return tuple(
+            random_value(component, rng) for component in abi_input["components"]
+        )
+    if abi_type == "address":
+        return Web3.to_checksum_address(rng.randbytes(20).hex())
+    if abi_type == "bool":
+        return rng.random() < 0.5
+    if abi_type == "string":
+        return "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 40)))
+    if abi_type == "bytes":
+        return rng.randbytes(rng.randint(0, 70))
+    if abi_type.startswith("bytes"):
+        return rng.randbytes(int(abi_type[len("bytes") :]))
+    if abi_type.startswith("uint"):
+        return rng.getrandbits(int(abi_type[len("uint") :] or 256))
+    if abi_type.startswith("int"):
+        bits = int(abi_type[len("int") :] or 256)
+        return rng.getrandbits(bits) - 2 ** (bits - 1)
+    raise ValueError(f"Unsupported type {abi_type}")
+
+
+def encode_log(codec, address, abi, rng):
+    """Encode a log of an event with random arguments"""
+    types = ",".join(collapse_if_tuple(abi_input) for abi_input in abi["inputs"])
+    topics = [keccak(text=f"{abi['name']}({types})")]
+    data_types, data_values = [], []
+    for abi_input in abi["inputs"]:
+        abi_type = collapse_if_tuple(abi_input)
+        value = random_value(abi_input, rng)
+        if not abi_input["indexed"]:
+            data_types.append(abi_type)
+            data_values.append(value)
+        elif abi_type in ("string", "bytes") or abi_type.endswith(("]", ")")):
+            # only the hash of dynamic and composite values is stored
+            topics.append(rng.randbytes(32))
+        else:
+            topics.append(codec.encode([abi_type], [value]))
+
+    return {
+        "address": address,
+        "topics": ["0x" + topic.hex() for topic in topics],
+        "data": "0x" + codec.encode(data_types, data_values).hex(),
+        "blockNumber": 1,
+        "transactionHash": "0x" + bytes(32).hex(),
+        "transactionIndex": 0,
+        "logIndex": 0,
+        "blockHash": "0x" + bytes(32).hex(),
+    }
+
+
+def _normalize(value):
+    """Compare web3's AttributeDicts, tuples and HexBytes as plain values"""
+    if isinstance(value, dict) or hasattr(value, "items"):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return value
+
+
+@pytest.mark.parametrize("network_id, contracts", load_deployments().items())
+def test_decode_matches_web3(network_id, contracts):
+    web3 = Web3()
+    decoder = LogDecoder(contracts, web3.codec)
+    rng = random.Random(int(network_id))
+
+    checked = 0
+    for name, definition in contracts.items():
+        # logs from the contract's address are decoded with its own ABI
+        address = definition.get("address") or ADDRESS
+        for abi in definition["abi"]:
+            if abi.get("type") != "event" or abi.get("anonymous"):
+                continue
+
+            log = encode_log(web3.codec, address, abi, rng)
+            # what ``contract.events.<name>().process_log`` returns, which can't
+            # pick between overloaded events
+            expected = get_event_data(web3.codec, abi, log)
+            decoded = decoder.decode_log(log)
+            assert decoded is not None, f"{name}.{abi['name']} isn't indexed"
+            assert decoded.event == abi["name"]
+            assert _normalize(decoded.args) == _normalize(
+                expected["args"]
+            ), f"{name}.{abi['name']}"
+            checked += 1
+    assert checked > 0
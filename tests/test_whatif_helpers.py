@@ -0,0 +1,92 @@
+import pytest
+from web3 import Web3
+from web3.providers.base import BaseProvider
+from utils.whatif_helpers import _word, trace_storage
+
+# constants
+CALLER = "0x000000000000000000000000000000000000cafE"
+TARGET = "0x000000000000000000000000000000000000000A"
+REVERTING = "0x000000000000000000000000000000000000000b"
+PROXY = "0x000000000000000000000000000000000000000C"
+IMPLEMENTATION = "0x000000000000000000000000000000000000000d"
+GAS = "0x5208"
+
+
+class TraceProvider(BaseProvider):
+    """Answers ``debug_traceCall`` with a fixed response"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+        self.requests = []
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        return self.response
+
+
+def step(depth, op, *stack):
+    """A ``structLogs`` step, with the top of the stack last"""
+    return {"depth": depth, "op": op, "stack": list(stack)}
+
+
+def trace(struct_logs, failed=False):
+    web3 = Web3(
+        TraceProvider({"result": {"failed": failed, "structLogs": struct_logs}})
+    )
+    return trace_storage(web3, {"from": CALLER, "to": TARGET}, block=100)
+
+
+def test_trace_storage():
+    reads, writes = trace(
+        [
+            # the target writes and reads its own storage
+            step(1, "SSTORE", "0x11", "0x1"),
+            step(1, "SLOAD", "0x2"),
+            step(1, "PUSH1", "0x22"),
+            # a call that writes and reverts, so its writes are dropped
+            step(1, "CALL", REVERTING, GAS),
+            step(2, "SSTORE", "0x33", "0x3"),
+            step(2, "REVERT", "0x0", "0x0"),
+            step(1, "POP", "0x0"),
+            # a call to a proxy, which delegates to its implementation
+            step(1, "CALL", PROXY, GAS),
+            step(2, "DELEGATECALL", IMPLEMENTATION, GAS),
+            step(3, "SLOAD", "0x4"),
+            step(3, "PUSH1", "0x40"),
+            step(3, "SSTORE", "0x44", "0x4"),
+            step(3, "RETURN", "0x0", "0x0"),
+            step(2, "RETURN", "0x0", "0x0", "0x1"),
+            step(1, "STOP", "0x1"),
+        ]
+    )
+
+    assert reads == [
+        (TARGET, _word(2), _word(0x22)),
+        # the implementation reads the proxy's storage
+        (Web3.to_checksum_address(PROXY), _word(4), _word(0x40)),
+    ]
+    assert writes == {
+        TARGET: {_word(1): _word(0x11)},
+        Web3.to_checksum_address(PROXY): {_word(4): _word(0x44)},
+    }
+
+
+def test_trace_storage_drops_writes_under_a_reverted_call():
+    _, writes = trace(
+        [
+            step(1, "CALL", PROXY, GAS),
+            # the delegate call succeeds, but the proxy call around it reverts
+            step(2, "DELEGATECALL", IMPLEMENTATION, GAS),
+            step(3, "SSTORE", "0x44", "0x4"),
+            step(3, "RETURN", "0x0", "0x0"),
+            step(2, "REVERT", "0x0", "0x0", "0x1"),
+            step(1, "STOP", "0x0"),
+        ]
+    )
+    assert writes == {}
+
+
+def test_trace_storage_raises_when_the_call_reverts():
+    with pytest.raises(ValueError, match="reverted"):
+        trace([step(1, "REVERT", "0x0", "0x0")], failed=True)
@@ -0,0 +1,254 @@
+import random
+import threading
+from synthetix.utils import ether_to_wei, format_ether
+from synthetix.utils.multicall import write_erc7412
+from web3 import Web3
+from utils.token_helpers import get_tokens_metadata
+
+# constants
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+ZERO_TOPIC = "0x" + "00" * 32
+DEFAULT_POOL_SIZE = 10
+DEFAULT_REFILL_THRESHOLD = 3
+# requested account ids must be below half of the uint128 range
+MAX_REQUESTED_ACCOUNT_ID = 2**64
+
+
+def _account_contracts(snx, kind):
+    """Get the proxy that creates accounts and the account NFT for a module"""
+    module = snx.core if kind == "core" else snx.perps
+    proxy = module.core_proxy if kind == "core" else module.market_proxy
+    return module, proxy, module.account_proxy
+
+
+def _tx_lock(snx):
+    """
+    Serialize the transactions that these helpers send, and fetch the nonce
+    inside the lock, so helpers called from several threads don't reuse a nonce
+    """
+    lock = snx.__dict__.get("tx_lock")
+    if lock is not None:
+        return lock
+
+    lock = threading.RLock()
+    execute_transaction = snx.execute_transaction
+
+    def locked_execute_transaction(*args, **kwargs):
+        with lock:
+            return execute_transaction(*args, **kwargs)
+
+    snx.execute_transaction = locked_execute_transaction
+    snx.__dict__["tx_lock"] = lock
+    return lock
+
+
+def _minted_ids(receipt, account_proxy, owner):
+    """Get the ids of account NFTs minted to an owner in a transaction"""
+    owner_topic = "0x" + owner[2:].lower().rjust(64, "0")
+    account_ids = []
+    for log in receipt["logs"]:
+        topics = [Web3.to_hex(topic) for topic in log["topics"]]
+        if (
+            log["address"].lower() == account_proxy.address.lower()
+            and len(topics) == 4
+            and topics[0] == TRANSFER_TOPIC
+            and topics[1] == ZERO_TOPIC
+            and topics[2] == owner_topic
+        ):
+            account_ids.append(int(topics[3], 16))
+    return account_ids
+
+
+def create_accounts(snx, kind, count):
+    """
+    Create ``count`` core or perps accounts in one transaction, by batching
+    ``createAccount`` calls through the trusted multicall forwarder. Returns the
+    new account ids.
+    """
+    if count <= 0:
+        return []
+
+    _, proxy, account_proxy = _account_contracts(snx, kind)
+    data = proxy.encodeABI(fn_name="createAccount", args=[])
+    calls = [(proxy.address, True, 0, data)] * count
+
+    with _tx_lock(snx):
+        # other threads may have sent transactions, so fetch the nonce
+        snx.nonce = snx.web3.eth.get_transaction_count(snx.address)
+        tx_params = snx.multicall.functions.aggregate3Value(calls).build_transaction(
+            snx._get_tx_params()
+        )
+        tx_hash = snx.execute_transaction(tx_params)
+
+    receipt = snx.wait(tx_hash)
+    if receipt["status"] != 1:
+        raise Exception(f"Failed to create {count} {kind} accounts: {tx_hash}")
+
+    account_ids = _minted_ids(receipt, account_proxy, snx.address)
+    snx.logger.info(f"Created {len(account_ids)} {kind} accounts: {account_ids}")
+    return account_ids
+
+
+def new_account_id():
+    """Pick a random id for ``createAccount``, so calls can use it before it exists"""
+    return random.randint(1, MAX_REQUESTED_ACCOUNT_ID)
+
+
+def _approve(snx, token_address, spender, amount_wei):
+    """Approve a spender, unless the allowance already covers ``amount_wei``"""
+    erc20 = snx.web3.eth.contract(
+        address=token_address, abi=snx.contracts["common"]["ERC20"]["abi"]
+    )
+    allowance = erc20.functions.allowance(snx.address, spender).call()
+    if allowance < amount_wei:
+        receipt = snx.wait(snx.approve(token_address, spender, submit=True))
+        if receipt["status"] != 1:
+            raise Exception(f"Failed to approve {token_address} for {spender}")
+
+
+def bootstrap_core_account(
+    snx,
+    token_address,
+    amount,
+    mint_amount=0,
+    pool_id=1,
+    leverage=1,
+    withdraw=True,
+    perps_margin=0,
+):
+    """
+    Create a core account, deposit and delegate ``amount`` of a collateral to a
+    pool, mint ``mint_amount`` of sUSD and withdraw it, in one transaction through
+    the trusted multicall forwarder. With ``perps_margin``, a perps account is
+    created in the same transaction and that much of the sUSD is deposited as its
+    margin. Token approvals can't be forwarded, so any missing approvals are sent
+    first. Returns the new account ids.
+    """
+    if perps_margin > 0 and (not withdraw or perps_margin > mint_amount):
+        raise ValueError("Perps margin must come from the withdrawn sUSD")
+
+    core_proxy = snx.core.core_proxy
+    susd = snx.contracts["system"]["USDProxy"]["address"]
+    metadata = get_tokens_metadata(snx, [token_address, susd])
+    amount_wei = format_ether(amount, metadata[token_address]["decimals"])
+    _approve(snx, token_address, core_proxy.address, amount_wei)
+    if perps_margin > 0:
+        _approve(snx, susd, snx.perps.market_proxy.address, ether_to_wei(perps_margin))
+
+    account_id = new_account_id()
+    calls = [
+        (core_proxy, "createAccount", [account_id]),
+        (core_proxy, "deposit", [account_id, token_address, amount_wei]),
+        (
+            core_proxy,
+            "delegateCollateral",
+            [
+                account_id,
+                pool_id,
+                token_address,
+                ether_to_wei(amount),
+                ether_to_wei(leverage),
+            ],
+        ),
+    ]
+    if mint_amount > 0:
+        calls.append(
+            (
+                core_proxy,
+                "mintUsd",
+                [account_id, pool_id, token_address, ether_to_wei(mint_amount)],
+            )
+        )
+        if withdraw:
+            susd_wei = format_ether(mint_amount, metadata[susd]["decimals"])
+            calls.append((core_proxy, "withdraw", [account_id, susd, susd_wei]))
+
+    perps_account_id = None
+    if perps_margin > 0:
+        market_proxy = snx.perps.market_proxy
+        perps_account_id = new_account_id()
+        calls += [
+            (market_proxy, "createAccount", [perps_account_id]),
+            (
+                market_proxy,
+                "modifyCollateral",
+                [perps_account_id, 0, ether_to_wei(perps_margin)],
+            ),
+        ]
+
+    # write_erc7412 adds the oracle updates the calls need
+    *first_calls, (contract, fn, args) = calls
+    prepended_calls = [
+        (c.address, True, 0, c.encodeABI(fn_name=f, args=a)) for c, f, a in first_calls
+    ]
+    with _tx_lock(snx):
+        tx_params = write_erc7412(snx, contract, fn, args, calls=prepended_calls)
+        tx_hash = snx.execute_transaction(tx_params)
+
+    receipt = snx.wait(tx_hash)
+    if receipt["status"] != 1:
+        raise Exception(f"Failed to bootstrap core account {account_id}: {tx_hash}")
+    snx.logger.info(f"Bootstrapped core account {account_id} in {tx_hash}")
+
+    # keep the modules' account lists current without re-listing
+    snx.core.account_ids = list(snx.core.account_ids) + [account_id]
+    if perps_account_id is not None:
+        snx.perps.account_ids = list(snx.perps.account_ids) + [perps_account_id]
+    return account_id, perps_account_id
+
+
+class AccountPool:
+    """
+    A pool of pre-created core or perps accounts. Each ``lease`` hands out an
+    account that hasn't been used. The pool is topped up by ``refill`` between
+    tests, rather than in the background, so accounts are never created while a
+    test is building transactions or timing blocks.
+    """
+
+    def __init__(
+        self,
+        snx,
+        kind,
+        size=DEFAULT_POOL_SIZE,
+        refill_threshold=DEFAULT_REFILL_THRESHOLD,
+    ):
+        if kind not in ("core", "perps"):
+            raise ValueError(f"Unknown account kind {kind}")
+
+        self.snx = snx
+        self.kind = kind
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.leased = []
+        self._available = []
+
+    def __len__(self):
+        return len(self._available)
+
+    def fill(self):
+        """Create accounts until the pool is full"""
+        account_ids = create_accounts(self.snx, self.kind, self.size - len(self))
+
+        module, _, _ = _account_contracts(self.snx, self.kind)
+        self._available.extend(account_ids)
+        # keep the module's account list current without re-listing
+        known = set(module.account_ids)
+        module.account_ids = list(module.account_ids) + [
+            account_id for account_id in account_ids if account_id not in known
+        ]
+
+    def refill(self):
+        """Fill the pool when fewer than ``refill_threshold`` accounts are left"""
+        if len(self) < self.refill_threshold:
+            self.fill()
+
+    def lease(self):
+        """Take an unused account id, filling the pool first if it's empty"""
+        if len(self) == 0:
+            self.fill()
+        if len(self) == 0:
+            raise Exception(f"No {self.kind} accounts available")
+
+        account_id = self._available.pop(0)
+        self.leased.append(account_id)
+        return account_id
@@ -0,0 +1,206 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from hexbytes import HexBytes
+from web3 import Web3
+
+# web3 6 has no public API to decode call output, format revert errors or post a
+# batch, so these are the helpers that ContractFunction.call and HTTPProvider use
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.error_formatters_utils import raise_contract_logic_error_on_revert
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3._utils.request import make_post_request
+
+# constants
+MAX_BATCH_SIZE = 100
+
+
+def _to_block(block):
+    if isinstance(block, int):
+        return hex(block)
+    return block
+
+
+def _decode_call(web3, fn, result):
+    """Decode ``eth_call`` output the same way ``ContractFunction.call`` does"""
+    output_types = get_abi_output_types(fn.abi)
+    decoded = web3.codec.decode(output_types, HexBytes(result))
+    normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, decoded)
+    return normalized[0] if len(normalized) == 1 else normalized
+
+
+class BatchFuture:
+    """The result of a read in a batch, available once the batch is sent"""
+
+    def __init__(self, batch, method, params, formatter=None):
+        self.batch = batch
+        self.method = method
+        self.params = params
+        self.formatter = formatter
+        self._done = False
+        self._result = None
+        self._error = None
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        """Get the result, sending the batch first if it's still pending"""
+        if not self._done:
+            self.batch.flush()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _resolve(self, response):
+        try:
+            if "error" in response:
+                if self.method == "eth_call":
+                    raise_contract_logic_error_on_revert(response)
+                raise ValueError(response["error"])
+            result = response["result"]
+            self._result = result if self.formatter is None else self.formatter(result)
+        except Exception as e:
+            self._error = e
+        self._done = True
+
+
+class ReadBatch:
+    """
+    Collects independent reads and sends them as one JSON-RPC batch. Each read
+    returns a ``BatchFuture``, which resolves when the batch is sent.
+    """
+
+    def __init__(self, web3, address=None, max_size=MAX_BATCH_SIZE):
+        self.web3 = web3
+        self.address = address
+        self.max_size = max_size
+        self.pending = []
+        self._lock = threading.Lock()
+
+    def request(self, method, params, formatter=None):
+        """Queue a raw JSON-RPC request"""
+        future = BatchFuture(self, method, params, formatter)
+        with self._lock:
+            self.pending.append(future)
+        return future
+
+    def call(self, fn, block="latest"):
+        """Queue a contract call, e.g. ``batch.call(token.functions.balanceOf(a))``"""
+        tx = {"to": fn.address, "data": fn._encode_transaction_data()}
+        if self.address is not None:
+            tx["from"] = self.address
+        return self.request(
+            "eth_call",
+            [tx, _to_block(block)],
+            lambda result: _decode_call(self.web3, fn, result),
+        )
+
+    def balance(self, address, block="latest"):
+        """Queue an ETH balance read, in wei"""
+        return self.request(
+            "eth_getBalance", [address, _to_block(block)], lambda r: int(r, 16)
+        )
+
+    def transaction_count(self, address, block="latest"):
+        """Queue a nonce read"""
+        return self.request(
+            "eth_getTransactionCount", [address, _to_block(block)], lambda r: int(r, 16)
+        )
+
+    def block_number(self):
+        """Queue a block number read"""
+        return self.request("eth_blockNumber", [], lambda r: int(r, 16))
+
+    def flush(self):
+        """Send the pending reads and resolve their futures"""
+        with self._lock:
+            pending, self.pending = self.pending, []
+
+        for start in range(0, len(pending), self.max_size):
+            chunk = pending[start : start + self.max_size]
+            started = time.perf_counter()
+            responses = self._send(chunk)
+            self._observe(chunk, responses, time.perf_counter() - started)
+            for future, response in zip(chunk, responses):
+                future._resolve(response)
+
+    def _observe(self, futures, responses, seconds):
+        """Count the reads in the RPC metrics, since they skip the middleware"""
+        # the metrics can only be attached once the module is imported
+        metrics_helpers = sys.modules.get("utils.metrics_helpers")
+        if metrics_helpers is not None:
+            metrics_helpers.observe_batch(
+                self.web3,
+                [(future.method, future.params) for future in futures],
+                responses,
+                seconds,
+            )
+
+    def _send(self, futures):
+        provider = self.web3.provider
+        endpoint_uri = getattr(provider, "endpoint_uri", None)
+        if len(futures) > 1 and hasattr(provider, "make_batch_request"):
+            # ipc providers for local forks send batches themselves
+            return provider.make_batch_request(
+                [(future.method, future.params) for future in futures]
+            )
+        if len(futures) > 1 and isinstance(endpoint_uri, str):
+            if endpoint_uri.startswith("http"):
+                try:
+                    return self._send_batch(provider, futures)
+                except Exception as e:
+                    # some providers don't accept batches, so read one by one
+                    provider.logger.debug(
+                        f"Batch request failed, sending serially: {e}"
+                    )
+
+        return [
+            provider.make_request(future.method, future.params) for future in futures
+        ]
+
+    def _send_batch(self, provider, futures):
+        payload = [
+            {"jsonrpc": "2.0", "id": index, "method": f.method, "params": f.params}
+            for index, f in enumerate(futures)
+        ]
+        request_kwargs = dict(provider.get_request_kwargs())
+        headers = dict(request_kwargs.pop("headers", {}))
+        headers.update(provider.get_request_headers())
+        raw = make_post_request(
+            provider.endpoint_uri,
+            Web3.to_json(payload).encode(),
+            headers=headers,
+            **request_kwargs,
+        )
+        responses = provider.decode_rpc_response(raw)
+        if not isinstance(responses, list):
+            raise ValueError(f"Expected a batch response, got {responses}")
+
+        by_id = {response.get("id"): response for response in responses}
+        return [
+            by_id.get(index, {"error": {"message": "Missing from batch response"}})
+            for index in range(len(futures))
+        ]
+
+
+@contextmanager
+def batch_reads(snx, max_size=MAX_BATCH_SIZE):
+    """
+    Send the reads made inside the block as one JSON-RPC batch when it exits.
+    Accepts a client or a ``Web3`` instance. Reads that are needed early can call
+    ``result()``, which sends the reads queued so far.
+
+    .. code-block:: python
+
+        with batch_reads(snx) as batch:
+            usdc_balance = batch.call(usdc.functions.balanceOf(snx.address))
+            nonce = batch.transaction_count(snx.address)
+
+        usdc_balance.result()
+    """
+    web3 = getattr(snx, "web3", snx)
+    batch = ReadBatch(web3, getattr(snx, "address", None), max_size)
+    yield batch
+    batch.flush()
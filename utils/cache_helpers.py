@@ -0,0 +1,39 @@
+import os
+import json
+import tempfile
+
+# constants
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.getenv("PLAYGROUND_CACHE_DIR", os.path.join(ROOT_DIR, ".cache"))
+
+
+def cache_path(*parts):
+    """Build a path inside the playground cache directory"""
+    return os.path.join(CACHE_DIR, *parts)
+
+
+def load_json(path, default=None):
+    """Load a json file from the cache, returning the default if it is missing"""
+    if not os.path.exists(path):
+        return default
+
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+
+def save_json(path, data):
+    """Atomically write a json file to the cache"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # write to a temporary file, then swap it in place
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
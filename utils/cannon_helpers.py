@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+import requests
+from web3 import Web3
+from synthetix.contracts import contracts as snx_contracts
+from utils.cache_helpers import cache_path, load_json, save_json
+
+# constants
+CANNON_INDEX_FILE = cache_path("cannon", "index.json")
+CANNON_ARTIFACTS_DIR = cache_path("cannon", "artifacts")
+CANNON_REGISTRY_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(snx_contracts.__file__)),
+    "deployments",
+    "10",
+    "CannonRegistry.json",
+)
+DEFAULT_OP_MAINNET_RPC = "https://optimism.llamarpc.com"
+DEFAULT_IPFS_GATEWAY = "https://ipfs.synthetix.io/ipfs/"
+
+# deployments used by the tests, scripts and notebooks
+CANNON_DEPLOYMENTS = [
+    (42161, "synthetix-omnibus", "latest", "main"),
+    (421614, "synthetix-omnibus", "latest", "main"),
+    (8453, "synthetix-omnibus", "latest", "andromeda"),
+    (84532, "synthetix-omnibus", "42", "andromeda"),
+    (11155111, "synthetix-omnibus", "8", "main"),
+]
+
+_original_get_deployment_hash = snx_contracts.get_deployment_hash
+_original_fetch_deploy_from_ipfs = snx_contracts.fetch_deploy_from_ipfs
+_index_lock = threading.Lock()
+_refresh = os.getenv("CANNON_REFRESH", "").lower() in ("1", "true")
+_refreshed = set()
+
+
+def _deployment_key(network_id, package, version, preset):
+    return f"{package}:{version}@{network_id}-{preset}"
+
+
+def _artifact_path(ipfs_hash):
+    return os.path.join(CANNON_ARTIFACTS_DIR, f"{ipfs_hash}.json")
+
+
+def _abi_hash(abi):
+    return hashlib.sha256(json.dumps(abi, sort_keys=True).encode()).hexdigest()
+
+
+def resolve_deployment_hash(
+    network_id, package, version, preset, op_mainnet_rpc=DEFAULT_OP_MAINNET_RPC
+):
+    """Resolve the ipfs hash of a deployment from the cannon registry"""
+    w3 = (
+        Web3(Web3.HTTPProvider(op_mainnet_rpc))
+        if op_mainnet_rpc.startswith("http")
+        else Web3(Web3.WebsocketProvider(op_mainnet_rpc))
+    )
+    with open(CANNON_REGISTRY_FILE, "r") as file:
+        registry_def = json.load(file)
+
+    registry = w3.eth.contract(address=registry_def["address"], abi=registry_def["abi"])
+    ipfs_loc = registry.functions.getPackageUrl(
+        snx_contracts.encode_string(package),
+        snx_contracts.encode_string(version),
+        snx_contracts.encode_string(f"{network_id}-{preset}"),
+    ).call()
+    return ipfs_loc.split("/")[-1]
+
+
+def _extract_contracts(deploy_data, contracts, abis, current_package=None):
+    """Collect addresses and ABIs from a cannon deployment, following the SDK layout"""
+    if isinstance(deploy_data, dict):
+        for key, value in deploy_data.items():
+            if key == "imports":
+                for package_name, package_data in value.items():
+                    _extract_contracts(
+                        package_data,
+                        contracts.setdefault(package_name, {}),
+                        abis,
+                        package_name,
+                    )
+            elif key == "contracts" and isinstance(value, dict):
+                for contract_name, contract_data in value.items():
+                    if (
+                        current_package
+                        and isinstance(contract_data, dict)
+                        and "address" in contract_data
+                        and "abi" in contract_data
+                    ):
+                        abi_hash = _abi_hash(contract_data["abi"])
+                        abis[abi_hash] = contract_data["abi"]
+                        contracts[contract_name] = {
+                            "address": Web3.to_checksum_address(
+                                contract_data["address"]
+                            ),
+                            "abi": abi_hash,
+                        }
+            elif isinstance(value, (dict, list)):
+                _extract_contracts(value, contracts, abis, current_package)
+    elif isinstance(deploy_data, list):
+        for item in deploy_data:
+            _extract_contracts(item, contracts, abis, current_package)
+
+
+def download_artifact(ipfs_hash, ipfs_gateway=DEFAULT_IPFS_GATEWAY):
+    """Download a deployment from ipfs and store its addresses and ABIs in the cache"""
+    response = requests.get(f"{ipfs_gateway}/{ipfs_hash}")
+    response.raise_for_status()
+    deploy_data = json.loads(zlib.decompress(response.content))
+
+    # ABIs are stored once and referenced by their hash
+    contracts, abis = {}, {}
+    _extract_contracts(deploy_data, contracts, abis)
+    artifact = {"ipfs_hash": ipfs_hash, "abis": abis, "contracts": contracts}
+
+    save_json(_artifact_path(ipfs_hash), artifact)
+    return artifact
+
+
+def _attach_contracts(snx, tree, abis, factories):
+    """Build web3 contract objects for a cached contract tree"""
+    contracts = {}
+    for name, value in tree.items():
+        if "address" in value and isinstance(value.get("abi"), str):
+            abi_hash = value["abi"]
+            if abi_hash not in factories:
+                factories[abi_hash] = snx.web3.eth.contract(abi=abis[abi_hash])
+
+            contracts[name] = {
+                "address": value["address"],
+                "abi": abis[abi_hash],
+                "contract": factories[abi_hash](address=value["address"]),
+            }
+        else:
+            contracts[name] = _attach_contracts(snx, value, abis, factories)
+    return contracts
+
+
+def get_cached_deployment_hash(snx):
+    """Resolve a deployment hash from the cache, only calling the registry on a miss or refresh"""
+    cannon_config = snx.cannon_config
+    key = _deployment_key(
+        snx.network_id,
+        cannon_config["package"],
+        cannon_config["version"],
+        cannon_config["preset"],
+    )
+
+    index = load_json(CANNON_INDEX_FILE, {})
+    needs_refresh = _refresh and key not in _refreshed
+    if key in index and not needs_refresh:
+        return index[key]["ipfs_hash"]
+
+    ipfs_hash = _original_get_deployment_hash(snx)
+    with _index_lock:
+        index = load_json(CANNON_INDEX_FILE, {})
+        index[key] = {"ipfs_hash": ipfs_hash, "resolved_at": int(time.time())}
+        save_json(CANNON_INDEX_FILE, index)
+    _refreshed.add(key)
+
+    snx.logger.info(f"Resolved {key} to ipfs://{ipfs_hash}")
+    return ipfs_hash
+
+
+def fetch_cached_deploy(snx, ipfs_hash):
+    """Load a deployment from the cache, downloading it on a miss"""
+    artifact = load_json(_artifact_path(ipfs_hash))
+    if artifact is None:
+        snx.logger.info(f"Downloading cannon artifact ipfs://{ipfs_hash}")
+        artifact = download_artifact(ipfs_hash, ipfs_gateway=snx.ipfs_gateway)
+    else:
+        snx.logger.info(f"Loading cannon artifact ipfs://{ipfs_hash} from cache")
+
+    return _attach_contracts(snx, artifact["contracts"], artifact["abis"], {})
+
+
+def enable_cannon_cache(refresh=False):
+    """
+    Route cannon deployment loading in the SDK through the local cache. Set
+    ``refresh`` (or ``CANNON_REFRESH=1``) to re-resolve versions like ``latest``
+    from the registry once per process.
+    """
+    global _refresh
+    _refresh = _refresh or refresh
+
+    snx_contracts.get_deployment_hash = get_cached_deployment_hash
+    snx_contracts.fetch_deploy_from_ipfs = fetch_cached_deploy
+
+
+def prewarm_cannon_cache(
+    deployments=CANNON_DEPLOYMENTS,
+    refresh=False,
+    op_mainnet_rpc=DEFAULT_OP_MAINNET_RPC,
+    ipfs_gateway=DEFAULT_IPFS_GATEWAY,
+):
+    """Resolve and download a list of deployments, returning the resolved hashes"""
+    index = load_json(CANNON_INDEX_FILE, {})
+    resolved = {}
+    for network_id, package, version, preset in deployments:
+        key = _deployment_key(network_id, package, version, preset)
+        if key in index and not refresh:
+            ipfs_hash = index[key]["ipfs_hash"]
+        else:
+            ipfs_hash = resolve_deployment_hash(
+                network_id, package, version, preset, op_mainnet_rpc=op_mainnet_rpc
+            )
+            index[key] = {"ipfs_hash": ipfs_hash, "resolved_at": int(time.time())}
+
+        if not os.path.exists(_artifact_path(ipfs_hash)):
+            download_artifact(ipfs_hash, ipfs_gateway=ipfs_gateway)
+        resolved[key] = ipfs_hash
+
+    with _index_lock:
+        # merge with entries written by other processes
+        on_disk = load_json(CANNON_INDEX_FILE, {})
+        on_disk.update({key: index[key] for key in resolved})
+        save_json(CANNON_INDEX_FILE, on_disk)
+    return resolved
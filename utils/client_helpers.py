@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import time
+import threading
+from contextlib import contextmanager
+import synthetix.synthetix as snx_module
+from synthetix import Synthetix
+from utils.cannon_helpers import enable_cannon_cache
+from utils.provider_helpers import split_rpcs, use_hedged_provider, use_ipc_provider
+
+# constants
+LAZY_MODULES = {
+    "Core": "core",
+    "Spot": "spot",
+    "PerpsV3": "perps",
+    "BfPerps": "perps",
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+_construct_lock = threading.Lock()
+
+
+def _record_timing(snx, stage, seconds):
+    snx.__dict__.setdefault("init_timings", {})[stage] = seconds
+    snx.logger.info(f"Initialized {stage} in {seconds:.3f}s")
+
+
+class LazyModule:
+    """Stand-in for an SDK module that is only initialized on first use"""
+
+    def __init__(self, snx, name, factory):
+        self.__dict__.update(
+            _snx=snx,
+            _name=name,
+            _factory=factory,
+            _module=None,
+            _loading=False,
+            _lock=threading.RLock(),
+        )
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is not None:
+            return module
+
+        with self.__dict__["_lock"]:
+            if self.__dict__["_module"] is None:
+                if self.__dict__["_loading"]:
+                    raise RuntimeError(f"Circular initialization of {self._name}")
+
+                self.__dict__["_loading"] = True
+                try:
+                    start = time.perf_counter()
+                    module = self.__dict__["_factory"]()
+                    _record_timing(self._snx, self._name, time.perf_counter() - start)
+                    self.__dict__["_module"] = module
+                finally:
+                    self.__dict__["_loading"] = False
+        return self.__dict__["_module"]
+
+    @property
+    def is_loaded(self):
+        return self.__dict__["_module"] is not None
+
+    @property
+    def is_loading(self):
+        return self.__dict__["_loading"]
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "deferred"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+class LazyFeedsPyth:
+    """
+    Wraps the Pyth module so the price feed ids are resolved on first use. Feed
+    ids are discovered by the spot and perps modules when they load their markets.
+    """
+
+    FEED_ATTRIBUTES = ("price_feed_ids", "symbol_lookup", "get_price_from_symbols")
+
+    def __init__(self, snx, pyth):
+        self.__dict__.update(_snx=snx, _pyth=pyth, _resolved=False)
+
+    def _resolve_feeds(self):
+        self.__dict__["_resolved"] = True
+
+        start = time.perf_counter()
+        for name in ("spot", "perps"):
+            module = getattr(self._snx, name, None)
+            # a module that is loading will register its own feeds
+            if isinstance(module, LazyModule) and not module.is_loading:
+                module._load()
+        _record_timing(self._snx, "pyth_feeds", time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        if name in self.FEED_ATTRIBUTES and not self.__dict__["_resolved"]:
+            self._resolve_feeds()
+        return getattr(self._pyth, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._pyth, name, value)
+
+
+@contextmanager
+def _deferred_modules():
+    """Swap the SDK module classes for lazy stand-ins while a client is constructed"""
+    originals = {name: getattr(snx_module, name) for name in LAZY_MODULES}
+    original_pyth = snx_module.Pyth
+    original_load_contracts = snx_module.load_contracts
+
+    def make_lazy(name, cls):
+        def factory(snx, *args, **kwargs):
+            return LazyModule(snx, name, lambda: cls(snx, *args, **kwargs))
+
+        return factory
+
+    def lazy_pyth(snx, *args, **kwargs):
+        return LazyFeedsPyth(snx, original_pyth(snx, *args, **kwargs))
+
+    def timed_load_contracts(snx):
+        start = time.perf_counter()
+        contracts = original_load_contracts(snx)
+        _record_timing(snx, "contracts", time.perf_counter() - start)
+        return contracts
+
+    with _construct_lock:
+        for cls_name, name in LAZY_MODULES.items():
+            setattr(snx_module, cls_name, make_lazy(name, originals[cls_name]))
+        snx_module.Pyth = lazy_pyth
+        snx_module.load_contracts = timed_load_contracts
+        try:
+            yield
+        finally:
+            for cls_name, cls in originals.items():
+                setattr(snx_module, cls_name, cls)
+            snx_module.Pyth = original_pyth
+            snx_module.load_contracts = original_load_contracts
+
+
+def create_client(provider_rpc, lazy=True, hedge_after=None, **kwargs):
+    """
+    Create a ``Synthetix`` instance, deferring market and account discovery if
+    ``lazy``. A comma separated ``provider_rpc`` spreads requests over several
+    endpoints with a ``HedgedProvider``, hedging reads after ``hedge_after``. An
+    ``.ipc`` path uses a ``LocalIPCProvider``, with the timeout of
+    ``request_kwargs``.
+    """
+    if kwargs.get("cannon_config") is not None:
+        enable_cannon_cache()
+
+    endpoint_uris = split_rpcs(provider_rpc)
+    provider_rpc = endpoint_uris[0]
+
+    start = time.perf_counter()
+    if lazy:
+        with _deferred_modules():
+            snx = Synthetix(provider_rpc=provider_rpc, **kwargs)
+    else:
+        snx = Synthetix(provider_rpc=provider_rpc, **kwargs)
+
+    construct_time = time.perf_counter() - start
+    timings = snx.__dict__.setdefault("init_timings", {})
+    _record_timing(snx, "connect", construct_time - timings.get("contracts", 0))
+
+    if provider_rpc.endswith("ipc"):
+        timeout = (kwargs.get("request_kwargs") or {}).get("timeout")
+        ipc_kwargs = {} if timeout is None else {"timeout": timeout}
+        use_ipc_provider(snx, provider_rpc, **ipc_kwargs)
+    elif len(endpoint_uris) > 1:
+        hedge_kwargs = {} if hedge_after is None else {"hedge_after": hedge_after}
+        use_hedged_provider(snx, endpoint_uris, **hedge_kwargs)
+
+    # opt-in rpc metrics, which only import their module when enabled
+    if os.getenv("RPC_METRICS"):
+        from utils.metrics_helpers import enable_from_env
+
+        enable_from_env(snx)
+    return snx
+
+
+def _client_key(provider_rpc, network_id, cannon_config, address, kwargs):
+    """
+    Key a client by everything it was created with. The private key is hashed, so
+    it isn't kept in the key.
+    """
+    kwargs = dict(kwargs)
+    if kwargs.get("private_key") is not None:
+        private_key = kwargs["private_key"]
+        if not isinstance(private_key, str):
+            private_key = bytes(private_key).hex()
+        kwargs["private_key"] = hashlib.sha256(private_key.encode()).hexdigest()
+    return (
+        provider_rpc,
+        network_id,
+        json.dumps(cannon_config, sort_keys=True, default=str),
+        address,
+        json.dumps(kwargs, sort_keys=True, default=repr),
+    )
+
+
+def get_client(
+    provider_rpc, network_id=None, cannon_config=None, address=None, **kwargs
+):
+    """
+    Get a memoized ``Synthetix`` instance for an rpc, network, cannon config,
+    address, signer and keyword arguments. Callers with different arguments get
+    different clients.
+    """
+    key = _client_key(provider_rpc, network_id, cannon_config, address, kwargs)
+
+    with _clients_lock:
+        if key not in _clients:
+            if address is not None:
+                kwargs["address"] = address
+            _clients[key] = create_client(
+                provider_rpc,
+                network_id=network_id,
+                cannon_config=cannon_config,
+                **kwargs,
+            )
+        return _clients[key]
+
+
+def get_init_timings(snx):
+    """Get the initialization time in seconds for each stage of a client"""
+    return dict(snx.__dict__.get("init_timings", {}))
+
+
+def clear_clients():
+    """Forget all memoized clients, e.g. after restarting a fork"""
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,465 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from utils.arb_helpers import mock_arb_precompiles
+from utils.client_helpers import create_client
+from utils.fork_helpers import (
+    get_fork_blocks,
+    get_upstream_rpc,
+    revert,
+    snapshot,
+    start_anvil,
+)
+from utils.funding_helpers import top_up_tokens
+from utils.oracle_helpers import update_pyth_prices
+
+# constants
+DAEMON_SOCKET = os.getenv(
+    "FORK_DAEMON_SOCKET", os.path.join(tempfile.gettempdir(), "synthetix-forks.sock")
+)
+LEASE_TIMEOUT = 300
+REFRESH_AFTER = 600
+MAINTENANCE_INTERVAL = 30
+CLIENT_TIMEOUT = 120
+
+# the standard setup of each network's forks, as in the fork scripts and tests
+FORK_NETWORKS = {
+    "arbitrum:mainnet": {
+        "network_id": 42161,
+        "cannon_config": {
+            "package": "synthetix-omnibus",
+            "version": "latest",
+            "preset": "main",
+        },
+        "arb_precompiles": True,
+        "usdc_whale": "0x1F7bc4dA1a0c2e49d7eF542F74CD46a3FE592cb1",
+        "usdc_amount": 1000000,
+    },
+    "arbitrum:sepolia": {
+        "network_id": 421614,
+        "cannon_config": {
+            "package": "synthetix-omnibus",
+            "version": "latest",
+            "preset": "main",
+        },
+        "arb_precompiles": True,
+        "usdc_whale": "0x6ED0C4ADDC308bb800096B8DaA41DE5ae219cd36",
+        "usdc_amount": 1000000,
+    },
+    "base:mainnet": {
+        "network_id": 8453,
+        "cannon_config": {
+            "package": "synthetix-omnibus",
+            "version": "latest",
+            "preset": "andromeda",
+        },
+        "usdc_whale": "0xD34EA7278e6BD48DefE656bbE263aEf11101469c",
+        "usdc_amount": 100000,
+    },
+    "base:sepolia": {
+        "network_id": 84532,
+        "cannon_config": {
+            "package": "synthetix-omnibus",
+            "version": "42",
+            "preset": "andromeda",
+        },
+    },
+}
+
+
+def create_fork_client(network, rpc, **kwargs):
+    """Create a client for a fork of a network, with its cannon preset"""
+    config = FORK_NETWORKS[network]
+    kwargs.setdefault("price_service_endpoint", os.getenv("PRICE_SERVICE_ENDPOINT"))
+    kwargs.setdefault("request_kwargs", {"timeout": CLIENT_TIMEOUT})
+    kwargs.setdefault("pyth_cache_ttl", 0)
+    return create_client(
+        rpc,
+        network_id=config["network_id"],
+        cannon_config=config["cannon_config"],
+        **kwargs,
+    )
+
+
+def setup_fork(snx, network):
+    """
+    Apply the standard setup of a network's forks: mock the Arbitrum precompiles,
+    top up USDC from a whale, and push the latest Pyth prices
+    """
+    config = FORK_NETWORKS[network]
+    if config.get("arb_precompiles"):
+        mock_arb_precompiles(snx)
+    if config.get("usdc_whale"):
+        usdc = snx.contracts["USDC"]["contract"]
+        top_up_tokens(
+            snx, [(usdc.address, config["usdc_amount"], config["usdc_whale"])]
+        )
+    update_pyth_prices(snx)
+
+
+class WarmFork:
+    """An anvil fork with the standard setup applied, and a snapshot of it"""
+
+    def __init__(self, network, index, anvil, snx):
+        self.network = network
+        self.index = index
+        self.anvil = anvil
+        self.snx = snx
+        self.lease_id = None
+        self.snapshot_id = None
+        self.snapshot_time = None
+        self.setup_s = None
+        self.leases = 0
+
+    @property
+    def name(self):
+        return f"{self.network}#{self.index}"
+
+    def take_snapshot(self):
+        self.snapshot_id = snapshot(self.anvil.web3)
+        self.snapshot_time = time.time()
+
+    def reset(self):
+        """
+        Revert to the snapshot, then take a new one, since reverting uses it up
+        """
+        revert(self.anvil.web3, self.snapshot_id)
+        self.take_snapshot()
+
+    def info(self):
+        return {
+            "name": self.name,
+            "network": self.network,
+            "network_id": FORK_NETWORKS[self.network]["network_id"],
+            "uri": self.anvil.uri,
+            "ipc_path": self.anvil.ipc_path,
+            "leased": self.lease_id is not None,
+            "leases": self.leases,
+            "snapshot_age": time.time() - self.snapshot_time,
+            "setup_s": self.setup_s,
+        }
+
+
+class ForkDaemon:
+    """
+    Starts forks of several networks in parallel, applies the standard setup to
+    each and snapshots it. Forks are leased over a unix socket, and reverted to
+    their snapshot when released, so a clean fork is ready in milliseconds
+    instead of a cold start. Idle forks get fresh prices every ``refresh_after``
+    seconds, since oracle prices go stale.
+    """
+
+    logger = logging.getLogger("utils.daemon_helpers.ForkDaemon")
+
+    def __init__(
+        self,
+        networks,
+        forks_per_network=1,
+        socket_path=DAEMON_SOCKET,
+        refresh_after=REFRESH_AFTER,
+        ipc=True,
+        anvil_path="anvil",
+    ):
+        unknown = set(networks) - set(FORK_NETWORKS)
+        if len(unknown) > 0:
+            raise ValueError(
+                f"Unknown networks {sorted(unknown)}, expected {list(FORK_NETWORKS)}"
+            )
+
+        self.networks = list(networks)
+        self.forks_per_network = forks_per_network
+        self.socket_path = socket_path
+        self.refresh_after = refresh_after
+        self.ipc = ipc
+        self.anvil_path = anvil_path
+        self.forks = []
+        self.server = None
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+
+    def _start_fork(self, network, index, fork_block):
+        fork_url = get_upstream_rpc(network)
+        if not fork_url or fork_url.startswith("$"):
+            raise ValueError(f"No RPC is configured for {network}")
+
+        start = time.perf_counter()
+        anvil = start_anvil(
+            fork_url, fork_block, anvil_path=self.anvil_path, ipc=self.ipc
+        )
+        try:
+            snx = create_fork_client(network, anvil.rpc)
+            setup_fork(snx, network)
+            fork = WarmFork(network, index, anvil, snx)
+            fork.take_snapshot()
+        except Exception:
+            anvil.stop()
+            raise
+        fork.setup_s = time.perf_counter() - start
+        return fork
+
+    def start(self):
+        """Start and set up every fork in parallel, then serve leases"""
+        fork_blocks = get_fork_blocks()
+        jobs = [
+            (network, index, fork_blocks.get(network))
+            for network in self.networks
+            for index in range(self.forks_per_network)
+        ]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = {executor.submit(self._start_fork, *job): job for job in jobs}
+            for future in as_completed(futures):
+                network, index, _ = futures[future]
+                try:
+                    fork = future.result()
+                except Exception as e:
+                    self.logger.error(f"Failed to start {network}#{index}: {e}")
+                    continue
+                self.forks.append(fork)
+                self.logger.info(f"{fork.name} is ready in {fork.setup_s:.1f}s")
+
+        self.forks.sort(key=lambda fork: (fork.network, fork.index))
+        try:
+            if len(self.forks) == 0:
+                raise Exception("No forks could be started")
+            self._serve()
+        except Exception:
+            self.close()
+            raise
+        threading.Thread(target=self._maintain, daemon=True).start()
+        return self
+
+    def lease(self, network, timeout=LEASE_TIMEOUT):
+        """Lease an idle fork of a network, waiting up to ``timeout`` for one"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not any(fork.network == network for fork in self.forks):
+                raise ValueError(f"The daemon has no forks of {network}")
+            while True:
+                idle = [
+                    fork
+                    for fork in self.forks
+                    if fork.network == network and fork.lease_id is None
+                ]
+                if len(idle) > 0:
+                    fork = idle[0]
+                    fork.lease_id = uuid.uuid4().hex
+                    fork.leases += 1
+                    return fork
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed.is_set():
+                    raise TimeoutError(f"No fork of {network} was released in time")
+                self._cond.wait(remaining)
+
+    def release(self, fork):
+        """Revert a leased fork to its snapshot, and make it available again"""
+        try:
+            fork.reset()
+        except Exception as e:
+            # the fork can't be trusted anymore, so stop leasing it
+            self.logger.error(f"Failed to revert {fork.name}, removing it: {e}")
+            with self._cond:
+                self.forks.remove(fork)
+            fork.anvil.stop()
+            return
+
+        with self._cond:
+            fork.lease_id = None
+            self._cond.notify_all()
+
+    def refresh(self, fork):
+        """Push fresh prices to an idle fork, and snapshot it again"""
+        fork.snx.nonce = fork.snx.web3.eth.get_transaction_count(fork.snx.address)
+        update_pyth_prices(fork.snx)
+        fork.take_snapshot()
+        self.logger.info(f"Refreshed prices on {fork.name}")
+
+    def _maintain(self):
+        while not self._closed.wait(MAINTENANCE_INTERVAL):
+            for fork in list(self.forks):
+                if time.time() - fork.snapshot_time < self.refresh_after:
+                    continue
+
+                # claim the fork, so it isn't leased while it's refreshed
+                with self._cond:
+                    if fork.lease_id is not None or fork not in self.forks:
+                        continue
+                    fork.lease_id = "refresh"
+                try:
+                    self.refresh(fork)
+                except Exception as e:
+                    # back to the last snapshot, which is retried later
+                    self.logger.warning(f"Failed to refresh {fork.name}: {e}")
+                    self.release(fork)
+                    continue
+                with self._cond:
+                    fork.lease_id = None
+                    self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            return [fork.info() for fork in self.forks]
+
+    def _handle(self, request, leases):
+        op = request.get("op")
+        if op == "lease":
+            fork = self.lease(request["network"], request.get("timeout", LEASE_TIMEOUT))
+            leases[fork.lease_id] = fork
+            return {"lease_id": fork.lease_id, "fork": fork.info()}
+        if op == "release":
+            fork = leases.pop(request["lease_id"], None)
+            if fork is None:
+                raise ValueError(f"Unknown lease {request['lease_id']}")
+            self.release(fork)
+            return {}
+        if op == "status":
+            return {"forks": self.status()}
+        raise ValueError(f"Unknown operation {op}")
+
+    def _serve(self):
+        if os.path.exists(self.socket_path):
+            try:
+                daemon_status(self.socket_path)
+            except OSError:
+                # left behind by a daemon that was killed
+                os.remove(self.socket_path)
+            else:
+                raise Exception(f"A fork daemon is already serving {self.socket_path}")
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # leases end when the connection closes, even if the client crashed
+                leases = {}
+                try:
+                    for line in self.rfile:
+                        try:
+                            response = daemon._handle(json.loads(line), leases)
+                            response["ok"] = True
+                        except Exception as e:
+                            response = {"ok": False, "error": str(e)}
+                        self.wfile.write(json.dumps(response).encode() + b"\n")
+                finally:
+                    for fork in leases.values():
+                        daemon.release(fork)
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger.info(f"Serving {len(self.forks)} forks at {self.socket_path}")
+
+    def close(self):
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        for fork in self.forks:
+            fork.anvil.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Connection:
+    """A line delimited JSON connection to a fork daemon"""
+
+    def __init__(self, socket_path=DAEMON_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile("rwb")
+
+    def request(self, op, **params):
+        self.file.write(json.dumps({"op": op, **params}).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The fork daemon closed the connection")
+        response = json.loads(line)
+        if not response.pop("ok"):
+            raise Exception(f"Fork daemon {op} failed: {response['error']}")
+        return response
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+class ForkLease:
+    """A fork leased from a daemon, which is reverted when the lease is released"""
+
+    def __init__(self, connection, lease_id, fork):
+        self.connection = connection
+        self.lease_id = lease_id
+        self.fork = fork
+        self.network = fork["network"]
+
+    @property
+    def rpc(self):
+        """The IPC socket of the fork if it has one, otherwise its HTTP endpoint"""
+        return self.fork["ipc_path"] or self.fork["uri"]
+
+    def client(self, **kwargs):
+        """
+        Create a client for the fork. Clients aren't memoized, since the same
+        fork is leased again after it's reverted.
+        """
+        return create_fork_client(self.network, self.rpc, **kwargs)
+
+    def release(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.request("release", lease_id=self.lease_id)
+        finally:
+            self.connection.close()
+            self.connection = None
+
+
+@contextmanager
+def lease_fork(network, socket_path=DAEMON_SOCKET, timeout=LEASE_TIMEOUT):
+    """
+    Lease a clean fork of a network from a running fork daemon, like
+    ``arbitrum:mainnet``, and release it when the block exits
+
+    .. code-block:: python
+
+        with lease_fork("arbitrum:mainnet") as lease:
+            snx = lease.client()
+    """
+    connection = _Connection(socket_path)
+    try:
+        response = connection.request("lease", network=network, timeout=timeout)
+    except Exception:
+        connection.close()
+        raise
+
+    lease = ForkLease(connection, response["lease_id"], response["fork"])
+    try:
+        yield lease
+    finally:
+        lease.release()
+
+
+def daemon_status(socket_path=DAEMON_SOCKET):
+    """Get the forks of a running fork daemon"""
+    connection = _Connection(socket_path)
+    try:
+        return connection.request("status")["forks"]
+    finally:
+        connection.close()
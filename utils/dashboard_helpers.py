@@ -0,0 +1,321 @@
+import time
+from synthetix.utils import format_wei, wei_to_ether
+from utils.multicall_helpers import (
+    OraclePrefetch,
+    aggregate_calls,
+    aggregate_calls_erc7412,
+)
+from utils.token_helpers import get_tokens_metadata
+
+# constants
+UNLIMITED_ALLOWANCE = 2**255
+ACCOUNT_PROXIES = {
+    "core": [("system", "AccountProxy")],
+    "perps": [
+        ("perpsFactory", "PerpsAccountProxy"),
+        ("bfp_market_factory", "PerpAccountProxy"),
+    ],
+}
+SPENDERS = [
+    ("system", "CoreProxy"),
+    ("spotFactory", "SpotMarketProxy"),
+    ("perpsFactory", "PerpsMarketProxy"),
+]
+MARGIN_FUNCTIONS = [
+    "totalCollateralValue",
+    "getAvailableMargin",
+    "getWithdrawableMargin",
+    "getRequiredMargins",
+]
+
+
+def _get_contract(snx, package, name):
+    """Get a contract from the deployment without initializing any SDK modules"""
+    return snx.contracts.get(package, {}).get(name, {}).get("contract")
+
+
+def _has_functions(contract, functions):
+    abi_functions = {item.get("name") for item in contract.abi}
+    return all(fn in abi_functions for fn in functions)
+
+
+def default_tokens(snx):
+    """List the tokens shown by default: WETH, USDC, sUSD and the spot synths"""
+    tokens = [
+        snx.contracts[name]["address"]
+        for name in ("WETH", "USDC")
+        if "address" in snx.contracts.get(name, {})
+    ]
+    tokens.append(snx.contracts["system"]["USDProxy"]["address"])
+    tokens.extend(
+        market["contract"].address
+        for market in getattr(snx.spot, "markets_by_id", {}).values()
+    )
+    return list(dict.fromkeys(tokens))
+
+
+def default_spenders(snx):
+    """List the core, spot and perps proxies deployed on the network"""
+    spenders = [_get_contract(snx, package, name) for package, name in SPENDERS]
+    return {
+        name: contract.address
+        for (_, name), contract in zip(SPENDERS, spenders)
+        if contract is not None
+    }
+
+
+def get_account_summary(
+    snx,
+    address=None,
+    tokens=None,
+    spenders=None,
+    block="latest",
+    account_counts=None,
+    oracle_prefetch=None,
+):
+    """
+    Fetch ETH and token balances, allowances, account ids and perps margin for an
+    address. Balances, allowances and account ids are fetched in one multicall,
+    and margin for all perps accounts in a second one. Pass the same
+    ``account_counts`` dict between calls to fetch the account ids in the first
+    multicall, and the same ``OraclePrefetch`` to send the oracle updates for
+    margin up front.
+    """
+    address = address or snx.address
+    tokens = list(dict.fromkeys(tokens)) if tokens is not None else default_tokens(snx)
+    spenders = spenders if spenders is not None else default_spenders(snx)
+    account_counts = account_counts if account_counts is not None else {}
+    metadata = get_tokens_metadata(snx, tokens)
+
+    erc20 = snx.web3.eth.contract(abi=snx.contracts["common"]["ERC20"]["abi"])
+    token_contracts = {token: erc20(address=token) for token in tokens}
+    account_proxies = {}
+    for name, options in ACCOUNT_PROXIES.items():
+        for package, proxy_name in options:
+            proxy = _get_contract(snx, package, proxy_name)
+            if proxy is not None:
+                account_proxies[name] = proxy
+                break
+
+    # balances, allowances, account balances and previously seen account ids
+    calls = [(snx.multicall, "getEthBalance", (address,))]
+    calls += [(token_contracts[token], "balanceOf", (address,)) for token in tokens]
+    calls += [
+        (token_contracts[token], "allowance", (address, spender))
+        for token in tokens
+        for spender in spenders.values()
+    ]
+    for name, proxy in account_proxies.items():
+        calls.append((proxy, "balanceOf", (address,)))
+        calls += [
+            (proxy, "tokenOfOwnerByIndex", (address, index))
+            for index in range(account_counts.get(name, 0))
+        ]
+    results = iter(aggregate_calls(snx, calls, block=block))
+
+    eth_balance = next(results)
+    balances = {token: next(results) for token in tokens}
+    allowances = {
+        (token, spender_name): next(results)
+        for token in tokens
+        for spender_name in spenders
+    }
+
+    accounts = {}
+    for name, proxy in account_proxies.items():
+        count = next(results) or 0
+        account_ids = [next(results) for _ in range(account_counts.get(name, 0))]
+
+        # fetch any new account ids, and remember the count for the next call
+        account_ids = [
+            account_id for account_id in account_ids[:count] if account_id is not None
+        ]
+        if count > len(account_ids):
+            account_ids += aggregate_calls(
+                snx,
+                [
+                    (proxy, "tokenOfOwnerByIndex", (address, index))
+                    for index in range(len(account_ids), count)
+                ],
+                block=block,
+            )
+        account_counts[name] = count
+        accounts[name] = account_ids
+
+    # margin for each perps account
+    margin = {}
+    market_proxy = _get_contract(snx, "perpsFactory", "PerpsMarketProxy")
+    perps_accounts = accounts.get("perps", [])
+    if (
+        market_proxy is not None
+        and len(perps_accounts) > 0
+        and _has_functions(market_proxy, MARGIN_FUNCTIONS)
+    ):
+        margin_results = iter(
+            aggregate_calls_erc7412(
+                snx,
+                [
+                    (market_proxy, fn, (account_id,))
+                    for account_id in perps_accounts
+                    for fn in MARGIN_FUNCTIONS
+                ],
+                block=block,
+                prefetch=oracle_prefetch,
+            )
+        )
+        for account_id in perps_accounts:
+            collateral, available, withdrawable, required = [
+                next(margin_results) for _ in MARGIN_FUNCTIONS
+            ]
+            margin[account_id] = {
+                "collateral_value": wei_to_ether(collateral),
+                "available_margin": wei_to_ether(available),
+                "withdrawable_margin": wei_to_ether(withdrawable),
+                "initial_margin_requirement": wei_to_ether(required[0]),
+                "maintenance_margin_requirement": wei_to_ether(required[1]),
+            }
+
+    def format_amount(token, value):
+        if value is None:
+            return None
+        if value >= UNLIMITED_ALLOWANCE:
+            return float("inf")
+        return format_wei(value, metadata[token]["decimals"])
+
+    return {
+        "address": address,
+        "block": block,
+        "eth": wei_to_ether(eth_balance) if eth_balance is not None else None,
+        "balances": {
+            token: {
+                "symbol": metadata[token]["symbol"],
+                "balance": format_amount(token, balance),
+            }
+            for token, balance in balances.items()
+        },
+        "allowances": {
+            key: format_amount(key[0], allowance)
+            for key, allowance in allowances.items()
+        },
+        "spenders": spenders,
+        "accounts": accounts,
+        "margin": margin,
+    }
+
+
+def _format_table(headers, rows):
+    rows = [["-" if value is None else str(value) for value in row] for row in rows]
+    widths = [
+        max(len(str(header)), *(len(row[ind]) for row in rows))
+        for ind, header in enumerate(headers)
+    ]
+    lines = ["  ".join(str(h).ljust(w) for h, w in zip(headers, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    lines += [
+        "  ".join(value.ljust(w) for value, w in zip(row, widths)) for row in rows
+    ]
+    return "\n".join(lines)
+
+
+def format_account_summary(summary):
+    """Render an account summary as text tables"""
+
+    def amount(value):
+        if value is None:
+            return None
+        if value == float("inf"):
+            return "unlimited"
+        return f"{value:,.4f}"
+
+    spender_names = list(summary["spenders"])
+    rows = [["ETH", "", amount(summary["eth"])] + [""] * len(spender_names)]
+    for token, balance in summary["balances"].items():
+        rows.append(
+            [balance["symbol"], token, amount(balance["balance"])]
+            + [amount(summary["allowances"][(token, name)]) for name in spender_names]
+        )
+    sections = [
+        f"Address {summary['address']} at block {summary['block']}",
+        _format_table(
+            ["Token", "Address", "Balance"]
+            + [f"Allowance ({name})" for name in spender_names],
+            rows,
+        ),
+    ]
+
+    sections.append(
+        "\n".join(
+            f"{name.capitalize()} accounts: {account_ids}"
+            for name, account_ids in summary["accounts"].items()
+        )
+    )
+
+    if len(summary["margin"]) > 0:
+        margin_rows = [
+            [account_id] + [amount(value) for value in margin.values()]
+            for account_id, margin in summary["margin"].items()
+        ]
+        margin_headers = list(next(iter(summary["margin"].values())).keys())
+        sections.append(
+            _format_table(
+                ["Perps account"]
+                + [header.replace("_", " ").capitalize() for header in margin_headers],
+                margin_rows,
+            )
+        )
+    return "\n\n".join(sections)
+
+
+def _print_summary(summary):
+    # replace the previous output when running in a notebook
+    try:
+        from IPython.display import clear_output
+
+        clear_output(wait=True)
+    except ImportError:
+        pass
+    print(format_account_summary(summary))
+
+
+def watch_account_summary(
+    snx,
+    address=None,
+    tokens=None,
+    spenders=None,
+    poll_interval=1,
+    max_updates=None,
+    render=_print_summary,
+):
+    """
+    Render an account summary each time a new block arrives. Stops after
+    ``max_updates`` refreshes or on interrupt, returning the last summary.
+    """
+    tokens = list(dict.fromkeys(tokens)) if tokens is not None else default_tokens(snx)
+    spenders = spenders if spenders is not None else default_spenders(snx)
+    account_counts = {}
+    oracle_prefetch = OraclePrefetch(snx)
+
+    summary = None
+    last_block = None
+    updates = 0
+    try:
+        while max_updates is None or updates < max_updates:
+            block = snx.web3.eth.block_number
+            if block != last_block:
+                summary = get_account_summary(
+                    snx,
+                    address=address,
+                    tokens=tokens,
+                    spenders=spenders,
+                    block=block,
+                    account_counts=account_counts,
+                    oracle_prefetch=oracle_prefetch,
+                )
+                render(summary)
+                last_block = block
+                updates += 1
+            else:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    return summary
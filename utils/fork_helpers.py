@@ -0,0 +1,350 @@
+import os
+import re
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import yaml
+from urllib.parse import urlparse
+from web3 import Web3
+from utils.cache_helpers import ROOT_DIR
+
+# constants
+ANVIL_STARTUP_TIMEOUT = 60
+APE_CONFIG = os.path.join(ROOT_DIR, "ape-config.yaml")
+IPC_FILE = re.compile(r"anvil-(\d+)\.ipc$")
+LOCAL_HOSTS = ["127.0.0.1", "localhost"]
+
+# ipc sockets of the forks started by ape, by port
+_ipc_paths = {}
+
+
+def find_free_port():
+    """Ask the OS for an unused local port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_ipc_path(port):
+    """
+    Get the IPC socket of an anvil fork listening on ``port``. Sockets are kept in
+    the temp directory, since their paths are limited to about 100 characters.
+    """
+    return os.path.join(tempfile.gettempdir(), f"anvil-{port}.ipc")
+
+
+def get_ipc_port(ipc_path):
+    """Get the port of the anvil fork serving an IPC socket, or None"""
+    match = IPC_FILE.search(str(ipc_path))
+    return int(match.group(1)) if match else None
+
+
+def _remove_socket(path):
+    # sockets of killed forks are left behind, and anvil can't bind over them
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class AnvilFork:
+    """An anvil process forking a network, stopped when used as a context manager"""
+
+    def __init__(self, process, port, ipc_path=None):
+        self.process = process
+        self.port = port
+        self.uri = f"http://127.0.0.1:{port}"
+        self.ipc_path = ipc_path
+        self.web3 = Web3(Web3.HTTPProvider(self.uri, request_kwargs={"timeout": 120}))
+
+    @property
+    def rpc(self):
+        """The IPC socket of the fork if it has one, otherwise its HTTP endpoint"""
+        return self.ipc_path or self.uri
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.ipc_path is not None:
+            _remove_socket(self.ipc_path)
+
+
+def start_anvil(
+    fork_url=None,
+    fork_block_number=None,
+    port=None,
+    anvil_path="anvil",
+    extra_args=(),
+    timeout=ANVIL_STARTUP_TIMEOUT,
+    ipc=False,
+):
+    """
+    Start an anvil fork and wait until it responds to requests. Without a
+    ``fork_url`` anvil starts a fresh local chain. With ``ipc``, anvil also
+    serves an IPC socket at ``get_ipc_path(port)``.
+    """
+    port = port or find_free_port()
+    args = [anvil_path, "--port", str(port), "--silent"]
+    if fork_url is not None:
+        args += ["--fork-url", fork_url]
+    if fork_block_number is not None:
+        args += ["--fork-block-number", str(fork_block_number)]
+    ipc_path = None
+    if ipc:
+        ipc_path = get_ipc_path(port)
+        _remove_socket(ipc_path)
+        args += ["--ipc", ipc_path]
+    args += list(extra_args)
+
+    fork = AnvilFork(subprocess.Popen(args), port, ipc_path)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            if fork.process.poll() is not None:
+                raise Exception(f"anvil exited with code {fork.process.returncode}")
+            try:
+                fork.web3.eth.chain_id
+                if ipc_path is None or os.path.exists(ipc_path):
+                    return fork
+                raise Exception(f"anvil has not created {ipc_path}")
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise Exception(f"anvil did not start on port {port}")
+                time.sleep(0.25)
+    except BaseException:
+        # don't leave anvil running on a timeout, an interrupt or an exit
+        fork.stop()
+        raise
+
+
+def enable_anvil_ipc():
+    """
+    Start the anvil forks launched by ape-foundry with an IPC socket, at
+    ``get_ipc_path(port)``. ``get_fork_rpc`` returns the socket of those forks.
+    Returns False without ape-foundry, so forks keep using HTTP.
+    """
+    try:
+        from ape_foundry.provider import FoundryProvider
+    except ImportError:
+        return False
+
+    build_command = FoundryProvider.build_command
+    if getattr(build_command, "with_ipc", False):
+        return True
+
+    def build_command_with_ipc(self):
+        command = build_command(self)
+        if "--port" not in command or "--ipc" in command:
+            return command
+
+        port = int(command[command.index("--port") + 1])
+        _ipc_paths[port] = get_ipc_path(port)
+        _remove_socket(_ipc_paths[port])
+        return command + ["--ipc", _ipc_paths[port]]
+
+    build_command_with_ipc.with_ipc = True
+    FoundryProvider.build_command = build_command_with_ipc
+    return True
+
+
+def get_fork_rpc(provider):
+    """
+    Get the endpoint for clients of a fork started by ape: its IPC socket when
+    ``enable_anvil_ipc`` gave it one, otherwise its HTTP endpoint
+    """
+    uri = provider.uri
+    parsed = urlparse(uri)
+    if parsed.hostname in LOCAL_HOSTS and parsed.port in _ipc_paths:
+        ipc_path = _ipc_paths[parsed.port]
+        if os.path.exists(ipc_path):
+            return ipc_path
+    return uri
+
+
+def snapshot(web3):
+    """Take a snapshot of the fork state, returning its id"""
+    return web3.provider.make_request("evm_snapshot", [])["result"]
+
+
+def revert(web3, snapshot_id):
+    """
+    Revert the fork to a snapshot. The snapshot is used up by reverting, so take
+    a new one to revert to the same state again.
+    """
+    response = web3.provider.make_request("evm_revert", [snapshot_id])
+    if not response.get("result"):
+        raise Exception(f"Failed to revert to snapshot {snapshot_id}: {response}")
+
+
+def dump_state(web3):
+    """Dump the state of an anvil fork, to load it into other forks"""
+    return web3.provider.make_request("anvil_dumpState", [])["result"]
+
+
+def load_state(web3, state):
+    """Load state dumped from another anvil fork of the same block"""
+    response = web3.provider.make_request("anvil_loadState", [state])
+    if not response.get("result"):
+        raise Exception(f"Failed to load the fork state: {response}")
+
+
+def mine_web3_block(web3, seconds=0):
+    """
+    Mine a block at the current time, after waiting ``seconds``. Unlike
+    ``chain_helpers.mine_block``, this only needs a web3 connected to anvil.
+    """
+    time.sleep(seconds)
+    timestamp = int(time.time())
+    web3.provider.make_request("evm_mine", [timestamp])
+    return timestamp
+
+
+def get_fork_block_number(web3):
+    """Get the block an anvil fork was started from, or None if it's not a fork"""
+    response = web3.provider.make_request("anvil_nodeInfo", [])
+    fork_config = (response.get("result") or {}).get("forkConfig") or {}
+    return fork_config.get("forkBlockNumber")
+
+
+def get_fork_blocks(path=APE_CONFIG):
+    """
+    Get the pinned fork block of each network in ``ape-config.yaml``, keyed by
+    ``ecosystem:network``. Networks that fork the latest block map to None.
+    """
+    with open(path) as file:
+        config = yaml.safe_load(file)
+
+    forks = config.get("foundry", {}).get("fork", {})
+    return {
+        f"{ecosystem}:{network}": (fork or {}).get("block_number")
+        for ecosystem, networks in forks.items()
+        for network, fork in networks.items()
+    }
+
+
+def get_upstream_rpc(network, path=APE_CONFIG):
+    """Get the node RPC of an ``ecosystem:network`` from ``ape-config.yaml``"""
+    with open(path) as file:
+        config = yaml.safe_load(file)
+
+    ecosystem, network = network.split(":")
+    uri = config.get("node", {}).get(ecosystem, {}).get(network, {}).get("uri")
+    return os.path.expandvars(uri) if uri else None
+
+
+def _find_block(lines, key, start, end, indent):
+    """Find the lines of a mapping key nested below ``indent``, by indentation"""
+    for ind in range(start, end):
+        stripped = lines[ind].strip()
+        line_indent = len(lines[ind]) - len(lines[ind].lstrip())
+        if stripped and line_indent > indent and stripped.startswith(f"{key}:"):
+            block_end = ind + 1
+            while block_end < end:
+                line = lines[block_end]
+                if line.strip() and len(line) - len(line.lstrip()) <= line_indent:
+                    break
+                block_end += 1
+            return ind, block_end, line_indent
+    return None
+
+
+def set_fork_block(network, block_number, path=APE_CONFIG):
+    """
+    Pin the fork block of an ``ecosystem:network`` in ``ape-config.yaml``, or fork
+    the latest block again when ``block_number`` is None. Only the
+    ``block_number`` line is changed, so the rest of the file is kept as is.
+    """
+    with open(path) as file:
+        lines = file.read().splitlines()
+
+    start, end, indent = 0, len(lines), -1
+    for key in ["foundry", "fork"] + network.split(":"):
+        block = _find_block(lines, key, start, end, indent)
+        if block is None:
+            raise ValueError(f"{network} is not a foundry fork in {path}")
+        start, end, indent = block[0] + 1, block[1], block[2]
+
+    # drop trailing blank lines from the network's block
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    child_indent = " " * (indent + 2)
+    for ind in range(start, end):
+        if lines[ind].strip().startswith("block_number:"):
+            child_indent = lines[ind][: len(lines[ind]) - len(lines[ind].lstrip())]
+            del lines[ind]
+            end -= 1
+            break
+        if lines[ind].strip():
+            child_indent = lines[ind][: len(lines[ind]) - len(lines[ind].lstrip())]
+
+    if block_number is not None:
+        lines.insert(end, f"{child_indent}block_number: {int(block_number)}")
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+class DelayProxy:
+    """
+    A local HTTP proxy for an RPC endpoint that adds latency and failures, to
+    test how clients handle slow or rate limited providers. ``delay`` and
+    ``fail_rate`` can be changed while it runs.
+    """
+
+    def __init__(self, upstream_uri, delay=0, fail_rate=0, port=None):
+        self.upstream_uri = upstream_uri
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.requests = 0
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                proxy.requests += 1
+                time.sleep(proxy.delay)
+                if random.random() < proxy.fail_rate:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+
+                response = requests.post(
+                    proxy.upstream_uri,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                )
+                self.send_response(response.status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response.content)))
+                self.end_headers()
+                self.wfile.write(response.content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port or 0), Handler)
+        self.server.daemon_threads = True
+        self.uri = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
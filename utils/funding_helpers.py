@@ -0,0 +1,161 @@
+import os
+from eth_account import Account
+from synthetix.utils import ether_to_wei
+from utils.batch_helpers import batch_reads
+from utils.token_helpers import get_tokens_metadata
+
+# constants
+TEST_MNEMONIC = "test test test test test test test test test test test junk"
+WHALE_ETH_BALANCE = 100
+
+Account.enable_unaudited_hdwallet_features()
+
+
+def derive_accounts(count, mnemonic=TEST_MNEMONIC, offset=0):
+    """Derive accounts from a mnemonic, starting with the same accounts as ape"""
+    return [
+        Account.from_mnemonic(mnemonic, account_path=f"m/44'/60'/0'/0/{index}")
+        for index in range(offset, offset + count)
+    ]
+
+
+def set_eth_balances(snx, addresses, amount):
+    """Set the ETH balance of each address on an anvil fork"""
+    balance = hex(ether_to_wei(amount))
+    for address in addresses:
+        snx.web3.provider.make_request("anvil_setBalance", [address, balance])
+    snx.logger.info(f"Set ETH balance of {len(addresses)} addresses to {amount}")
+
+
+def fund_token(snx, token_address, addresses, amount, whale):
+    """
+    Transfer ``amount`` of a token from a whale to each address on an anvil fork.
+    The transfers are sent back to back with sequential nonces and confirmed
+    together, instead of waiting for each one.
+    """
+    decimals = get_tokens_metadata(snx, [token_address])[token_address]["decimals"]
+    token = snx.web3.eth.contract(
+        address=token_address, abi=snx.contracts["common"]["ERC20"]["abi"]
+    )
+    transfer_amount = int(amount * 10**decimals)
+
+    total = transfer_amount * len(addresses)
+    whale_balance = token.functions.balanceOf(whale).call()
+    if whale_balance < total:
+        raise ValueError(
+            f"Whale {whale} has {whale_balance} tokens, {total} are needed"
+        )
+
+    snx.web3.provider.make_request("anvil_impersonateAccount", [whale])
+    set_eth_balances(snx, [whale], WHALE_ETH_BALANCE)
+
+    nonce = snx.web3.eth.get_transaction_count(whale)
+    tx_hashes = []
+    for index, address in enumerate(addresses):
+        tx_params = token.functions.transfer(
+            address, transfer_amount
+        ).build_transaction({"from": whale, "nonce": nonce + index})
+        # send the transaction directly without signing
+        tx_hashes.append(snx.web3.eth.send_transaction(tx_params))
+
+    receipts = [snx.wait(tx_hash) for tx_hash in tx_hashes]
+    failed = [
+        address
+        for address, receipt in zip(addresses, receipts)
+        if receipt["status"] != 1
+    ]
+    if len(failed) > 0:
+        raise Exception(f"Token transfers from {whale} failed for {failed}")
+
+    snx.logger.info(f"Sent {amount} of {token_address} to {len(addresses)} addresses")
+    return receipts
+
+
+def top_up_tokens(snx, targets, address=None):
+    """
+    Top up token balances on an anvil fork from whales. ``targets`` is a list of
+    ``(token_address, amount, whale)``, and each balance below ``amount`` is
+    topped up to it. The balances and whale nonces are read in one batch, and
+    the transfers are sent back to back and confirmed together.
+    """
+    address = address or snx.address
+    if len(targets) == 0:
+        return []
+
+    metadata = get_tokens_metadata(snx, [token for token, _, _ in targets])
+    erc20_abi = snx.contracts["common"]["ERC20"]["abi"]
+    tokens = {
+        token: snx.web3.eth.contract(address=token, abi=erc20_abi)
+        for token, _, _ in targets
+    }
+    with batch_reads(snx) as batch:
+        balances = [
+            batch.call(tokens[token].functions.balanceOf(address))
+            for token, _, _ in targets
+        ]
+        nonces = {whale: batch.transaction_count(whale) for _, _, whale in targets}
+
+    transfers = []
+    for (token, amount, whale), balance in zip(targets, balances):
+        target = int(amount * 10 ** metadata[token]["decimals"])
+        if balance.result() < target:
+            transfers.append((token, whale, target - balance.result()))
+    if len(transfers) == 0:
+        return []
+
+    # whales pay for their own transfers
+    whales = sorted({whale for _, whale, _ in transfers})
+    for whale in whales:
+        snx.web3.provider.make_request("anvil_impersonateAccount", [whale])
+    set_eth_balances(snx, whales, WHALE_ETH_BALANCE)
+
+    nonces = {whale: nonces[whale].result() for whale in whales}
+    tx_hashes = []
+    for token, whale, transfer_amount in transfers:
+        tx_params = (
+            tokens[token]
+            .functions.transfer(address, transfer_amount)
+            .build_transaction({"from": whale, "nonce": nonces[whale]})
+        )
+        nonces[whale] += 1
+        # send the transaction directly without signing
+        tx_hashes.append(snx.web3.eth.send_transaction(tx_params))
+
+    receipts = [snx.wait(tx_hash) for tx_hash in tx_hashes]
+    failed = [
+        metadata[token]["symbol"]
+        for (token, _, _), receipt in zip(transfers, receipts)
+        if receipt["status"] != 1
+    ]
+    if len(failed) > 0:
+        raise Exception(f"Token transfers failed for {failed}")
+
+    snx.logger.info(
+        f"Topped up {', '.join(metadata[token]['symbol'] for token, _, _ in transfers)}"
+    )
+    return receipts
+
+
+def resolve_asset_needs(config, path, assets, dependencies={}):
+    """
+    Get the assets the selected tests in the directory of ``path`` need, with the
+    assets they depend on, e.g. sUSD minted with USDC. Every asset is funded when
+    the needs weren't collected, or with ``--fund-all``.
+    """
+    asset_needs = getattr(config, "asset_needs", None)
+    if asset_needs is None:
+        return set(assets)
+
+    needs = asset_needs.get(os.path.dirname(os.path.abspath(path)), set())
+    unknown = set(needs) - set(assets)
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown assets {sorted(unknown)}, expected {assets}")
+
+    resolved = set()
+    pending = list(needs)
+    while len(pending) > 0:
+        asset = pending.pop()
+        if asset not in resolved:
+            resolved.add(asset)
+            pending.extend(dependencies.get(asset, []))
+    return resolved
@@ -0,0 +1,193 @@
+import functools
+import rlp
+import statistics
+from web3 import Web3
+
+# constants
+OP_STACK_CHAINS = [10, 8453, 84532, 11155420]
+ARBITRUM_CHAINS = [42161, 421614]
+OP_GAS_PRICE_ORACLE = "0x420000000000000000000000000000000000000F"
+ARB_GAS_INFO = "0x000000000000000000000000000000000000006C"
+
+# rough size of the signature and other fields added to the calldata of a tx
+TX_OVERHEAD_BYTES = 140
+
+OP_GAS_PRICE_ORACLE_ABI = [
+    {
+        "name": name,
+        "type": "function",
+        "stateMutability": "view",
+        "inputs": [{"name": "_data", "type": "bytes"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+    }
+    for name in ("getL1Fee", "getL1GasUsed")
+]
+ARB_GAS_INFO_ABI = [
+    {
+        "name": "getL1BaseFeeEstimate",
+        "type": "function",
+        "stateMutability": "view",
+        "inputs": [],
+        "outputs": [{"name": "", "type": "uint256"}],
+    }
+]
+
+# sdk methods that submit transactions, by module
+TRACKED_OPERATIONS = {
+    "core": ["deposit", "delegate_collateral", "mint_usd"],
+    "spot": ["wrap", "atomic_order"],
+    "perps": ["modify_collateral", "commit_order", "settle_order", "liquidate"],
+}
+GAS_METRICS = ["l2_gas", "l1_gas"]
+
+
+def _to_hex(value):
+    return Web3.to_hex(hexstr=value) if isinstance(value, str) else Web3.to_hex(value)
+
+
+def _calldata_gas(data):
+    return sum(16 if byte else 4 for byte in data)
+
+
+def _to_int(value):
+    return int(value, 0) if isinstance(value, str) else value
+
+
+def _serialize_unsigned(tx):
+    """RLP encode a transaction without its signature, for the L1 fee oracle"""
+    to = bytes.fromhex(tx["to"][2:]) if tx.get("to") else b""
+    data = bytes(tx["input"])
+    if "maxFeePerGas" in tx:
+        fields = [
+            tx["chainId"],
+            tx["nonce"],
+            tx["maxPriorityFeePerGas"],
+            tx["maxFeePerGas"],
+            tx["gas"],
+            to,
+            tx["value"],
+            data,
+            [],
+        ]
+        return bytes([2]) + rlp.encode(fields)
+
+    fields = [tx["nonce"], tx["gasPrice"], tx["gas"], to, tx["value"], data]
+    return rlp.encode(fields + [tx.get("chainId", 0), 0, 0])
+
+
+def get_l1_costs(snx, tx, receipt):
+    """
+    Get the L1 data gas and fee for an L2 transaction. Values reported by the node
+    are used when available, otherwise they are estimated from the L1 fee oracles
+    at the block of the transaction.
+    """
+    block = receipt["blockNumber"]
+    if "l1Fee" in receipt:
+        return _to_int(receipt.get("l1GasUsed", 0)), _to_int(receipt["l1Fee"])
+    if "gasUsedForL1" in receipt:
+        l1_gas = _to_int(receipt["gasUsedForL1"])
+        return l1_gas, l1_gas * receipt["effectiveGasPrice"]
+
+    if snx.network_id in OP_STACK_CHAINS:
+        oracle = snx.web3.eth.contract(
+            address=OP_GAS_PRICE_ORACLE, abi=OP_GAS_PRICE_ORACLE_ABI
+        )
+        data = _serialize_unsigned(tx)
+        return (
+            oracle.functions.getL1GasUsed(data).call(block_identifier=block),
+            oracle.functions.getL1Fee(data).call(block_identifier=block),
+        )
+
+    if snx.network_id in ARBITRUM_CHAINS:
+        l1_gas = _calldata_gas(bytes(tx["input"])) + TX_OVERHEAD_BYTES * 16
+        gas_info = snx.web3.eth.contract(address=ARB_GAS_INFO, abi=ARB_GAS_INFO_ABI)
+        try:
+            l1_base_fee = gas_info.functions.getL1BaseFeeEstimate().call(
+                block_identifier=block
+            )
+        except Exception as e:
+            snx.logger.debug(f"Failed to fetch the L1 base fee: {e}")
+            return l1_gas, None
+        return l1_gas, l1_gas * l1_base_fee
+
+    # transactions on L1 don't pay a separate data fee
+    return 0, 0
+
+
+def get_gas_usage(snx, tx_hash):
+    """Get the L2 gas used, and the L1 data gas and fee for a transaction"""
+    tx = snx.web3.eth.get_transaction(tx_hash)
+    receipt = snx.web3.eth.get_transaction_receipt(tx_hash)
+    l1_gas, l1_fee = get_l1_costs(snx, tx, receipt)
+    return {"l2_gas": receipt["gasUsed"], "l1_gas": l1_gas, "l1_fee": l1_fee}
+
+
+def track_gas(snx, on_record, operations=TRACKED_OPERATIONS):
+    """
+    Record the gas used by SDK operations. Transactions submitted by the tracked
+    methods are recorded with ``on_record(operation, gas_usage)`` when they are
+    passed to ``snx.wait`` and succeed.
+    """
+    pending = {}
+
+    def wrap_operation(method, operation):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if kwargs.get("submit") and isinstance(result, (str, bytes)):
+                pending[_to_hex(result)] = operation
+            return result
+
+        return wrapper
+
+    for module_name, method_names in operations.items():
+        module = getattr(snx, module_name, None)
+        for method_name in method_names:
+            method = getattr(module, method_name, None)
+            if method is not None:
+                operation = f"{module_name}.{method_name}"
+                setattr(module, method_name, wrap_operation(method, operation))
+
+    original_wait = snx.wait
+
+    def wait(tx_hash, *args, **kwargs):
+        receipt = original_wait(tx_hash, *args, **kwargs)
+        operation = pending.pop(_to_hex(tx_hash), None)
+        if operation is not None and receipt["status"] == 1:
+            on_record(operation, get_gas_usage(snx, tx_hash))
+        return receipt
+
+    snx.wait = wait
+    return snx
+
+
+def summarize_gas(samples):
+    """Take the median of each metric for a list of gas usage samples"""
+    summary = {"samples": len(samples)}
+    for metric in GAS_METRICS + ["l1_fee"]:
+        values = [sample[metric] for sample in samples if sample[metric] is not None]
+        summary[metric] = int(statistics.median(values)) if len(values) > 0 else None
+    return summary
+
+
+def compare_gas(results, baseline, threshold):
+    """
+    Compare gas summaries with a baseline, both keyed by network and operation.
+    Returns a list of ``(network, operation, metric, baseline, result)`` for
+    each metric that increased by more than ``threshold``.
+    """
+    regressions = []
+    for network, operations in results.items():
+        for operation, summary in operations.items():
+            expected = baseline.get(network, {}).get(operation)
+            if expected is None:
+                continue
+
+            for metric in GAS_METRICS:
+                if not expected.get(metric) or summary[metric] is None:
+                    continue
+                if summary[metric] > expected[metric] * (1 + threshold):
+                    regressions.append(
+                        (network, operation, metric, expected[metric], summary[metric])
+                    )
+    return regressions
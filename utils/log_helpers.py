@@ -0,0 +1,297 @@
+from collections import namedtuple
+from functools import lru_cache
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_utils import function_signature_to_4byte_selector, keccak, to_checksum_address
+from web3._utils.abi import collapse_if_tuple
+
+# constants
+ZERO_WORD = bytes(32)
+BUILTIN_ERRORS = [
+    {
+        "type": "error",
+        "name": "Error",
+        "inputs": [{"name": "message", "type": "string"}],
+    },
+    {"type": "error", "name": "Panic", "inputs": [{"name": "code", "type": "uint256"}]},
+]
+
+# a decoded log, with the same fields as web3's event data plus the contract name
+DecodedLog = namedtuple(
+    "DecodedLog",
+    [
+        "event",
+        "args",
+        "contract",
+        "address",
+        "blockNumber",
+        "transactionHash",
+        "transactionIndex",
+        "logIndex",
+    ],
+)
+DecodedError = namedtuple("DecodedError", ["error", "args", "contract"])
+
+# a precomputed event or error, with decoders for its topics and data
+_Entry = namedtuple(
+    "_Entry",
+    ["name", "contract", "topic_names", "topic_decoders", "data_decoder"],
+)
+
+
+@lru_cache(maxsize=None)
+def _checksum(address):
+    return to_checksum_address(address)
+
+
+def _to_bytes(value):
+    """Convert a hex string, from a raw RPC response, or ``HexBytes`` to bytes"""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return value
+
+
+def _word_decoder(abi_type):
+    """
+    Get a function that decodes a 32 byte word of a static type, or None if the
+    type needs the ABI decoder. Most events only have values like these, and
+    slicing the words directly is much faster than a decoder stream.
+    """
+    # arrays are encoded out of place, or as a hash when indexed
+    if abi_type.endswith("]"):
+        return None
+    if abi_type == "address":
+        return lambda word: _checksum("0x" + word[12:].hex())
+    if abi_type == "bool":
+        return lambda word: word != ZERO_WORD
+    if abi_type.startswith("uint"):
+        return lambda word: int.from_bytes(word, "big")
+    if abi_type.startswith("int"):
+        return lambda word: int.from_bytes(word, "big", signed=True)
+    if abi_type.startswith("bytes") and abi_type != "bytes":
+        size = int(abi_type[len("bytes") :])
+        return lambda word: word[:size]
+    return None
+
+
+def _normalizer(abi_input):
+    """
+    Get a function that converts a decoded value the way web3 does, checksumming
+    addresses and naming struct fields, or None if the value is kept as is
+    """
+    abi_type = abi_input["type"]
+    if abi_type.endswith("]"):
+        inner = _normalizer({**abi_input, "type": abi_type[: abi_type.rindex("[")]})
+        if inner is None:
+            return None
+        return lambda values: [inner(value) for value in values]
+
+    if abi_type == "address":
+        return _checksum
+
+    if abi_type == "tuple":
+        names = [component["name"] for component in abi_input["components"]]
+        normalizers = [_normalizer(component) for component in abi_input["components"]]
+        return lambda values: {
+            name: value if normalize is None else normalize(value)
+            for name, normalize, value in zip(names, normalizers, values)
+        }
+    return None
+
+
+def iter_abis(contracts, path=()):
+    """Iterate over the contract name, address and ABI of each contract definition"""
+    for key, value in contracts.items():
+        if not isinstance(value, dict):
+            continue
+        if isinstance(value.get("abi"), list):
+            yield ".".join(path + (key,)), value.get("address"), value["abi"]
+        else:
+            yield from iter_abis(value, path + (key,))
+
+
+class LogDecoder:
+    """
+    Decodes logs and revert data from any contract in ``snx.contracts``. Every
+    event and error signature is indexed by topic and selector when the decoder
+    is created, and the ABI decoder for each one is built up front, so logs can
+    be decoded in bulk without knowing which event or contract emitted them.
+    """
+
+    def __init__(self, contracts, codec):
+        self.codec = codec
+        self.events = {}
+        self.errors = {}
+        self.address_events = {}
+        self.contract_names = {}
+
+        for contract, address, abi in iter_abis(contracts):
+            events = {}
+            for item in abi:
+                if item.get("type") == "event" and not item.get("anonymous"):
+                    key, entry = self._event_entry(contract, item)
+                    events[key] = entry
+                    self.events.setdefault(key, entry)
+                elif item.get("type") == "error":
+                    selector, entry = self._error_entry(contract, item)
+                    self.errors.setdefault(selector, entry)
+
+            # prefer the names of the contract's own ABI when the address is known
+            if address:
+                address = address.lower()
+                self.address_events.setdefault(address, {}).update(events)
+                self.contract_names.setdefault(address, contract)
+
+        for item in BUILTIN_ERRORS:
+            selector, entry = self._error_entry(None, item)
+            self.errors.setdefault(selector, entry)
+
+    def _decoder(self, abi_inputs):
+        """Build a function that decodes ABI encoded values into a dict of arguments"""
+        types = [collapse_if_tuple(abi_input) for abi_input in abi_inputs]
+        names = [abi_input["name"] for abi_input in abi_inputs]
+
+        word_decoders = [_word_decoder(abi_type) for abi_type in types]
+        if all(decoder is not None for decoder in word_decoders):
+            words = [
+                (name, decoder, 32 * ind)
+                for ind, (name, decoder) in enumerate(zip(names, word_decoders))
+            ]
+            size = 32 * len(words)
+
+            def decode_words(data):
+                if len(data) < size:
+                    raise ValueError(f"Expected {size} bytes, got {len(data)}")
+                return {
+                    name: decode(data[ind : ind + 32]) for name, decode, ind in words
+                }
+
+            return decode_words
+
+        decoder = self.codec._registry.get_tuple_decoder(*types, strict=False)
+        normalizers = [_normalizer(abi_input) for abi_input in abi_inputs]
+
+        def decode_stream(data):
+            values = decoder(ContextFramesBytesIO(data))
+            return {
+                name: value if normalize is None else normalize(value)
+                for name, normalize, value in zip(names, normalizers, values)
+            }
+
+        return decode_stream
+
+    def _event_entry(self, contract, abi):
+        types = ",".join(collapse_if_tuple(abi_input) for abi_input in abi["inputs"])
+        topic = keccak(text=f"{abi['name']}({types})")
+
+        indexed = [abi_input for abi_input in abi["inputs"] if abi_input["indexed"]]
+        topic_decoders = []
+        for abi_input in indexed:
+            # indexed strings, bytes, arrays and structs are stored as a hash
+            abi_type = collapse_if_tuple(abi_input)
+            topic_decoders.append(_word_decoder(abi_type))
+
+        data_decoder = self._decoder(
+            [abi_input for abi_input in abi["inputs"] if not abi_input["indexed"]]
+        )
+        entry = _Entry(
+            abi["name"],
+            contract,
+            [abi_input["name"] for abi_input in indexed],
+            topic_decoders,
+            data_decoder,
+        )
+        # the same signature can have a different number of indexed arguments
+        return (topic, len(indexed) + 1), entry
+
+    def _error_entry(self, contract, abi):
+        types = ",".join(collapse_if_tuple(abi_input) for abi_input in abi["inputs"])
+        selector = function_signature_to_4byte_selector(f"{abi['name']}({types})")
+        decoder = self._decoder(abi["inputs"])
+        return selector, _Entry(abi["name"], contract, None, None, decoder)
+
+    def _lookup(self, log):
+        topics = log["topics"]
+        if len(topics) == 0:
+            return None
+
+        key = (_to_bytes(topics[0]), len(topics))
+        entry = self.address_events.get(log["address"].lower(), {}).get(key)
+        return entry if entry is not None else self.events.get(key)
+
+    def get_event(self, log):
+        """Get the name of a log's event, or None if it's unknown"""
+        entry = self._lookup(log)
+        return None if entry is None else entry.name
+
+    def _decode_log(self, entry, log):
+        args = {}
+        for name, decoder, topic in zip(
+            entry.topic_names, entry.topic_decoders, log["topics"][1:]
+        ):
+            topic = _to_bytes(topic)
+            args[name] = topic if decoder is None else decoder(topic)
+        args.update(entry.data_decoder(_to_bytes(log["data"])))
+
+        address = log["address"].lower()
+        return DecodedLog(
+            entry.name,
+            args,
+            self.contract_names.get(address, entry.contract),
+            _checksum(address),
+            _to_int(log.get("blockNumber")),
+            log.get("transactionHash"),
+            _to_int(log.get("transactionIndex")),
+            _to_int(log.get("logIndex")),
+        )
+
+    def decode_log(self, log):
+        """Decode a log, returning None if its event isn't indexed"""
+        entry = self._lookup(log)
+        return None if entry is None else self._decode_log(entry, log)
+
+    def decode_logs(self, logs, event=None):
+        """
+        Decode a batch of logs, skipping logs of unknown events. Pass an event name
+        to only decode logs of that event.
+        """
+        decoded = []
+        for log in logs:
+            entry = self._lookup(log)
+            if entry is not None and (event is None or entry.name == event):
+                decoded.append(self._decode_log(entry, log))
+        return decoded
+
+    def decode_receipt(self, receipt, event=None):
+        """Decode the logs of a transaction receipt"""
+        return self.decode_logs(receipt["logs"], event)
+
+    def decode_error(self, data):
+        """Decode revert data into a custom error, or None if it's unknown"""
+        data = _to_bytes(data)
+        entry = self.errors.get(data[:4])
+        if entry is None:
+            return None
+        try:
+            args = entry.data_decoder(data[4:])
+        except Exception:
+            return None
+        return DecodedError(entry.name, args, entry.contract)
+
+
+def get_log_decoder(snx):
+    """
+    Get the log decoder for a client, building the index on first use. The decoder
+    covers the contracts loaded when it is built, so reset it with
+    ``snx.__dict__.pop("log_decoder")`` after loading more contracts.
+    """
+    decoder = snx.__dict__.get("log_decoder")
+    if decoder is None:
+        decoder = LogDecoder(snx.contracts, snx.web3.codec)
+        snx.__dict__["log_decoder"] = decoder
+    return decoder
@@ -0,0 +1,357 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# constants
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIMULATION_METHODS = ["eth_call", "eth_estimateGas"]
+MIDDLEWARE_NAME = "rpc_metrics"
+
+# phases of an ERC-7412 loop, tracked per thread
+PHASE_DEFAULT = "default"
+PHASE_ERC7412_ORACLE = "erc7412_oracle"
+PHASE_ERC7412_RETRY = "erc7412_retry"
+# reads sent by utils.batch_helpers, around the middleware
+PHASE_BATCH = "batch"
+
+_erc7412_state = threading.local()
+_erc7412_metrics = []
+_patch_lock = threading.Lock()
+_patched = False
+_exporting = False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_string(labels):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class RpcMetrics:
+    """Thread-safe JSON-RPC request metrics, rendered in Prometheus text format"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.enabled = True
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.errors = {}
+            self.latency = {}
+            self.request_bytes = {}
+            self.response_bytes = {}
+            self.erc7412_errors = 0
+
+    def observe(
+        self, labels, method, phase, seconds, request_size, response_size, error
+    ):
+        key = labels + (("method", method),)
+        with self._lock:
+            request_key = key + (("phase", phase),)
+            self.requests[request_key] = self.requests.get(request_key, 0) + 1
+
+            counts, total, count = self.latency.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for index, bucket in enumerate(self.buckets):
+                if seconds <= bucket:
+                    counts[index] += 1
+            self.latency[key] = (counts, total + seconds, count + 1)
+
+            self.request_bytes[key] = self.request_bytes.get(key, 0) + request_size
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + response_size
+            if error is not None:
+                error_key = key + (("code", error),)
+                self.errors[error_key] = self.errors.get(error_key, 0) + 1
+
+    def observe_erc7412_error(self):
+        with self._lock:
+            self.erc7412_errors += 1
+
+    def render(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = []
+
+            def counter(name, help_text, values):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(values.items()):
+                    lines.append(f"{name}{_label_string(labels)} {value}")
+
+            counter(
+                "snx_rpc_requests_total",
+                "JSON-RPC requests by method and phase",
+                self.requests,
+            )
+            counter(
+                "snx_rpc_errors_total",
+                "JSON-RPC requests that failed, by error code",
+                self.errors,
+            )
+            counter(
+                "snx_rpc_request_bytes_total",
+                "Size of JSON-RPC request params",
+                self.request_bytes,
+            )
+            counter(
+                "snx_rpc_response_bytes_total",
+                "Size of JSON-RPC responses",
+                self.response_bytes,
+            )
+            counter(
+                "snx_erc7412_errors_handled_total",
+                "ERC-7412 errors that required oracle data and a retry",
+                {(): self.erc7412_errors},
+            )
+
+            name = "snx_rpc_request_duration_seconds"
+            lines.append(f"# HELP {name} JSON-RPC request latency")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (counts, total, count) in sorted(self.latency.items()):
+                for bucket, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = labels + (("le", repr(float(bucket))),)
+                    lines.append(
+                        f"{name}_bucket{_label_string(bucket_labels)} {bucket_count}"
+                    )
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_label_string(inf_labels)} {count}")
+                lines.append(f"{name}_sum{_label_string(labels)} {total}")
+                lines.append(f"{name}_count{_label_string(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to a file, e.g. for the node exporter textfile collector"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """Serve the metrics over HTTP from a background thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# metrics shared by every instrumented client in the process
+rpc_metrics = RpcMetrics()
+
+
+def _current_phase(method):
+    """Label simulations that belong to an ERC-7412 loop"""
+    if getattr(_erc7412_state, "handling", False):
+        return PHASE_ERC7412_ORACLE
+    if method in SIMULATION_METHODS and getattr(_erc7412_state, "retry", False):
+        _erc7412_state.retry = False
+        return PHASE_ERC7412_RETRY
+    return PHASE_DEFAULT
+
+
+def _error_code(response):
+    error = response.get("error") if isinstance(response, dict) else None
+    if error is None:
+        return None
+    if isinstance(error, dict):
+        return str(error.get("code", "unknown"))
+    return "unknown"
+
+
+def _track_erc7412(handle_erc7412_error):
+    @functools.wraps(handle_erc7412_error)
+    def wrapper(snx, error):
+        _erc7412_state.handling = True
+        try:
+            oracle_calls = handle_erc7412_error(snx, error)
+        except Exception:
+            # not an oracle error, so the retry loop exits without a retry
+            _erc7412_state.retry = False
+            raise
+        finally:
+            _erc7412_state.handling = False
+
+        # updates fetched for a prefetch are sent with the first attempt, so
+        # there's no retry to label or count
+        if getattr(_erc7412_state, "prefetching", False):
+            return oracle_calls
+
+        # the next simulation in this thread retries with the oracle data
+        _erc7412_state.retry = True
+        for metrics in _erc7412_metrics:
+            if metrics.enabled:
+                metrics.observe_erc7412_error()
+        return oracle_calls
+
+    return wrapper
+
+
+def _track_prefetch(get_calls):
+    @functools.wraps(get_calls)
+    def wrapper(*args, **kwargs):
+        _erc7412_state.prefetching = True
+        try:
+            return get_calls(*args, **kwargs)
+        finally:
+            _erc7412_state.prefetching = False
+
+    return wrapper
+
+
+def _patch_erc7412(metrics):
+    """Track the ERC-7412 loops of the SDK and of utils.multicall_helpers"""
+    global _patched
+    with _patch_lock:
+        if metrics not in _erc7412_metrics:
+            _erc7412_metrics.append(metrics)
+        if _patched:
+            return
+
+        import synthetix.utils.multicall as sdk_multicall
+        import utils.multicall_helpers as multicall_helpers
+
+        handler = _track_erc7412(sdk_multicall.handle_erc7412_error)
+        sdk_multicall.handle_erc7412_error = handler
+        multicall_helpers.handle_erc7412_error = handler
+        OraclePrefetch = multicall_helpers.OraclePrefetch
+        OraclePrefetch.get_calls = _track_prefetch(OraclePrefetch.get_calls)
+        _patched = True
+
+
+def build_rpc_metrics_middleware(metrics=rpc_metrics, labels=None):
+    """Build a web3 middleware that records each request in ``metrics``"""
+    labels = tuple(sorted((labels or {}).items()))
+
+    def rpc_metrics_middleware(make_request, w3):
+        def middleware(method, params):
+            if not metrics.enabled:
+                return make_request(method, params)
+
+            phase = _current_phase(method)
+            start = time.perf_counter()
+            try:
+                response = make_request(method, params)
+            except Exception as e:
+                metrics.observe(
+                    labels,
+                    method,
+                    phase,
+                    time.perf_counter() - start,
+                    len(json.dumps(params, default=str)),
+                    0,
+                    type(e).__name__,
+                )
+                raise
+
+            metrics.observe(
+                labels,
+                method,
+                phase,
+                time.perf_counter() - start,
+                len(json.dumps(params, default=str)),
+                len(json.dumps(response, default=str)),
+                _error_code(response),
+            )
+            return response
+
+        return middleware
+
+    # for requests that are sent around the middleware, see observe_batch
+    rpc_metrics_middleware.metrics = metrics
+    rpc_metrics_middleware.labels = labels
+    return rpc_metrics_middleware
+
+
+def attach_rpc_metrics(snx, metrics=rpc_metrics, labels=None):
+    """
+    Record JSON-RPC metrics for a client, or a ``Web3`` instance. Requests are
+    labelled with the network id of a client, plus any extra ``labels``.
+    """
+    web3 = getattr(snx, "web3", snx)
+    labels = dict(labels or {})
+    if hasattr(snx, "network_id"):
+        labels.setdefault("network", snx.network_id)
+
+    if MIDDLEWARE_NAME not in web3.middleware_onion:
+        web3.middleware_onion.add(
+            build_rpc_metrics_middleware(metrics, labels), name=MIDDLEWARE_NAME
+        )
+    _patch_erc7412(metrics)
+    return metrics
+
+
+def observe_batch(web3, requests, responses, seconds):
+    """
+    Record requests that were sent around a ``Web3``'s middleware, like the
+    batches of ``utils.batch_helpers``, if metrics are attached to it. Each
+    request gets an equal share of the time the batch took.
+    """
+    if MIDDLEWARE_NAME not in web3.middleware_onion:
+        return
+    middleware = web3.middleware_onion[MIDDLEWARE_NAME]
+    if not middleware.metrics.enabled or len(requests) == 0:
+        return
+
+    for (method, params), response in zip(requests, responses):
+        middleware.metrics.observe(
+            middleware.labels,
+            method,
+            PHASE_BATCH,
+            seconds / len(requests),
+            len(json.dumps(params, default=str)),
+            len(json.dumps(response, default=str)),
+            _error_code(response),
+        )
+
+
+def detach_rpc_metrics(snx):
+    """Stop recording JSON-RPC metrics for a client"""
+    web3 = getattr(snx, "web3", snx)
+    if MIDDLEWARE_NAME in web3.middleware_onion:
+        web3.middleware_onion.remove(MIDDLEWARE_NAME)
+
+
+def enable_from_env(snx):
+    """
+    Attach metrics to a client when ``RPC_METRICS`` is set. The metrics are
+    written to ``RPC_METRICS_FILE`` on exit and served on ``RPC_METRICS_PORT``
+    when those are set.
+    """
+    global _exporting
+    if not os.getenv("RPC_METRICS"):
+        return None
+
+    attach_rpc_metrics(snx)
+    with _patch_lock:
+        if not _exporting:
+            _exporting = True
+            if os.getenv("RPC_METRICS_FILE"):
+                atexit.register(rpc_metrics.write, os.getenv("RPC_METRICS_FILE"))
+            if os.getenv("RPC_METRICS_PORT"):
+                rpc_metrics.serve(port=int(os.getenv("RPC_METRICS_PORT")))
+    return rpc_metrics
@@ -0,0 +1,166 @@
+from synthetix.utils.multicall import decode_result, handle_erc7412_error
+
+
+def _unwrap(result):
+    return result if len(result) > 1 else result[0]
+
+
+def _call_functions(calls):
+    return list(dict.fromkeys((contract.address, fn) for contract, fn, _ in calls))
+
+
+class OraclePrefetch:
+    """
+    Remembers the ERC-7412 errors raised by each contract function during a
+    scan, and prepends the oracle updates they need to later multicalls of the
+    same functions. The updates are fetched once per block, so large scans skip
+    the revert and retry round trips after the first chunk.
+    """
+
+    def __init__(self, snx):
+        self.snx = snx
+        self.errors = {}
+        self.block_number = None
+        self._calls = {}
+
+    def _at_block(self, block):
+        """Forget the fetched oracle updates when the block changes"""
+        block_number = block if isinstance(block, int) else None
+        if block_number is None:
+            block_number = self.snx.web3.eth.block_number
+        if block_number != self.block_number:
+            self.block_number = block_number
+            self._calls = {}
+
+    def learn(self, calls, error, oracle_calls, block="latest"):
+        """
+        Remember an ERC-7412 error raised by a multicall of ``calls``, and the
+        oracle update calls fetched for it
+        """
+        for key in _call_functions(calls):
+            errors = self.errors.setdefault(key, [])
+            known = [e for e in errors if str(e) == str(error)]
+            if len(known) > 0:
+                error = known[0]
+            else:
+                errors.append(error)
+
+        self._at_block(block)
+        self._calls[id(error)] = oracle_calls
+
+    def get_calls(self, calls, block="latest"):
+        """Get the oracle update calls needed by the functions in ``calls``"""
+        errors = []
+        for key in _call_functions(calls):
+            errors += [e for e in self.errors.get(key, []) if e not in errors]
+        if len(errors) == 0:
+            return []
+
+        self._at_block(block)
+        oracle_calls = []
+        for error in errors:
+            if id(error) not in self._calls:
+                self._calls[id(error)] = handle_erc7412_error(self.snx, error)
+            oracle_calls += self._calls[id(error)]
+        return oracle_calls
+
+
+def encode_calls(calls, require_success=False):
+    """Encode a list of ``(contract, function_name, args)`` for the multicall"""
+    return [
+        (contract.address, require_success, contract.encodeABI(fn_name=fn, args=args))
+        for contract, fn, args in calls
+    ]
+
+
+def aggregate_calls(
+    snx, calls, prepended_calls=[], block="latest", state_override=None
+):
+    """
+    Make a list of ``(contract, function_name, args)`` view calls in a single
+    multicall, after any prepended ``(target, require_success, value, data)``
+    calls such as oracle updates. Failed calls return ``None``.
+    """
+    if len(calls) == 0:
+        return []
+
+    if len(prepended_calls) == 0:
+        results = snx.multicall.functions.aggregate3(encode_calls(calls)).call(
+            block_identifier=block, state_override=state_override
+        )
+    else:
+        all_calls = list(prepended_calls) + [
+            (address, require_success, 0, data)
+            for address, require_success, data in encode_calls(calls)
+        ]
+        total_value = sum(call[2] for call in all_calls)
+        results = snx.multicall.functions.aggregate3Value(all_calls).call(
+            {"value": total_value},
+            block_identifier=block,
+            state_override=state_override,
+        )
+        results = results[-len(calls) :]
+
+    return [
+        _unwrap(decode_result(contract, fn, data)) if success else None
+        for (contract, fn, _), (success, data) in zip(calls, results)
+    ]
+
+
+def aggregate_calls_erc7412(
+    snx, calls, prepended_calls=[], block="latest", prefetch=None, state_override=None
+):
+    """
+    Make a list of ``(contract, function_name, args)`` view calls in a single
+    multicall, prepending oracle updates until none of the calls require them.
+    With an ``OraclePrefetch``, the updates learned from earlier multicalls are
+    prepended up front. ``state_override`` is passed to ``eth_call``.
+    """
+    if len(calls) == 0:
+        return []
+
+    # require success so oracle errors revert the multicall
+    these_calls = [(address, True, 0, data) for address, _, data in encode_calls(calls)]
+    oracle_calls = list(prepended_calls)
+    if prefetch is not None:
+        oracle_calls = prefetch.get_calls(calls, block) + oracle_calls
+    while True:
+        try:
+            all_calls = oracle_calls + these_calls
+            total_value = sum(call[2] for call in all_calls)
+            results = snx.multicall.functions.aggregate3Value(all_calls).call(
+                {"value": total_value},
+                block_identifier=block,
+                state_override=state_override,
+            )
+            break
+        except Exception as e:
+            snx.logger.debug(f"Multicall failed, decoding the error {e}")
+            new_oracle_calls = handle_erc7412_error(snx, e)
+            oracle_calls = new_oracle_calls + oracle_calls
+            if prefetch is not None:
+                prefetch.learn(calls, e, new_oracle_calls, block)
+
+    return [
+        _unwrap(decode_result(contract, fn, data))
+        for (contract, fn, _), (_, data) in zip(calls, results[-len(calls) :])
+    ]
+
+
+def multicall_erc7412(
+    snx, contract, function_name, args_list, calls=[], block="latest", prefetch=None
+):
+    """
+    Call one contract function with each of ``args_list`` in a single multicall,
+    like the SDK function of the same name, optionally with an ``OraclePrefetch``
+    """
+    args_list = [
+        args if isinstance(args, (list, tuple)) else (args,) for args in args_list
+    ]
+    return aggregate_calls_erc7412(
+        snx,
+        [(contract, function_name, args) for args in args_list],
+        prepended_calls=calls,
+        block=block,
+        prefetch=prefetch,
+    )
@@ -0,0 +1,55 @@
+from synthetix.utils.multicall import make_pyth_fulfillment_request
+
+# constants
+PYTH_UPDATE_TYPE_LATEST = 1
+HISTORICAL_PRICE_DELAY = 60
+HISTORICAL_STALENESS_TOLERANCE = 3600
+
+
+def get_historical_oracle_calls(
+    snx,
+    feed_ids,
+    timestamp,
+    price_delay=HISTORICAL_PRICE_DELAY,
+    staleness_tolerance=HISTORICAL_STALENESS_TOLERANCE,
+):
+    """
+    Build oracle update calls with Pyth benchmark prices published shortly before
+    ``timestamp``. Prepend them to a multicall pinned to a historical block so the
+    contracts read prices from that time instead of the future.
+    """
+    if len(feed_ids) == 0:
+        return []
+
+    pyth_data = snx.pyth.get_price_from_ids(
+        feed_ids, publish_time=timestamp - price_delay
+    )
+    to, data, value = make_pyth_fulfillment_request(
+        snx,
+        snx.contracts["pyth_erc7412_wrapper"]["PythERC7412Wrapper"]["address"],
+        PYTH_UPDATE_TYPE_LATEST,
+        feed_ids,
+        pyth_data["price_update_data"],
+        staleness_tolerance,
+        0,
+    )
+
+    # don't require success, the wrapper reverts if the price is already set
+    return [(to, False, value, data)]
+
+
+def update_pyth_prices(snx):
+    """Push the latest Pyth prices of every known feed to the Pyth contract"""
+    pyth_contract = snx.contracts["Pyth"]["contract"]
+    feed_ids = list(snx.pyth.price_feed_ids.values())
+    price_update_data = snx.pyth.get_price_from_ids(feed_ids)["price_update_data"]
+
+    tx_params = snx._get_tx_params(value=len(feed_ids))
+    tx_params = pyth_contract.functions.updatePriceFeeds(
+        price_update_data
+    ).build_transaction(tx_params)
+    receipt = snx.wait(snx.execute_transaction(tx_params))
+    if receipt["status"] != 1:
+        raise Exception("Price feed update failed")
+    snx.logger.info(f"Updated {len(feed_ids)} price feeds")
+    return receipt
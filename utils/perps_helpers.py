@@ -0,0 +1,129 @@
+import math
+from utils.fork_helpers import mine_web3_block
+
+# constants
+POSITION_SIZE_USD = 50
+
+# perps collaterals, with the token wrapped into the synth and its whale
+COLLATERALS = {
+    "sUSD": {"amount": 1000},
+    "sETH": {"token": "WETH", "amount": 0.5},
+    "stBTC": {
+        "token": "tBTC",
+        "amount": 0.01,
+        "whale": "0xa79a356B01ef805B3089b4FE67447b96c7e6DD4C",
+    },
+    "sUSDe": {
+        "token": "USDe",
+        "amount": 1000,
+        "whale": "0xb3C24D9dcCC2Ec5f778742389ffe448E295B84e0",
+    },
+    "swSOL": {
+        "token": "WSOL",
+        "amount": 5,
+        "whale": "0xD13A513f3d249E1558C176f93e24781f50772048",
+    },
+}
+
+
+def check_tx(snx, tx_hash, description):
+    """Wait for a transaction, and raise if it reverted"""
+    receipt = snx.wait(tx_hash)
+    if receipt["status"] != 1:
+        raise Exception(f"{description} failed: {tx_hash}")
+    return receipt
+
+
+def _settle(snx, account_id):
+    mine_web3_block(snx.web3, seconds=3)
+    check_tx(
+        snx,
+        snx.perps.settle_order(account_id=account_id, max_tx_tries=5, submit=True),
+        "Settle order",
+    )
+
+
+def _order(snx, account_id, market_name, size):
+    mine_web3_block(snx.web3)
+    check_tx(
+        snx,
+        snx.perps.commit_order(
+            size,
+            market_name=market_name,
+            account_id=account_id,
+            settlement_strategy_id=0,
+            submit=True,
+        ),
+        "Commit order",
+    )
+    _settle(snx, account_id)
+    return snx.perps.get_open_position(market_name=market_name, account_id=account_id)
+
+
+def _deposit(snx, account_id, collateral_name):
+    check_tx(
+        snx,
+        snx.perps.modify_collateral(
+            COLLATERALS[collateral_name]["amount"],
+            market_name=collateral_name,
+            account_id=account_id,
+            submit=True,
+        ),
+        "Deposit collateral",
+    )
+
+
+def _withdraw_all(snx, account_id):
+    """Repay any debt and withdraw every collateral"""
+    margin_info = snx.perps.get_margin_info(account_id)
+    if margin_info.get("debt", 0) > 0:
+        mine_web3_block(snx.web3)
+        check_tx(
+            snx, snx.perps.pay_debt(account_id=account_id, submit=True), "Pay debt"
+        )
+        margin_info = snx.perps.get_margin_info(account_id)
+
+    mine_web3_block(snx.web3)
+    for collateral_id, amount in margin_info["collateral_balances"].items():
+        if amount > 0:
+            check_tx(
+                snx,
+                snx.perps.modify_collateral(
+                    -math.floor(amount * 1e8) / 1e8,
+                    market_id=collateral_id,
+                    account_id=account_id,
+                    submit=True,
+                ),
+                "Withdraw collateral",
+            )
+
+
+def round_trip(snx, account_id, market_name, collateral_name):
+    """Deposit collateral, open and close a long, then withdraw"""
+    _deposit(snx, account_id, collateral_name)
+    index_price = snx.perps.markets_by_name[market_name]["index_price"]
+    size = POSITION_SIZE_USD / index_price
+
+    position = _order(snx, account_id, market_name, size)
+    assert round(position["position_size"], 12) == round(size, 12)
+    position = _order(snx, account_id, market_name, -position["position_size"])
+    assert position["position_size"] == 0
+    _withdraw_all(snx, account_id)
+
+
+def flip(snx, account_id, market_name, collateral_name):
+    """Deposit collateral, open a long, flip it to a short, close it and withdraw"""
+    _deposit(snx, account_id, collateral_name)
+    index_price = snx.perps.markets_by_name[market_name]["index_price"]
+    size = POSITION_SIZE_USD / index_price
+
+    position = _order(snx, account_id, market_name, size)
+    position = _order(snx, account_id, market_name, -2 * position["position_size"])
+    assert round(position["position_size"], 12) == round(-size, 12)
+    position = _order(snx, account_id, market_name, -position["position_size"])
+    assert position["position_size"] == 0
+    _withdraw_all(snx, account_id)
+
+
+# the flows run by the fork tests and by scripts/perps_matrix.py
+FLOWS = {"round_trip": round_trip, "flip": flip}
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import time
+import threading
+import linecache
+from collections import Counter
+from utils.cache_helpers import ROOT_DIR
+
+# constants
+SAMPLE_INTERVAL = 0.005
+MAX_DEPTH = 200
+PHASES = ["receipt", "rpc", "sleep", "cpu"]
+
+# frames that are waiting on a transaction or a node
+RECEIPT_FUNCTIONS = ["wait_for_transaction_receipt"]
+RECEIPT_FILES = ["receipt_helpers.py"]
+RPC_PATHS = [
+    "web3/providers/",
+    "web3/_utils/request.py",
+    "requests/",
+    "urllib3/",
+    "http/client.py",
+    "socket.py",
+    "ssl.py",
+    "websockets/",
+    "utils/provider_helpers.py",
+]
+SLEEP_CALL = re.compile(r"\bsleep\(")
+
+# leading frames of the test runner, which are the same in every sample
+RUNNER_PATHS = ["runpy", "_pytest/", "pluggy/", "pytest/", "click/", "ape/", "ape_"]
+
+
+def _short_path(filename):
+    """Shorten a path to its package, or its path in the repository"""
+    for marker in ("site-packages/", "dist-packages/"):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    if filename.startswith(ROOT_DIR):
+        return os.path.relpath(filename, ROOT_DIR)
+    return os.path.basename(filename)
+
+
+class Profile:
+    """Sampled stacks of one thread, grouped by phase"""
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.samples = Counter()
+        self.duration = 0
+
+    @property
+    def total(self):
+        return sum(self.samples.values())
+
+    def phases(self):
+        """Estimated seconds spent in each phase"""
+        counts = Counter()
+        for (phase, _), count in self.samples.items():
+            counts[phase] += count
+        total = max(self.total, 1)
+        return {phase: self.duration * counts[phase] / total for phase in PHASES}
+
+    def folded(self):
+        """
+        Stacks in the folded format read by flamegraph.pl, inferno and speedscope,
+        with the phase as the root frame
+        """
+        return [
+            f"{';'.join((phase,) + stack)} {count}"
+            for (phase, stack), count in sorted(self.samples.items())
+        ]
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            file.write("\n".join(self.folded()) + "\n")
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread on an interval from a background thread. Each
+    sample is tagged with what the thread was doing: waiting for a receipt, waiting
+    on an RPC request, sleeping, or running Python code. Nothing is installed in
+    the profiled thread, so it runs at full speed between samples.
+    """
+
+    def __init__(
+        self, name, interval=SAMPLE_INTERVAL, thread_id=None, trim=RUNNER_PATHS
+    ):
+        self.profile = Profile(name, interval)
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.trim = trim
+        self._labels = {}
+        self._kinds = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({_short_path(code.co_filename)})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _kind(self, code):
+        """Whether a function waits on a receipt or an RPC request"""
+        kind = self._kinds.get(code, False)
+        if kind is False:
+            filename = code.co_filename.replace(os.sep, "/")
+            kind = None
+            if code.co_name in RECEIPT_FUNCTIONS or any(
+                filename.endswith(name) for name in RECEIPT_FILES
+            ):
+                kind = "receipt"
+            elif any(path in filename for path in RPC_PATHS):
+                kind = "rpc"
+            self._kinds[code] = kind
+        return kind
+
+    def _is_runner(self, code):
+        filename = code.co_filename.replace(os.sep, "/")
+        return any(path in filename for path in self.trim)
+
+    def _phase(self, frames):
+        kinds = {self._kind(frame.f_code) for frame in frames}
+        if "receipt" in kinds:
+            return "receipt"
+        if "rpc" in kinds:
+            return "rpc"
+
+        # sleeps are C calls, so check the line the leaf frame is on
+        leaf = frames[0]
+        line = linecache.getline(leaf.f_code.co_filename, leaf.f_lineno)
+        return "sleep" if SLEEP_CALL.search(line) else "cpu"
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        frames = []
+        while frame is not None and len(frames) < MAX_DEPTH:
+            frames.append(frame)
+            frame = frame.f_back
+        if len(frames) == 0:
+            return
+
+        # drop the runner frames that lead up to the profiled code
+        frames.reverse()
+        start = 0
+        while start < len(frames) - 1 and self._is_runner(frames[start].f_code):
+            start += 1
+        stack = tuple(self._label(frame.f_code) for frame in frames[start:])
+        frames.reverse()
+        self.profile.samples[(self._phase(frames), stack)] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                # the profiled thread can exit or change under the sampler
+                pass
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="sampling-profiler"
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.profile.duration = time.perf_counter() - self._start
+        return self.profile
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def profile_file(directory, name):
+    """Get the path of the folded stacks for a test or fixture"""
+    return os.path.join(
+        directory, re.sub(r"[^\w.-]+", "_", name).strip("_") + ".folded"
+    )
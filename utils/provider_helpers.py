@@ -0,0 +1,375 @@
+import json
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from web3 import HTTPProvider, IPCProvider
+from web3.providers.base import JSONBaseProvider
+
+# constants
+HEDGE_AFTER = 0.5
+BACKOFF = 1
+MAX_BACKOFF = 60
+LATENCY_DECAY = 0.3
+IPC_TIMEOUT = 120
+IPC_RECV_SIZE = 1 << 20
+
+# requests that go to the same endpoint, so nonces and fork state stay consistent
+STICKY_METHODS = [
+    "eth_sendRawTransaction",
+    "eth_sendTransaction",
+    "eth_getTransactionCount",
+    "eth_sign",
+    "eth_signTransaction",
+    "eth_signTypedData_v4",
+]
+STICKY_PREFIXES = ["anvil_", "evm_", "hardhat_", "personal_"]
+WRITE_METHODS = ["eth_sendRawTransaction", "eth_sendTransaction"]
+# lookups of a sent transaction go to the endpoint that accepted it
+TX_METHODS = ["eth_getTransactionReceipt", "eth_getTransactionByHash"]
+# reads of the latest state that should see the client's own writes, and the
+# index of their block parameter
+STATE_METHODS = {
+    "eth_call": 1,
+    "eth_estimateGas": 1,
+    "eth_getBalance": 1,
+    "eth_getCode": 1,
+    "eth_getStorageAt": 2,
+}
+LATEST_BLOCKS = [None, "latest", "pending"]
+MAX_SENT_TXS = 10000
+
+# error codes and messages of providers that are rate limiting or unavailable
+UNHEALTHY_CODES = [-32005, -32098, -32099, 429, 503]
+UNHEALTHY_MESSAGES = ["rate limit", "too many requests", "exceeded", "unavailable"]
+
+
+def split_rpcs(provider_rpc):
+    """Split a comma separated list of RPC endpoints"""
+    return [rpc.strip() for rpc in provider_rpc.split(",") if rpc.strip()]
+
+
+def is_sticky(method):
+    return method in STICKY_METHODS or any(
+        method.startswith(prefix) for prefix in STICKY_PREFIXES
+    )
+
+
+def _unhealthy_error(response):
+    """Get the error of a response that should be retried on another endpoint"""
+    error = response.get("error") if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return None
+
+    message = str(error.get("message", "")).lower()
+    if error.get("code") in UNHEALTHY_CODES or any(
+        text in message for text in UNHEALTHY_MESSAGES
+    ):
+        return Exception(f"RPC error {error.get('code')}: {error.get('message')}")
+    return None
+
+
+class Endpoint:
+    """An RPC endpoint with its latency and health"""
+
+    def __init__(self, uri, request_kwargs=None):
+        self.uri = uri
+        self.provider = HTTPProvider(uri, request_kwargs=request_kwargs)
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0
+        self._lock = threading.Lock()
+
+    def is_healthy(self, now=None):
+        return (now or time.monotonic()) >= self.quarantined_until
+
+    def record_success(self, seconds):
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.quarantined_until = 0
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_DECAY * (seconds - self.latency)
+
+    def record_failure(self, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            quarantine = min(
+                backoff * 2 ** (self.consecutive_failures - 1), max_backoff
+            )
+            self.quarantined_until = time.monotonic() + quarantine
+            return quarantine
+
+    def stats(self):
+        return {
+            "uri": self.uri,
+            "latency": self.latency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "healthy": self.is_healthy(),
+        }
+
+
+class HedgedProvider(JSONBaseProvider):
+    """
+    A web3 provider that spreads requests over several RPC endpoints. Reads go to
+    the fastest healthy endpoint, and a duplicate is sent to the next fastest if
+    there's no response after ``hedge_after`` seconds. Endpoints that fail or rate
+    limit are quarantined, with exponential backoff. Transactions, nonces and
+    anvil methods stick to one endpoint. Receipts and lookups of a sent
+    transaction go to the endpoint that accepted it, and after the first write,
+    calls at the latest block go to the endpoint that transactions are sent to.
+    """
+
+    logger = logging.getLogger("utils.provider_helpers.HedgedProvider")
+
+    def __init__(
+        self,
+        endpoint_uris,
+        hedge_after=HEDGE_AFTER,
+        backoff=BACKOFF,
+        max_backoff=MAX_BACKOFF,
+        request_kwargs=None,
+    ):
+        super().__init__()
+        if len(endpoint_uris) == 0:
+            raise ValueError("At least one RPC endpoint is required")
+
+        self.endpoints = [Endpoint(uri, request_kwargs) for uri in endpoint_uris]
+        self.hedge_after = hedge_after
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sticky_endpoint = None
+        self.has_written = False
+        self.sent = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * len(self.endpoints), thread_name_prefix="hedged-rpc"
+        )
+
+    def __repr__(self):
+        uris = ", ".join(endpoint.uri for endpoint in self.endpoints)
+        return f"<HedgedProvider [{uris}]>"
+
+    def ranked_endpoints(self):
+        """
+        Healthy endpoints from fastest to slowest, and quarantined endpoints from
+        the first to leave quarantine
+        """
+        now = time.monotonic()
+        healthy = [e for e in self.endpoints if e.is_healthy(now)]
+        # endpoints without a measurement are tried after the measured ones
+        healthy.sort(key=lambda e: (e.latency is None, e.latency or 0))
+        quarantined = sorted(
+            [e for e in self.endpoints if not e.is_healthy(now)],
+            key=lambda e: e.quarantined_until,
+        )
+        return healthy, quarantined
+
+    def _request(self, endpoint, method, params):
+        start = time.perf_counter()
+        try:
+            response = endpoint.provider.make_request(method, params)
+            error = _unhealthy_error(response)
+            if error is not None:
+                raise error
+        except Exception as e:
+            quarantine = endpoint.record_failure(self.backoff, self.max_backoff)
+            self.logger.warning(
+                f"{endpoint.uri} failed {method}, quarantined for {quarantine}s: {e}"
+            )
+            raise
+        endpoint.record_success(time.perf_counter() - start)
+        return response
+
+    def _sticky_request(self, method, params):
+        with self._lock:
+            endpoint = self.sticky_endpoint
+            if endpoint is None or not endpoint.is_healthy():
+                healthy, quarantined = self.ranked_endpoints()
+                endpoint = (healthy + quarantined)[0]
+                if endpoint is not self.sticky_endpoint:
+                    self.logger.info(f"Sending transactions to {endpoint.uri}")
+                self.sticky_endpoint = endpoint
+        # writes are not retried elsewhere, since they may have been sent
+        response = self._request(endpoint, method, params)
+        if method in WRITE_METHODS and isinstance(response.get("result"), str):
+            with self._lock:
+                self.has_written = True
+                self.sent[response["result"].lower()] = endpoint
+                if len(self.sent) > MAX_SENT_TXS:
+                    self.sent.pop(next(iter(self.sent)))
+        return response
+
+    def _sent_endpoint(self, method, params):
+        """The endpoint that accepted a transaction looked up by hash, if any"""
+        if method not in TX_METHODS or len(params) == 0:
+            return None
+        tx_hash = params[0]
+        if not isinstance(tx_hash, str):
+            tx_hash = "0x" + bytes(tx_hash).hex()
+        return self.sent.get(tx_hash.lower())
+
+    def _reads_own_writes(self, method, params):
+        if not self.has_written:
+            return False
+        if method == "eth_getLogs":
+            # logs up to the latest block, unless they're of a given block hash
+            log_filter = params[0] if len(params) > 0 else {}
+            return "blockHash" not in log_filter and (
+                log_filter.get("toBlock") in LATEST_BLOCKS
+            )
+        if method not in STATE_METHODS:
+            return False
+        index = STATE_METHODS[method]
+        block = params[index] if len(params) > index else None
+        return block in LATEST_BLOCKS
+
+    def _hedged_request(self, method, params):
+        healthy, quarantined = self.ranked_endpoints()
+
+        def submit(endpoint):
+            return self._executor.submit(self._request, endpoint, method, params)
+
+        pending = {submit((healthy or quarantined).pop(0))}
+        error = None
+        while len(pending) > 0:
+            # hedge with the next healthy endpoint when the fastest is slow
+            done, pending = wait(
+                pending,
+                timeout=self.hedge_after if len(healthy) > 0 else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+
+            if len(healthy) > 0:
+                pending.add(submit(healthy.pop(0)))
+            elif len(pending) == 0 and len(quarantined) > 0:
+                # every healthy endpoint failed, so try the quarantined ones
+                pending.add(submit(quarantined.pop(0)))
+        raise error
+
+    def make_request(self, method, params):
+        if is_sticky(method) or self._reads_own_writes(method, params):
+            return self._sticky_request(method, params)
+
+        endpoint = self._sent_endpoint(method, params)
+        if endpoint is not None and endpoint.is_healthy():
+            return self._request(endpoint, method, params)
+        return self._hedged_request(method, params)
+
+    def is_connected(self, show_traceback=False):
+        return any(
+            endpoint.provider.is_connected(show_traceback)
+            for endpoint in self.endpoints
+        )
+
+    def stats(self):
+        """Latency, request and failure counts for each endpoint"""
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+
+def use_hedged_provider(snx, endpoint_uris, **kwargs):
+    """
+    Send the requests of a client, or a ``Web3`` instance, through a
+    ``HedgedProvider``. Middleware and request settings are kept.
+    """
+    web3 = getattr(snx, "web3", snx)
+    current = web3.provider
+    if "request_kwargs" not in kwargs and hasattr(current, "get_request_kwargs"):
+        kwargs["request_kwargs"] = dict(current.get_request_kwargs())
+
+    provider = HedgedProvider(endpoint_uris, **kwargs)
+    # keep transactions on the endpoint the client was created with
+    for endpoint in provider.endpoints:
+        if endpoint.uri == getattr(current, "endpoint_uri", None):
+            provider.sticky_endpoint = endpoint
+    web3.provider = provider
+    return provider
+
+
+class LocalIPCProvider(IPCProvider):
+    """
+    An IPC provider for local nodes like anvil. Responses are read in large
+    chunks and decoded once they are complete, instead of web3's 4 KiB reads, and
+    JSON-RPC batches can be sent with ``make_batch_request``.
+    """
+
+    logger = logging.getLogger("utils.provider_helpers.LocalIPCProvider")
+
+    def __init__(self, ipc_path, timeout=IPC_TIMEOUT, recv_size=IPC_RECV_SIZE):
+        super().__init__(ipc_path, timeout=timeout)
+        self.recv_size = recv_size
+
+    def _send(self, payload):
+        with self._lock, self._socket as sock:
+            try:
+                sock.sendall(payload)
+            except BrokenPipeError:
+                # the node restarted, so reconnect once
+                sock = self._socket.reset()
+                sock.sendall(payload)
+
+            chunks = []
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    chunk = sock.recv(self.recv_size)
+                except socket.timeout:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(
+                            f"No response from {self.ipc_path} in {self.timeout}s"
+                        )
+                    continue
+                if chunk == b"":
+                    raise ConnectionError(f"{self.ipc_path} closed the connection")
+
+                chunks.append(chunk)
+                # a response ends with } or ], which can also end a partial read
+                if chunk.rstrip()[-1:] in (b"}", b"]"):
+                    try:
+                        return json.loads(b"".join(chunks))
+                    except ValueError:
+                        continue
+
+    def make_request(self, method, params):
+        return self._send(self.encode_rpc_request(method, params))
+
+    def make_batch_request(self, requests):
+        """Send ``(method, params)`` pairs as one batch, returning their responses"""
+        payload = [
+            {"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+            for index, (method, params) in enumerate(requests)
+        ]
+        responses = self._send(json.dumps(payload).encode())
+        if not isinstance(responses, list):
+            raise ValueError(f"Expected a batch response, got {responses}")
+
+        by_id = {response.get("id"): response for response in responses}
+        return [
+            by_id.get(index, {"error": {"message": "Missing from batch response"}})
+            for index in range(len(requests))
+        ]
+
+
+def use_ipc_provider(snx, ipc_path=None, **kwargs):
+    """
+    Send the requests of a client, or a ``Web3`` instance, through a
+    ``LocalIPCProvider``. Middleware is kept.
+    """
+    web3 = getattr(snx, "web3", snx)
+    ipc_path = ipc_path or web3.provider.ipc_path
+    provider = LocalIPCProvider(ipc_path, **kwargs)
+    web3.provider = provider
+    return provider
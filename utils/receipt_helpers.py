@@ -0,0 +1,263 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+from utils.fork_helpers import get_ipc_port
+
+# constants
+POLL_INTERVAL = 0.25
+WAIT_TIMEOUT = 120
+
+
+def _format_receipt(receipt):
+    """Format a raw receipt the same way ``eth.get_transaction_receipt`` does"""
+    return AttributeDict.recursive(receipt_formatter(receipt))
+
+
+def _to_hash(tx_hash):
+    tx_hash = tx_hash.hex() if isinstance(tx_hash, bytes) else str(tx_hash)
+    return (tx_hash if tx_hash.startswith("0x") else f"0x{tx_hash}").lower()
+
+
+def _ws_uri(web3):
+    """Get a websocket endpoint for new heads, for websocket providers and anvil"""
+    uri = getattr(web3.provider, "endpoint_uri", None)
+    # anvil's ipc sockets are named after the port they serve websockets on
+    port = get_ipc_port(getattr(web3.provider, "ipc_path", ""))
+    if port is not None:
+        return f"ws://127.0.0.1:{port}"
+    if not isinstance(uri, str):
+        return None
+    if uri.startswith("ws"):
+        return uri
+    # anvil serves websockets on the same port as http
+    if uri.startswith("http://127.0.0.1") or uri.startswith("http://localhost"):
+        return "ws" + uri[len("http") :]
+    return None
+
+
+class ReceiptWaiter:
+    """
+    Waits for many transactions at once. New blocks are pushed over a websocket
+    ``newHeads`` subscription when the node supports it, otherwise the block
+    number is polled once per interval for all pending transactions. The
+    receipts of each new block are fetched in one request.
+    """
+
+    def __init__(self, web3, ws_uri=None, poll_interval=POLL_INTERVAL, logger=None):
+        self.web3 = web3
+        self.ws_uri = ws_uri if ws_uri is not None else _ws_uri(web3)
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.pending = {}
+        self.block_number = None
+        self.block_receipts = True
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.debug(message)
+
+    def _start(self, block_number):
+        """Watch for new blocks after ``block_number``, unless already watching"""
+        with self._lock:
+            if self._thread is None:
+                self.block_number = block_number
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            try:
+                if self.ws_uri is not None:
+                    try:
+                        self._watch_heads()
+                    except Exception as e:
+                        self._log(f"Websocket heads failed, polling instead: {e}")
+                        self.ws_uri = None
+                else:
+                    self._poll_heads()
+            except Exception as e:
+                self._log(f"Failed to process new blocks: {e}")
+                time.sleep(self.poll_interval)
+
+            with self._lock:
+                if len(self.pending) == 0:
+                    self._thread = None
+                    return
+
+    def _watch_heads(self):
+        from websockets.sync.client import connect
+
+        with connect(self.ws_uri) as ws:
+            ws.send(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": 1,
+                        "method": "eth_subscribe",
+                        "params": ["newHeads"],
+                    }
+                )
+            )
+            # fail over to polling if the node can't subscribe
+            json.loads(ws.recv(timeout=10))["result"]
+
+            # catch up on blocks mined before the subscription started
+            self._process_blocks(self.web3.eth.block_number)
+            while not self._closed and self._has_pending():
+                try:
+                    message = json.loads(ws.recv(timeout=self.poll_interval * 4))
+                except TimeoutError:
+                    # heads can be missed, so check the block number as well
+                    self._process_blocks(self.web3.eth.block_number)
+                    continue
+                head = message.get("params", {}).get("result", {})
+                if "number" in head:
+                    self._process_blocks(int(head["number"], 16))
+
+    def _poll_heads(self):
+        while not self._closed and self._has_pending():
+            self._process_blocks(self.web3.eth.block_number)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _has_pending(self):
+        with self._lock:
+            return len(self.pending) > 0
+
+    def _get_receipts(self, block_number):
+        """Get the receipts of a block, in one request when the node supports it"""
+        if self.block_receipts:
+            response = self.web3.provider.make_request(
+                "eth_getBlockReceipts", [hex(block_number)]
+            )
+            if "error" not in response:
+                return response["result"] or []
+            self._log(f"eth_getBlockReceipts is not supported: {response['error']}")
+            self.block_receipts = False
+
+        block = self.web3.eth.get_block(block_number)
+        with self._lock:
+            hashes = [_to_hash(h) for h in block["transactions"]]
+            hashes = [h for h in hashes if h in self.pending]
+        return [self._get_receipt(h) for h in hashes]
+
+    def _process_blocks(self, head):
+        for block_number in range(self.block_number + 1, head + 1):
+            for receipt in self._get_receipts(block_number):
+                self._resolve(_to_hash(receipt["transactionHash"]), receipt)
+            self.block_number = block_number
+
+    def _resolve(self, tx_hash, receipt):
+        with self._lock:
+            futures = self.pending.pop(tx_hash, [])
+        if len(futures) > 0:
+            formatted = _format_receipt(receipt)
+            for future in futures:
+                if not future.done():
+                    future.set_result(formatted)
+
+    def submit(self, tx_hash):
+        """Get a ``Future`` that resolves to the receipt of a transaction"""
+        tx_hash = _to_hash(tx_hash)
+        future = Future()
+        with self._lock:
+            self.pending.setdefault(tx_hash, []).append(future)
+
+        # automined transactions already have a receipt
+        receipt = self._get_receipt(tx_hash)
+        if receipt is None and self._thread is None:
+            # the transaction is mined after this block, if it's still pending
+            block_number = self.web3.eth.block_number
+            receipt = self._get_receipt(tx_hash)
+            if receipt is None:
+                self._start(block_number)
+        if receipt is not None:
+            self._resolve(tx_hash, receipt)
+        return future
+
+    def _get_receipt(self, tx_hash):
+        response = self.web3.provider.make_request(
+            "eth_getTransactionReceipt", [tx_hash]
+        )
+        return response.get("result")
+
+    def wait(self, tx_hash, timeout=WAIT_TIMEOUT):
+        """Wait for the receipt of a transaction, like ``snx.wait``"""
+        future = self.submit(tx_hash)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            self._forget(_to_hash(tx_hash), future)
+            raise TimeExhausted(
+                f"Transaction {_to_hash(tx_hash)} is not in the chain after "
+                f"{timeout} seconds"
+            )
+
+    def wait_all(self, tx_hashes, timeout=WAIT_TIMEOUT):
+        """Wait for the receipts of several transactions, in order"""
+        futures = [self.submit(tx_hash) for tx_hash in tx_hashes]
+        deadline = time.monotonic() + timeout
+        receipts = []
+        for tx_hash, future in zip(tx_hashes, futures):
+            try:
+                receipts.append(
+                    future.result(timeout=max(deadline - time.monotonic(), 0))
+                )
+            except TimeoutError:
+                for other_hash, other in zip(tx_hashes, futures):
+                    self._forget(_to_hash(other_hash), other)
+                raise TimeExhausted(
+                    f"Transaction {_to_hash(tx_hash)} is not in the chain after "
+                    f"{timeout} seconds"
+                )
+        return receipts
+
+    async def wait_async(self, tx_hash, timeout=WAIT_TIMEOUT):
+        """Wait for the receipt of a transaction from a coroutine"""
+        future = await asyncio.to_thread(self.submit, tx_hash)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self._forget(_to_hash(tx_hash), future)
+            raise TimeExhausted(
+                f"Transaction {_to_hash(tx_hash)} is not in the chain after "
+                f"{timeout} seconds"
+            )
+
+    def _forget(self, tx_hash, future):
+        with self._lock:
+            futures = self.pending.get(tx_hash, [])
+            if future in futures:
+                futures.remove(future)
+            if len(futures) == 0:
+                self.pending.pop(tx_hash, None)
+
+    def close(self):
+        """Stop watching for new blocks"""
+        self._closed = True
+        self._wake.set()
+
+
+def install_receipt_waiter(snx, **kwargs):
+    """
+    Replace ``snx.wait`` with a ``ReceiptWaiter``. The waiter is stored on the
+    client, so installing it again returns the same one.
+    """
+    waiter = snx.__dict__.get("receipt_waiter")
+    if waiter is not None:
+        return waiter
+
+    kwargs.setdefault("logger", snx.logger)
+    waiter = ReceiptWaiter(snx.web3, **kwargs)
+    snx.__dict__["receipt_waiter"] = waiter
+    snx.wait = waiter.wait
+    return waiter
@@ -0,0 +1,109 @@
+import threading
+from eth_abi import decode
+from utils.cache_helpers import cache_path, load_json, save_json
+
+# constants
+METADATA_FILE = cache_path("erc20_metadata.json")
+METADATA_FIELDS = {
+    "name": "string",
+    "symbol": "string",
+    "decimals": "uint8",
+}
+
+_metadata = None
+_metadata_lock = threading.Lock()
+
+
+def _cache_key(chain_id, address):
+    return f"{chain_id}:{address.lower()}"
+
+
+def _load_metadata():
+    global _metadata
+    if _metadata is None:
+        _metadata = load_json(METADATA_FILE, {})
+    return _metadata
+
+
+def _decode_field(field, result):
+    """Decode a metadata field, allowing for tokens returning bytes32 strings"""
+    try:
+        return decode([METADATA_FIELDS[field]], result)[0]
+    except Exception:
+        if field == "decimals":
+            raise
+        return decode(["bytes32"], result)[0].rstrip(b"\x00").decode("utf-8")
+
+
+def fetch_tokens_metadata(snx, addresses):
+    """Fetch name, symbol and decimals for a list of tokens in a single multicall"""
+    erc20 = snx.web3.eth.contract(abi=snx.contracts["common"]["ERC20"]["abi"])
+
+    # without a multicall contract, fall back to individual calls
+    if snx.multicall is None:
+        results = []
+        for address in addresses:
+            token = snx.web3.eth.contract(address=address, abi=erc20.abi)
+            results.append(
+                {field: token.functions[field]().call() for field in METADATA_FIELDS}
+            )
+        return dict(zip(addresses, results))
+
+    calls = [
+        (address, False, erc20.encodeABI(fn_name=field))
+        for address in addresses
+        for field in METADATA_FIELDS
+    ]
+    results = snx.multicall.functions.aggregate3(calls).call()
+
+    # unpack the results, one row per token
+    metadata = {}
+    num_fields = len(METADATA_FIELDS)
+    for ind, address in enumerate(addresses):
+        token_results = results[ind * num_fields : (ind + 1) * num_fields]
+        if not all(success for success, _ in token_results):
+            raise Exception(f"Failed to fetch ERC20 metadata for {address}")
+
+        metadata[address] = {
+            field: _decode_field(field, result)
+            for field, (_, result) in zip(METADATA_FIELDS, token_results)
+        }
+    return metadata
+
+
+def get_tokens_metadata(snx, addresses):
+    """Look up metadata for a list of tokens, fetching only the missing entries"""
+    metadata = _load_metadata()
+    chain_id = snx.network_id
+
+    missing = [
+        address
+        for address in dict.fromkeys(addresses)
+        if _cache_key(chain_id, address) not in metadata
+    ]
+    if len(missing) > 0:
+        snx.logger.info(f"Fetching ERC20 metadata for {len(missing)} tokens")
+        fetched = fetch_tokens_metadata(snx, missing)
+
+        with _metadata_lock:
+            # merge with entries written by other processes
+            metadata.update(load_json(METADATA_FILE, {}))
+            metadata.update(
+                {
+                    _cache_key(chain_id, address): token_metadata
+                    for address, token_metadata in fetched.items()
+                }
+            )
+            save_json(METADATA_FILE, metadata)
+
+    return {address: metadata[_cache_key(chain_id, address)] for address in addresses}
+
+
+def get_token_metadata(snx, address):
+    """Look up the name, symbol and decimals for a token"""
+    return get_tokens_metadata(snx, [address])[address]
+
+
+def get_token_decimals(snx, address):
+    """Look up the decimals for a token"""
+    return get_token_metadata(snx, address)["decimals"]
@@ -0,0 +1,364 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from web3 import Web3
+from utils.multicall_helpers import OraclePrefetch, aggregate_calls_erc7412
+from utils.oracle_helpers import get_historical_oracle_calls
+from utils.token_helpers import get_token_decimals
+
+# constants
+MAX_WORKERS = 8
+CHUNK_SIZE = 500
+SENTINEL = 0x5EED0000000000000000000000000000000000000000000000000000DEADBEEF
+TRACE_OPTIONS = {"disableMemory": True, "disableStorage": True}
+CALL_OPS = ["CALL", "STATICCALL"]
+DELEGATE_OPS = ["DELEGATECALL", "CALLCODE"]
+
+
+def _word(value):
+    """Format an int, bytes or hex string as a 32 byte hex word"""
+    if isinstance(value, (bytes, bytearray)):
+        value = int.from_bytes(value, "big")
+    elif isinstance(value, str):
+        value = int(value, 16)
+    return "0x" + (value % 2**256).to_bytes(32, "big").hex()
+
+
+def _address(value):
+    return Web3.to_checksum_address(_word(value)[-40:])
+
+
+def trace_storage(web3, tx, block="latest"):
+    """
+    Trace an ``eth_call`` with ``debug_traceCall``, returning the storage slots it
+    read as ``(address, slot, value)`` and the storage it would write as
+    ``{address: {slot: value}}``. Writes in reverted calls are dropped, and
+    delegate calls are attributed to the contract whose storage they use.
+    """
+    block = hex(block) if isinstance(block, int) else block
+    response = web3.provider.make_request("debug_traceCall", [tx, block, TRACE_OPTIONS])
+    if "error" in response:
+        raise ValueError(f"debug_traceCall failed: {response['error']}")
+    trace = response["result"]
+    if trace.get("failed"):
+        raise ValueError(f"The call to {tx['to']} reverted: {trace.get('returnValue')}")
+
+    reads = []
+    # storage address and writes of each call frame, by depth
+    frames = [(Web3.to_checksum_address(tx["to"]), {})]
+    entering = None
+    loading = None
+    for step in trace["structLogs"]:
+        depth, stack = step["depth"], step.get("stack") or []
+        # contracts being created have no address yet, so their writes are dropped
+        while depth > len(frames):
+            frames.append((entering, {}))
+            entering = None
+        entering = None
+
+        # a call returned, with its success flag on the stack
+        while len(frames) > depth:
+            _, writes = frames.pop()
+            if len(stack) > 0 and int(stack[-1], 16) != 0:
+                for address, slots in writes.items():
+                    frames[-1][1].setdefault(address, {}).update(slots)
+
+        if loading is not None:
+            reads.append(loading + (_word(stack[-1]),))
+            loading = None
+
+        address = frames[-1][0]
+        op = step["op"]
+        if op == "SLOAD" and address is not None:
+            loading = (address, _word(stack[-1]))
+        elif op == "SSTORE" and address is not None:
+            frames[-1][1].setdefault(address, {})[_word(stack[-1])] = _word(stack[-2])
+        elif op in CALL_OPS:
+            entering = _address(stack[-2])
+        elif op in DELEGATE_OPS:
+            entering = address
+
+    return reads, frames[0][1]
+
+
+class Scenario:
+    """
+    Hypothetical state to evaluate calls against, sent as ``eth_call`` state
+    overrides. Setters return the scenario, so they can be chained.
+    """
+
+    def __init__(self, whatif, name=None):
+        self.whatif = whatif
+        self.name = name
+        self.storage = {}
+        self.balances = {}
+        self.prices = set()
+
+    def copy(self, name=None):
+        scenario = Scenario(self.whatif, name)
+        scenario.storage = copy.deepcopy(self.storage)
+        scenario.balances = dict(self.balances)
+        scenario.prices = set(self.prices)
+        return scenario
+
+    def set_storage(self, address, slot, value):
+        address = Web3.to_checksum_address(address)
+        self.storage.setdefault(address, {})[_word(slot)] = _word(value)
+        return self
+
+    def set_eth_balance(self, address, amount):
+        """Set the ETH balance of an address, in ether"""
+        self.balances[Web3.to_checksum_address(address)] = Web3.to_wei(amount, "ether")
+        return self
+
+    def set_token_balance(self, token_address, holder, amount):
+        """Set the balance of an ERC20 token, in tokens"""
+        token_address = Web3.to_checksum_address(token_address)
+        decimals = get_token_decimals(self.whatif.snx, token_address)
+        address, slot = self.whatif.find_balance_slot(token_address, holder)
+        return self.set_storage(address, slot, int(amount * 10**decimals))
+
+    def set_price(self, feed, price):
+        """
+        Set the Pyth price of a feed id or symbol, published at the block, so it
+        isn't stale
+        """
+        address, slot, word = self.whatif.patch_price(feed, price)
+        self.prices.add(feed)
+        return self.set_storage(address, slot, word)
+
+    def apply(self, fn, sender):
+        """
+        Add the storage writes of a transaction, without sending it. e.g.
+        ``scenario.apply(market.functions.setLiquidationParameters(...), owner)``.
+        The transaction is traced against the block, without this scenario.
+        """
+        writes = self.whatif.trace(fn, sender)
+        for address, slots in writes.items():
+            for slot, value in slots.items():
+                self.set_storage(address, slot, value)
+        return self
+
+    def state_override(self):
+        """The scenario as an ``eth_call`` state override"""
+        override = {
+            address: {"stateDiff": dict(slots)}
+            for address, slots in self.storage.items()
+        }
+        for address, balance in self.balances.items():
+            override.setdefault(address, {})["balance"] = balance
+        return override
+
+
+class WhatIf:
+    """
+    Answers questions like "would this account be liquidatable under these
+    parameters?" with ``eth_call`` state overrides, instead of sending
+    transactions to a fork and reverting them. Every scenario is evaluated
+    against the same block, and scenarios are evaluated in parallel.
+
+    .. code-block:: python
+
+        whatif = WhatIf(snx)
+        scenario = whatif.scenario().apply(
+            market.functions.setLiquidationParameters(market_id, *parameters), owner
+        )
+        whatif.call([(market, "canLiquidate", [account_id])], scenario)
+    """
+
+    def __init__(self, snx, block=None, max_workers=MAX_WORKERS):
+        self.snx = snx
+        self.web3 = snx.web3
+        latest = self.web3.eth.block_number
+        self.block = block if block is not None else latest
+        # the SDK fetches the latest prices, which are in the future of old blocks
+        self.historical = self.block < latest
+        self.max_workers = max_workers
+        self.prefetch = OraclePrefetch(snx)
+        self._timestamp = None
+        self._oracle_calls = None
+        self._balance_slots = {}
+        self._price_slots = {}
+        self._writes = {}
+
+    @property
+    def timestamp(self):
+        if self._timestamp is None:
+            self._timestamp = self.web3.eth.get_block(self.block).timestamp
+        return self._timestamp
+
+    @property
+    def oracle_calls(self):
+        """
+        Pyth updates published shortly before the block, prepended to every call
+        at a historical block, or none at the latest block
+        """
+        if self._oracle_calls is None:
+            self._oracle_calls = []
+            if self.historical:
+                feed_ids = list(dict.fromkeys(self.snx.pyth.price_feed_ids.values()))
+                self._oracle_calls = get_historical_oracle_calls(
+                    self.snx, feed_ids, self.timestamp
+                )
+        return self._oracle_calls
+
+    def scenario(self, name=None):
+        return Scenario(self, name)
+
+    def call(self, calls, scenario=None):
+        """
+        Make ``(contract, function_name, args)`` view calls in one multicall
+        under a scenario, with the oracle updates they need
+        """
+        if scenario is None:
+            scenario = self.scenario()
+        # oracle updates learned from other scenarios could replace set prices,
+        # and at a historical block they have the latest prices
+        prefetch = self.prefetch
+        if len(scenario.prices) > 0 or self.historical:
+            prefetch = None
+        return aggregate_calls_erc7412(
+            self.snx,
+            calls,
+            prepended_calls=self.oracle_calls,
+            block=self.block,
+            prefetch=prefetch,
+            state_override=scenario.state_override() or None,
+        )
+
+    def evaluate(self, calls, scenarios, chunk_size=None):
+        """
+        Make the same calls under each scenario, returning a list of results.
+        With a ``chunk_size``, the calls are split into multicalls of that size.
+        """
+        if len(scenarios) == 0:
+            return []
+
+        chunk_size = chunk_size or max(len(calls), 1)
+        chunks = [calls[x : x + chunk_size] for x in range(0, len(calls), chunk_size)]
+        jobs = [(scenario, chunk) for scenario in scenarios for chunk in chunks]
+        if len(jobs) == 0:
+            return [[] for _ in scenarios]
+
+        # the first multicall finds the oracle updates the others need
+        results = [self.call(jobs[0][1], jobs[0][0])]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results += list(
+                executor.map(lambda job: self.call(job[1], job[0]), jobs[1:])
+            )
+
+        return [
+            sum(results[ind : ind + len(chunks)], [])
+            for ind in range(0, len(results), len(chunks))
+        ]
+
+    def trace(self, fn, sender):
+        """
+        Get the storage a transaction would write at the block, as
+        ``{address: {slot: value}}``. Traces are cached, so scenarios can share them.
+        """
+        tx = {
+            "from": Web3.to_checksum_address(sender),
+            "to": fn.address,
+            "data": fn._encode_transaction_data(),
+        }
+        key = (tx["from"], tx["to"], tx["data"])
+        if key not in self._writes:
+            _, self._writes[key] = trace_storage(self.web3, tx, self.block)
+        return self._writes[key]
+
+    def find_balance_slot(self, token_address, holder):
+        """
+        Find the storage slot of a token balance, by overriding each slot that
+        ``balanceOf`` reads until the balance changes
+        """
+        holder = Web3.to_checksum_address(holder)
+        key = (token_address, holder)
+        if key not in self._balance_slots:
+            token = self.web3.eth.contract(
+                address=token_address,
+                abi=self.snx.contracts["common"]["ERC20"]["abi"],
+            )
+            fn = token.functions.balanceOf(holder)
+            tx = {"to": token_address, "data": fn._encode_transaction_data()}
+            reads, _ = trace_storage(self.web3, tx, self.block)
+
+            for address, slot, _ in reads:
+                override = {address: {"stateDiff": {slot: _word(SENTINEL)}}}
+                balance = fn.call(block_identifier=self.block, state_override=override)
+                if balance == SENTINEL:
+                    self._balance_slots[key] = (address, slot)
+                    break
+            else:
+                raise ValueError(f"Can't find the balance slot of {token_address}")
+        return self._balance_slots[key]
+
+    def _feed_id(self, feed):
+        return self.snx.pyth.price_feed_ids.get(feed, feed)
+
+    def patch_price(self, feed, price):
+        """
+        Get the Pyth storage word of a feed with its price replaced, published at
+        the block. The word is found by reading the price, and looking for its
+        price and publish time in the slots that were read.
+        """
+        feed_id = self._feed_id(feed)
+        if feed_id not in self._price_slots:
+            pyth = self.snx.contracts["Pyth"]["contract"]
+            fn = pyth.functions.getPriceUnsafe(feed_id)
+            current, _, expo, publish_time = fn.call(block_identifier=self.block)
+            tx = {"to": pyth.address, "data": fn._encode_transaction_data()}
+            reads, _ = trace_storage(self.web3, tx, self.block)
+
+            price_bytes = (current % 2**64).to_bytes(8, "big")
+            time_bytes = publish_time.to_bytes(8, "big")
+            for address, slot, value in reads:
+                word = bytes.fromhex(value[2:])
+                if price_bytes in word and time_bytes in word:
+                    self._price_slots[feed_id] = (
+                        address,
+                        slot,
+                        word,
+                        word.index(price_bytes),
+                        word.index(time_bytes),
+                        expo,
+                    )
+                    break
+            else:
+                raise ValueError(f"Can't find the Pyth price slot of {feed}")
+
+        address, slot, word, price_offset, time_offset, expo = self._price_slots[
+            feed_id
+        ]
+        new_price = round(price * 10**-expo) % 2**64
+        word = bytearray(word)
+        word[price_offset : price_offset + 8] = new_price.to_bytes(8, "big")
+        word[time_offset : time_offset + 8] = self.timestamp.to_bytes(8, "big")
+        return address, slot, bytes(word)
+
+
+def get_open_accounts(whatif, max_accounts=None, chunk_size=CHUNK_SIZE):
+    """
+    Fetch the perps accounts with open positions at the block, as
+    ``{account_id: market_ids}``
+    """
+    account_proxy = whatif.snx.perps.account_proxy
+    market_proxy = whatif.snx.perps.market_proxy
+    base = whatif.scenario()
+
+    (total_supply,) = whatif.call([(account_proxy, "totalSupply", ())])
+    calls = [(account_proxy, "tokenByIndex", (ind,)) for ind in range(total_supply)]
+    account_ids = whatif.evaluate(calls, [base], chunk_size=chunk_size)[0]
+
+    calls = [
+        (market_proxy, "getAccountOpenPositions", (account_id,))
+        for account_id in account_ids
+    ]
+    positions = whatif.evaluate(calls, [base], chunk_size=chunk_size)[0]
+    accounts = {
+        account_id: list(market_ids)
+        for account_id, market_ids in zip(account_ids, positions)
+        if len(market_ids) > 0
+    }
+    if max_accounts:
+        accounts = dict(list(accounts.items())[:max_accounts])
+    return accounts